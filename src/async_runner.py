@@ -0,0 +1,314 @@
+"""Run `step()` with sensor I/O, command I/O and plotting as separate asyncio tasks.
+
+The usual `main()` loop is serial: `step()`, then `bot.spin()` to fetch new
+sensor data, then plotting. Over a slow rosbridge link the loop waits for
+the network every tick, and that wait adds straight onto the loop period.
+`AsyncRunner` splits the loop into tasks:
+
+- receive: ``bot.spin()`` + ``bot.read()`` in a worker thread, back to back,
+  always keeping the newest sensor data.
+- control: `step()` on a fixed-rate schedule, on the newest sensor data.
+- transmit: sends the newest command `step()` wrote (older unsent ones are
+  replaced).
+- plot: pushes the newest `states` row to the plotter after each step.
+
+Rows still go to disk through the `states` writer's own thread.
+
+`SmartBot` makes no promise that `spin()`, `read()` and `write()` may run
+at the same time from different threads, so by default the runner takes a
+lock around each call: a `write()` waits for a `spin()` in flight, but no
+longer for `step()`, and the next `spin()` waits for a pending `write()`. Bots that are safe to share (``thread_safe = True``,
+like :class:`fake_rosbridge.RosbridgeTcpBot`) skip the lock.
+
+`step()` doesn't change: it gets a stand-in bot whose `read()` returns the
+newest sensor data and whose `write()` hands the command to the transmit
+task, so neither blocks on the network::
+
+    runner = AsyncRunner(bot, step, params, states, rate_hz=20, plotter=plotter)
+    runner.run()  # Until Ctrl+C or `max_ticks`.
+    logger.info(runner.report())
+
+Run this file to compare loop period and sensor age against the serial loop
+over a local fake rosbridge link with 0-50 ms of latency.
+"""
+
+import asyncio
+import threading
+from contextlib import nullcontext
+from time import perf_counter_ns, sleep, time
+
+from clock import WallClock
+from loop_profiler import PhaseStats
+from loop_scheduler import RateScheduler
+
+
+class _LatestBot:
+    """What `step()` sees as `bot`: newest sensor data in, commands out, no waiting."""
+
+    def __init__(self, bot, runner: 'AsyncRunner'):
+        self._bot = bot
+        self._runner = runner
+
+    def read(self):
+        return self._runner.sensors
+
+    def write(self, cmd) -> None:
+        self._runner._send(cmd)
+
+    def __getattr__(self, name):
+        return getattr(self._bot, name)
+
+
+class AsyncRunner:
+    """Drive `step(bot, params, states)` with network I/O off the control path.
+
+    Parameters
+    ----------
+    bot : SmartBot
+        Connected robot (`init()` already called).
+    step : callable
+        ``step(bot, params, states)``, as in the run scripts.
+    params, states
+        Passed to `step()`.
+    rate_hz : float, optional
+        Control rate, by default 20.
+    plotter : ShmPlotter, optional
+        Gets ``push(states)`` after every step.
+    executor : concurrent.futures.Executor, optional
+        Run `step()` in this pool instead of on the event loop thread, so
+        several runners on one loop don't wait on each other's controllers.
+    receive_hz : float, optional
+        Cap on `spin()` calls per second. By default None (back to back,
+        for a network link). The simulator answers `spin()` at once and
+        advances one step per call, so sim bots should use `rate_hz` here.
+    clock : Clock, optional
+        Schedule ticks on this clock, by default `params.clock` (or a
+        `WallClock` if `params` has none).
+    thread_safe : bool, optional
+        Allow `spin()`/`read()` and `write()` to overlap. By default the
+        bot's own ``thread_safe`` attribute, else False (calls are locked).
+    """
+
+    def __init__(
+        self,
+        bot,
+        step,
+        params,
+        states,
+        rate_hz: float = 20.0,
+        plotter=None,
+        executor=None,
+        receive_hz: float | None = None,
+        clock=None,
+        thread_safe: bool | None = None,
+    ):
+        self.bot = bot
+        self.step = step
+        self.params = params
+        self.states = states
+        self.period = 1.0 / rate_hz
+        self.plotter = plotter
+        self.executor = executor
+        self.receive_period = 1.0 / receive_hz if receive_hz else 0.0
+        self.clock = clock or getattr(params, 'clock', None) or WallClock()
+        if thread_safe is None:
+            thread_safe = getattr(bot, 'thread_safe', False)
+        self.thread_safe = thread_safe
+        self.bot_lock = nullcontext() if thread_safe else threading.Lock()  # Held around every bot call.
+        self.sensors = None  # Newest `bot.read()` result.
+        self.ticks = 0
+        self.received = 0
+        self.sent = 0
+        self.replaced = 0  # Commands overwritten before they were sent.
+        self.skipped = 0  # Control deadlines missed because a tick ran long.
+        self.intervals = PhaseStats('interval')  # Control tick start - previous start.
+        self.step_time = PhaseStats('step')
+        self.sensor_age = PhaseStats('sensor age')  # Since that data arrived.
+        self.send_latency = PhaseStats('send latency')  # `step()` wrote a command - `bot.write()` returned.
+        self._received_at = 0
+        self._cmd = None  # (command, perf_counter_ns() when `step()` wrote it).
+        self._cmd_ready: asyncio.Event | None = None
+        self._not_writing: asyncio.Event | None = None  # Cleared while a command waits for the bot lock.
+        self._stepped: asyncio.Event | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._proxy = _LatestBot(bot, self)
+
+    def _send(self, cmd) -> None:
+        if self._cmd is not None:
+            self.replaced += 1
+        self._cmd = (cmd, perf_counter_ns())
+        if self.executor is None:
+            self._cmd_ready.set()
+        else:  # Called from a pool thread.
+            self._loop.call_soon_threadsafe(self._cmd_ready.set)
+
+    def _spin_read(self):
+        with self.bot_lock:
+            self.bot.spin()
+            return self.bot.read()
+
+    def _write(self, cmd) -> None:
+        with self.bot_lock:
+            self.bot.write(cmd)
+
+    async def _receive(self) -> None:
+        clock = self.clock
+        while True:
+            start = clock.monotonic()
+            if not self.thread_safe:
+                await self._not_writing.wait()  # Commands go first, then the next `spin()`.
+            self.sensors = await asyncio.to_thread(self._spin_read)
+            self._received_at = perf_counter_ns()
+            self.received += 1
+            if self.receive_period:
+                await clock.sleep_async(start + self.receive_period - clock.monotonic())
+
+    async def _transmit(self) -> None:
+        while True:
+            await self._cmd_ready.wait()
+            self._cmd_ready.clear()
+            (cmd, written_at), self._cmd = self._cmd, None
+            self._not_writing.clear()
+            try:
+                await asyncio.to_thread(self._write, cmd)
+            finally:
+                self._not_writing.set()
+            self.send_latency.add(perf_counter_ns() - written_at)
+            self.sent += 1
+
+    async def _plot(self) -> None:
+        while True:
+            await self._stepped.wait()
+            self._stepped.clear()
+            self.plotter.push(self.states)
+
+    async def _control(self, max_ticks: int | None) -> None:
+        clock = self.clock
+        while self.sensors is None:  # Wait for the first sensor data.
+            await asyncio.sleep(0.001)
+        deadline = clock.monotonic()
+        last = None
+        while max_ticks is None or self.ticks < max_ticks:
+            now = clock.monotonic()
+            if now < deadline:
+                await clock.sleep_async(deadline - now)
+            start = clock.monotonic()
+            if last is not None:
+                self.intervals.add(int((start - last) * 1e9))
+            last = start
+
+            t0 = perf_counter_ns()
+            self.sensor_age.add(t0 - self._received_at)
+            if self.executor is None:
+                self.step(self._proxy, self.params, self.states)
+            else:
+                await self._loop.run_in_executor(
+                    self.executor, self.step, self._proxy, self.params, self.states
+                )
+            self.step_time.add(perf_counter_ns() - t0)
+            self.ticks += 1
+            self._stepped.set()
+
+            # Next deadline on the original grid; skip any we already missed.
+            deadline += self.period
+            late = clock.monotonic() - deadline
+            if late > 0:
+                missed = int(late // self.period) + 1
+                self.skipped += missed
+                deadline += missed * self.period
+
+    async def run_async(self, max_ticks: int | None = None) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._cmd_ready = asyncio.Event()
+        self._not_writing = asyncio.Event()
+        self._not_writing.set()
+        self._stepped = asyncio.Event()
+        background = [asyncio.create_task(self._receive()), asyncio.create_task(self._transmit())]
+        if self.plotter is not None:
+            background.append(asyncio.create_task(self._plot()))
+        try:
+            await self._control(max_ticks)
+        finally:
+            for task in background:
+                task.cancel()
+            await asyncio.gather(*background, return_exceptions=True)
+
+    def run(self, max_ticks: int | None = None) -> None:
+        """Run until `max_ticks` control ticks, Ctrl+C, or `step()` raises."""
+        asyncio.run(self.run_async(max_ticks))
+
+    def report(self) -> str:
+        i = self.intervals.summary()
+        a = self.sensor_age.summary()
+        c = self.send_latency.summary()
+        return (
+            f'{self.ticks} ticks, {self.received} sensor updates, {self.sent} commands sent '
+            f'({self.replaced} replaced), {self.skipped} deadlines skipped\n'
+            f'period (ms): mean {i["mean"] * 1e3:.1f}, p99 {i["p99"] * 1e3:.1f}; '
+            f'sensor age (ms): p50 {a["p50"] * 1e3:.1f}, p99 {a["p99"] * 1e3:.1f}; '
+            f'command send (ms): p50 {c["p50"] * 1e3:.1f}, p99 {c["p99"] * 1e3:.1f}'
+        )
+
+
+def _bench_step(bot, params, states) -> None:
+    """A light controller: read odom, compute a little, write a command."""
+    from smartbot_irl import Command
+
+    sensors = bot.read()
+    params.ages.append(time() - sensors.stamp)
+    sleep(0.005)  # Some controller work.
+    bot.write(Command(linear_vel=0.2, angular_vel=0.1 * sensors.odom.yaw))
+
+
+def benchmark(latencies=(0.0, 0.01, 0.025, 0.05), rate_hz: float = 20.0, n_ticks: int = 60) -> None:
+    """Serial loop vs. `AsyncRunner` over a fake rosbridge link."""
+    from types import SimpleNamespace
+
+    import numpy as np
+
+    from fake_rosbridge import FakeRosbridgeServer, RosbridgeTcpBot
+
+    print(f'target period {1e3 / rate_hz:.0f} ms, controller work 5 ms')
+    print(
+        f'{"one-way latency":>16} {"loop":>7} {"period mean/p99 (ms)":>22} {"data age p50 (ms)":>18} '
+        f'{"send p50/p99 (ms)":>18}'
+    )
+    for latency in latencies:
+        server = FakeRosbridgeServer(latency=latency)
+        server.start()
+        try:
+            # 'locked' treats the bot as not thread safe, like a real `SmartBot`:
+            # each `write()` waits for the `spin()` in flight.
+            for mode in ('serial', 'async', 'locked'):
+                bot = RosbridgeTcpBot(port=server.port)
+                bot.init()
+                bot.spin()
+                params = SimpleNamespace(ages=[])
+                send = '-'  # The serial loop sends inside `step()`.
+                if mode == 'serial':
+                    sched = RateScheduler(rate_hz)
+                    for _ in range(n_ticks):
+                        sched.wait()
+                        _bench_step(bot, params, None)
+                        bot.spin()
+                    periods = sched.intervals.summary()
+                else:
+                    runner = AsyncRunner(
+                        bot, _bench_step, params, None, rate_hz=rate_hz, thread_safe=mode == 'async'
+                    )
+                    runner.run(max_ticks=n_ticks)
+                    periods = runner.intervals.summary()
+                    c = runner.send_latency.summary()
+                    send = f'{c["p50"] * 1e3:.1f} / {c["p99"] * 1e3:.1f}'
+                bot.shutdown()
+                age = np.median(params.ages) * 1e3
+                print(
+                    f'{latency * 1e3:>13.0f} ms {mode:>7} '
+                    f'{periods["mean"] * 1e3:>12.1f} / {periods["p99"] * 1e3:<7.1f} {age:>18.1f} {send:>18}'
+                )
+        finally:
+            server.stop()
+
+
+if __name__ == '__main__':
+    benchmark()
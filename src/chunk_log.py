@@ -0,0 +1,252 @@
+"""Binary, column-chunked log format for long runs.
+
+A chunk log is a directory instead of a single CSV::
+
+    smartlog_<ts>.chunks/
+        index.json              # Rows, columns and time range of every chunk.
+        chunk_000000/
+            t_elapsed.npy       # One plain .npy file per column.
+            odom_x.npy
+            ...
+        chunk_000001/
+        ...
+
+Loading only touches the columns you ask for and the chunks whose time range
+overlaps ``[t_start, t_end]``, so plotting a few seconds of a multi-hour run
+with flattened lidar doesn't parse the whole file.
+
+Write one during a run by swapping the CSV writer in `main()`::
+
+    writer = ChunkLogWriter(f'{log_file}_{timestamp()}.chunks')
+
+and read it back with::
+
+    df = load_chunklog(path, columns=['t_elapsed', 'odom_x'], t_start=1.2, t_end=3.5)
+
+Run this file to benchmark loading against `pd.read_csv`.
+"""
+
+import json
+import os
+import tempfile
+import tracemalloc
+from time import perf_counter
+
+import numpy as np
+import pandas as pd
+
+from log_writer import BackgroundWriter
+
+INDEX_FILE = 'index.json'
+TIME_COL = 't_elapsed'
+
+
+def _write_chunk(root: str, k: int, data: dict[str, np.ndarray], time_col: str = TIME_COL) -> dict:
+    """Write one chunk directory and return its index entry."""
+    name = f'chunk_{k:06d}'
+    os.makedirs(os.path.join(root, name), exist_ok=True)
+    for col, values in data.items():
+        with open(os.path.join(root, name, f'{col}.npy'), 'wb') as f:
+            np.save(f, np.ascontiguousarray(values, dtype=np.float64))
+            f.flush()
+            os.fsync(f.fileno())
+
+    entry = {'name': name, 'rows': len(next(iter(data.values()))), 'columns': list(data)}
+    t = data.get(time_col)
+    if t is not None and np.isfinite(t).any():
+        entry['t_min'] = float(np.nanmin(t))
+        entry['t_max'] = float(np.nanmax(t))
+    return entry
+
+
+def _write_index(root: str, chunks: list[dict], time_col: str = TIME_COL) -> None:
+    """Atomically replace the index so readers never see a half-written one."""
+    tmp = os.path.join(root, INDEX_FILE + '.tmp')
+    with open(tmp, 'w') as f:
+        json.dump({'version': 1, 'time_col': time_col, 'chunks': chunks}, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, os.path.join(root, INDEX_FILE))
+
+
+def read_index(path) -> dict:
+    with open(os.path.join(path, INDEX_FILE)) as f:
+        return json.load(f)
+
+
+class ChunkLogWriter(BackgroundWriter):
+    """Stream rows into a chunk log; each written batch becomes one chunk.
+
+    Same interface as :class:`log_writer.CsvStreamWriter`, so it can be
+    attached to a `ColumnState` in its place. The index is rewritten after
+    every chunk, so a crashed run loses at most the chunk being collected.
+
+    Parameters
+    ----------
+    path : str
+        Output directory, conventionally ending in ``.chunks``.
+    batch_rows : int, optional
+        Rows per chunk, by default 4096.
+    flush_interval : float, optional
+        Write a (shorter) chunk at least this often (sec), by default 5.0.
+    """
+
+    def __init__(self, path, batch_rows: int = 4096, flush_interval: float = 5.0, **kwargs):
+        self.path = os.fspath(path)
+        self.paths = [self.path]
+        self._chunks: list[dict] = []
+        self._columns: dict[str, None] = {}  # Ordered set of every column seen.
+        os.makedirs(self.path, exist_ok=True)
+        super().__init__(batch_rows=batch_rows, flush_interval=flush_interval, **kwargs)
+
+    def _write_batch(self, rows: list[dict]) -> None:
+        for row in rows:
+            self._columns.update(dict.fromkeys(row))
+        nan = np.nan
+        data = {
+            col: np.fromiter((row.get(col, nan) for row in rows), dtype=np.float64, count=len(rows))
+            for col in self._columns
+        }
+        self._chunks.append(_write_chunk(self.path, len(self._chunks), data))
+        _write_index(self.path, self._chunks)
+
+    def _finish(self) -> None:
+        _write_index(self.path, self._chunks)
+
+
+def load_chunklog(
+    path,
+    columns: list[str] | None = None,
+    t_start: float | None = None,
+    t_end: float | None = None,
+) -> pd.DataFrame:
+    """Load a chunk log into a DataFrame.
+
+    Parameters
+    ----------
+    path : str
+        Chunk log directory.
+    columns : list of str, optional
+        Columns to load, by default all of them.
+    t_start, t_end : float, optional
+        Keep only rows with ``t_start <= t <= t_end`` (inclusive, on the
+        log's time column, normally `t_elapsed`). Chunks entirely outside the
+        range are never opened.
+
+    Returns
+    -------
+    pd.DataFrame
+        Columns missing from some chunks (e.g. `hex_x` before the first hex
+        was seen) are NaN there.
+    """
+    index = read_index(path)
+    time_col = index['time_col']
+    lo = -np.inf if t_start is None else t_start
+    hi = np.inf if t_end is None else t_end
+
+    if columns is None:
+        columns = list(dict.fromkeys(c for chunk in index['chunks'] for c in chunk['columns']))
+    filter_time = t_start is not None or t_end is not None
+    to_read = list(dict.fromkeys(columns + [time_col])) if filter_time else columns
+
+    frames = []
+    for chunk in index['chunks']:
+        if 't_min' in chunk and (chunk['t_max'] < lo or chunk['t_min'] > hi):
+            continue
+        data = {}
+        for col in to_read:
+            if col in chunk['columns']:
+                data[col] = np.load(os.path.join(path, chunk['name'], f'{col}.npy'))
+            else:
+                data[col] = np.full(chunk['rows'], np.nan)
+        if filter_time:
+            t = data[time_col]
+            keep = (t >= lo) & (t <= hi)
+            data = {col: data[col][keep] for col in columns}
+        frames.append(pd.DataFrame(data, columns=columns))
+
+    if not frames:
+        return pd.DataFrame(columns=columns, dtype=np.float64)
+    return pd.concat(frames, ignore_index=True)
+
+
+def csv_to_chunklog(csv_path, out_path=None, chunk_rows: int = 65536) -> str:
+    """Convert an existing `smartlog_*.csv` file into a chunk log.
+
+    The CSV is read `chunk_rows` rows at a time, so files larger than memory
+    convert fine. Non-numeric columns are dropped.
+
+    Returns
+    -------
+    str
+        The chunk log directory, by default the CSV path with ``.chunks``
+        instead of ``.csv``.
+    """
+    if out_path is None:
+        out_path = os.path.splitext(os.fspath(csv_path))[0] + '.chunks'
+    os.makedirs(out_path, exist_ok=True)
+
+    chunks = []
+    for df in pd.read_csv(csv_path, chunksize=chunk_rows):
+        df = df.select_dtypes('number')
+        data = {col: df[col].to_numpy(dtype=np.float64) for col in df.columns}
+        chunks.append(_write_chunk(out_path, len(chunks), data))
+    _write_index(out_path, chunks)
+    return out_path
+
+
+def _measure(fn):
+    tracemalloc.start()
+    t0 = perf_counter()
+    result = fn()
+    elapsed = perf_counter() - t0
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def benchmark(n_rows: int = 50_000, n_beams: int = 360) -> None:
+    """Compare loading a time window from CSV vs. a chunk log.
+
+    Uses a synthetic 50 Hz log with flattened lidar, like `tyler_approach.py`
+    writes.
+    """
+    rng = np.random.default_rng(0)
+    t = np.arange(n_rows) * 0.02
+    df = pd.DataFrame({'t_epoch': 1.7e9 + t, 't_delta': 0.02, 't_elapsed': t})
+    df['odom_x'] = np.cumsum(rng.normal(0, 0.01, n_rows))
+    df['odom_y'] = np.cumsum(rng.normal(0, 0.01, n_rows))
+    lidar = pd.DataFrame(
+        rng.uniform(0.1, 8.0, (n_rows, n_beams)), columns=[f'scan_range_{i}' for i in range(n_beams)]
+    )
+    df = pd.concat([df, lidar], axis=1)
+
+    columns = ['t_elapsed', 'odom_x', 'odom_y']
+    t_start, t_end = t[-1] * 0.4, t[-1] * 0.45
+
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = os.path.join(tmp, 'smartlog_bench.csv')
+        df.to_csv(csv_path, index=False)
+        del df, lidar
+        chunk_path, convert_s, _ = _measure(lambda: csv_to_chunklog(csv_path))
+
+        def from_csv():
+            full = pd.read_csv(csv_path)
+            return full.loc[(full['t_elapsed'] >= t_start) & (full['t_elapsed'] <= t_end), columns]
+
+        def from_chunks():
+            return load_chunklog(chunk_path, columns=columns, t_start=t_start, t_end=t_end)
+
+        a, csv_s, csv_peak = _measure(from_csv)
+        b, chunk_s, chunk_peak = _measure(from_chunks)
+        assert np.allclose(a.to_numpy(), b.to_numpy())
+
+    print(f'{n_rows} rows x {n_beams + 5} columns, loading {len(b)} rows x {len(columns)} columns')
+    print(f'converting CSV -> chunk log took {convert_s:.2f} s')
+    print(f'{"loader":<14} {"time s":>8} {"peak MB":>9}')
+    print(f'{"read_csv":<14} {csv_s:8.3f} {csv_peak / 1e6:9.1f}')
+    print(f'{"load_chunklog":<14} {chunk_s:8.3f} {chunk_peak / 1e6:9.1f}')
+
+
+if __name__ == '__main__':
+    benchmark()
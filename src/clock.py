@@ -0,0 +1,103 @@
+"""Clocks for the control loop.
+
+`step()` reads the time from `params.clock` instead of calling `time()`, so
+the same code runs on the wall clock with a robot or the simulator, and on a
+stepped virtual clock when the robot itself runs on that clock, i.e.
+:class:`headless_sim.HeadlessBot` or a `ReplayBot(..., speed=None)`::
+
+    bot = HeadlessBot()         # Moves by however much `bot.clock` advanced.
+    params.clock = bot.clock    # A SimClock(dt=0.05).
+    sched = RateScheduler.from_clock(20, params.clock)
+    while True:
+        sched.wait()            # Next tick, no sleeping.
+        step(bot, params, states)
+        bot.spin()
+
+This runs a 20Hz loop a few hundred times faster than real time. A
+:class:`SimClock` does not step `SmartBot(mode='sim')`, which runs on the
+wall clock, so use :class:`WallClock` there.
+
+Both clocks count seconds since Jan 1 1970, so `t_epoch` means the same
+thing either way.
+"""
+
+import asyncio
+import time
+from abc import ABC, abstractmethod
+
+
+class Clock(ABC):
+    """Interface shared by :class:`WallClock` and :class:`SimClock`."""
+
+    @abstractmethod
+    def time(self) -> float:
+        """Current time (sec since Jan 1 1970)."""
+
+    @abstractmethod
+    def monotonic(self) -> float:
+        """Clock for measuring intervals (sec, arbitrary zero)."""
+
+    @abstractmethod
+    def sleep(self, seconds: float) -> None:
+        """Wait `seconds` of this clock's time."""
+
+    async def sleep_async(self, seconds: float) -> None:
+        """:meth:`sleep` for asyncio tasks, letting other tasks run meanwhile."""
+        await asyncio.sleep(max(seconds, 0.0))
+
+    def advance(self, seconds: float | None = None) -> None:
+        """Move a virtual clock forward. Does nothing on the wall clock."""
+
+
+class WallClock(Clock):
+    """The real time, for running on the robot."""
+
+    def time(self) -> float:
+        return time.time()
+
+    def monotonic(self) -> float:
+        return time.perf_counter()
+
+    def sleep(self, seconds: float) -> None:
+        time.sleep(seconds)
+
+
+class SimClock(Clock):
+    """Virtual time that only moves when told to.
+
+    For offline runs where the robot is stepped by this clock
+    (:class:`headless_sim.HeadlessBot`) or replayed. It doesn't step
+    `SmartBot(mode='sim')`.
+
+    Parameters
+    ----------
+    dt : float, optional
+        Default step for :meth:`advance` (sec), by default 0.05 (20Hz).
+    start : float, optional
+        Starting time (sec since Jan 1 1970), by default the current wall time.
+    """
+
+    def __init__(self, dt: float = 0.05, start: float | None = None):
+        self.dt = dt
+        self.start = time.time() if start is None else start
+        self.elapsed = 0.0
+        self.ticks = 0
+
+    def time(self) -> float:
+        return self.start + self.elapsed
+
+    def monotonic(self) -> float:
+        return self.elapsed
+
+    def sleep(self, seconds: float) -> None:
+        """Sleeping just moves the clock forward."""
+        if seconds > 0:
+            self.elapsed += seconds
+
+    async def sleep_async(self, seconds: float) -> None:
+        self.sleep(seconds)
+        await asyncio.sleep(0)
+
+    def advance(self, seconds: float | None = None) -> None:
+        self.elapsed += self.dt if seconds is None else seconds
+        self.ticks += 1
@@ -0,0 +1,347 @@
+"""Columnar, preallocated storage for the per-tick `states` log.
+
+`ColumnState` is a drop-in replacement for :class:`smartbot_irl.data.State`
+in the `main()` loops. Rows are written into preallocated NumPy chunks, so
+`append_row()` costs the same on tick 10 as on tick 1,000,000 and never
+allocates once the current chunk has room.
+
+Usage::
+
+    states = ColumnState()
+    states.append_row(rowdict={'t_epoch': t, 'odom_x': 1.0})
+    states.last.t_epoch
+    states.iloc[-1]  # pandas Series, e.g. for plotting
+    states.to_csv('smartlog.csv')
+"""
+
+from time import perf_counter_ns
+
+import numpy as np
+
+from state_row import StateRow
+
+DEFAULT_COLUMNS = ('t_epoch', 't_delta', 't_elapsed')
+
+
+class _Row:
+    """Read-only view of one row. Columns are available as attributes or keys."""
+
+    __slots__ = ('_values', '_index')
+
+    def __init__(self, values: np.ndarray, index: dict[str, int]):
+        self._values = values
+        self._index = index
+
+    def __getattr__(self, name: str) -> float:
+        try:
+            return float(self._values[self._index[name]])
+        except KeyError:
+            raise AttributeError(name) from None
+
+    def __getitem__(self, name: str) -> float:
+        return float(self._values[self._index[name]])
+
+    def get(self, name: str, default=None):
+        j = self._index.get(name)
+        return default if j is None else float(self._values[j])
+
+    def to_dict(self) -> dict[str, float]:
+        return {name: float(self._values[j]) for name, j in self._index.items()}
+
+    def __repr__(self) -> str:
+        return f'Row({self.to_dict()})'
+
+
+class _ILoc:
+    """Minimal `DataFrame.iloc` look-alike (integer and slice row access)."""
+
+    def __init__(self, state: 'ColumnState'):
+        self._state = state
+
+    def __getitem__(self, key):
+        import pandas as pd
+
+        state = self._state
+        if isinstance(key, slice):
+            return state.to_dataframe().iloc[key]
+
+        n = len(state)
+        i = key + n if key < 0 else key
+        if not 0 <= i < n:
+            raise IndexError(f'row {key} out of range for {n} rows')
+        return pd.Series(
+            state._row_values(i)[: len(state._columns)].copy(),
+            index=list(state._columns),
+            name=state._first_row + i,
+        )
+
+
+class ColumnState:
+    """Chunked column store for robot state rows.
+
+    Data lives in 2D float64 chunks of shape ``(column_capacity, chunk_rows)``,
+    so each column is a contiguous array inside its chunk. New chunks are only
+    allocated when the current one is full, and new columns (e.g. `hex_x` the
+    first time a hex is seen) are added without touching older rows, which
+    read back as NaN.
+
+    Parameters
+    ----------
+    columns : sequence of str, optional
+        Columns known up front, by default `t_epoch`, `t_delta`, `t_elapsed`.
+    chunk_rows : int, optional
+        Rows per chunk, by default 4096.
+    max_rows : int or None, optional
+        If set, keep roughly the newest `max_rows` rows and recycle older
+        chunks (ring-buffer mode). Use this together with a streaming writer
+        so memory stays bounded on long runs. By default keep everything.
+    writer : log_writer.BackgroundWriter or None, optional
+        If set, every appended row is also handed to `writer.put()` so it is
+        streamed to disk in the background.
+    """
+
+    def __init__(
+        self,
+        columns=DEFAULT_COLUMNS,
+        chunk_rows: int = 4096,
+        max_rows: int | None = None,
+        writer=None,
+    ):
+        self.writer = writer
+        self._columns: list[str] = []
+        self._index: dict[str, int] = {}
+        self._chunk_rows = int(chunk_rows)
+        self._col_capacity = max(16, 2 * len(columns))
+        self._max_chunks = None if max_rows is None else -(-int(max_rows) // self._chunk_rows) + 1
+
+        self._chunks: list[np.ndarray] = []
+        self._spare: list[np.ndarray] = []  # Recycled chunks (ring-buffer mode).
+        self._fill = self._chunk_rows  # Rows used in the newest chunk.
+        self._first_row = 0  # Global index of the oldest row still held.
+        self._positions: dict[tuple, slice | np.ndarray] = {}  # For `append_values()`.
+
+        for name in columns:
+            self._add_column(name)
+
+    # ------------------------------------------------------------------
+    # Writing
+    # ------------------------------------------------------------------
+    def append_row(self, rowdict: dict | StateRow) -> None:
+        """Append one row. Missing columns are NaN, unknown keys add columns.
+
+        A :class:`state_row.StateRow` (anything with `values` and `columns`)
+        is copied in with `append_values()`.
+        """
+        columns = getattr(rowdict, 'columns', None)
+        if columns is not None:
+            self.append_values(rowdict.values, columns)
+            return
+        if self._fill == self._chunk_rows:
+            self._new_chunk()
+
+        index = self._index
+        chunk = self._chunks[-1]
+        i = self._fill
+        for name, value in rowdict.items():
+            j = index.get(name)
+            if j is None:
+                j = self._add_column(name)
+                chunk = self._chunks[-1]
+            try:
+                chunk[j, i] = np.nan if value is None else value
+            except (TypeError, ValueError):
+                chunk[j, i] = np.nan
+                raise TypeError(f'column {name!r} must be numeric, got {value!r}') from None
+        self._fill = i + 1
+        if self.writer is not None:
+            self.writer.put(rowdict)
+
+    def append_values(self, values: np.ndarray, columns: tuple[str, ...]) -> None:
+        """Append one row given as `values` for `columns`, in the same order.
+
+        Fast path for rows with a fixed layout (e.g. from
+        :class:`sensor_projection.SensorProjection`): where `columns` live is
+        looked up once per tuple, then the row is copied in with one slice
+        assignment. Columns not in `columns` are NaN. The `writer`, if any,
+        still gets a dict.
+        """
+        if self._fill == self._chunk_rows:
+            self._new_chunk()
+        pos = self._positions.get(columns)
+        if pos is None:
+            pos = self._positions[columns] = self._column_positions(columns)
+        i = self._fill
+        self._chunks[-1][pos, i] = values
+        self._fill = i + 1
+        if self.writer is not None:
+            self.writer.put(dict(zip(columns, values.tolist())), copy=False)
+
+    def _column_positions(self, columns: tuple[str, ...]) -> slice | np.ndarray:
+        js = [self._index[name] if name in self._index else self._add_column(name) for name in columns]
+        if js == list(range(js[0], js[0] + len(js))):
+            return slice(js[0], js[0] + len(js))
+        return np.array(js, dtype=np.intp)
+
+    def _new_chunk(self) -> None:
+        if self._max_chunks is not None and len(self._chunks) >= self._max_chunks:
+            old = self._chunks.pop(0)
+            self._first_row += self._chunk_rows
+            if old.shape[0] == self._col_capacity:
+                self._spare.append(old)
+
+        if self._spare:
+            chunk = self._spare.pop()
+            chunk.fill(np.nan)
+        else:
+            chunk = np.full((self._col_capacity, self._chunk_rows), np.nan)
+        self._chunks.append(chunk)
+        self._fill = 0
+
+    def _add_column(self, name: str) -> int:
+        j = len(self._columns)
+        if j >= self._col_capacity:
+            # Widen only the chunk being written; full chunks keep their shape.
+            self._col_capacity *= 2
+            self._spare.clear()
+            if self._chunks:
+                old = self._chunks[-1]
+                wide = np.full((self._col_capacity, self._chunk_rows), np.nan)
+                wide[: old.shape[0]] = old
+                self._chunks[-1] = wide
+        self._columns.append(name)
+        self._index[name] = j
+        return j
+
+    # ------------------------------------------------------------------
+    # Reading
+    # ------------------------------------------------------------------
+    def __len__(self) -> int:
+        if not self._chunks:
+            return 0
+        return (len(self._chunks) - 1) * self._chunk_rows + self._fill
+
+    @property
+    def columns(self) -> list[str]:
+        return list(self._columns)
+
+    @property
+    def last(self) -> _Row:
+        """Newest row. Before the first append every column reads 0.0."""
+        if not len(self):
+            return _Row(np.zeros(len(self._columns)), self._index)
+        return _Row(self._chunks[-1][:, self._fill - 1], self._index)
+
+    @property
+    def iloc(self) -> _ILoc:
+        return _ILoc(self)
+
+    def last_into(self, columns: list[str], out: np.ndarray) -> np.ndarray:
+        """Copy the newest row's `columns` into `out` (NaN where missing).
+
+        Allocation-free alternative to ``states.iloc[-1][columns]``.
+        """
+        if not len(self):
+            out[:] = np.nan
+            return out
+        values = self._chunks[-1][:, self._fill - 1]
+        index = self._index
+        for k, name in enumerate(columns):
+            j = index.get(name)
+            out[k] = np.nan if j is None else values[j]
+        return out
+
+    def _row_values(self, i: int) -> np.ndarray:
+        """Values of retained row `i`, padded with NaN to the current width."""
+        chunk = self._chunks[i // self._chunk_rows]
+        values = chunk[:, i % self._chunk_rows]
+        if len(values) < len(self._columns):
+            values = np.concatenate([values, np.full(len(self._columns) - len(values), np.nan)])
+        return values
+
+    def column(self, name: str) -> np.ndarray:
+        """Return a copy of one column over all retained rows."""
+        j = self._index[name]
+        n = len(self)
+        out = np.full(n, np.nan)
+        for k, chunk in enumerate(self._chunks):
+            start = k * self._chunk_rows
+            stop = min(start + self._chunk_rows, n)
+            if j < chunk.shape[0]:
+                out[start:stop] = chunk[j, : stop - start]
+        return out
+
+    def to_numpy(self) -> np.ndarray:
+        """Return all retained rows as a ``(rows, columns)`` float64 array."""
+        n_cols = len(self._columns)
+        n = len(self)
+        out = np.full((n, n_cols), np.nan)
+        for k, chunk in enumerate(self._chunks):
+            start = k * self._chunk_rows
+            stop = min(start + self._chunk_rows, n)
+            width = min(n_cols, chunk.shape[0])
+            out[start:stop, :width] = chunk[:width, : stop - start].T
+        return out
+
+    def to_dataframe(self):
+        import pandas as pd
+
+        index = pd.RangeIndex(self._first_row, self._first_row + len(self))
+        return pd.DataFrame(self.to_numpy(), columns=self.columns, index=index)
+
+    def to_csv(self, path, **kwargs) -> None:
+        """Save all retained rows to a CSV file (same layout as `State.to_csv`)."""
+        kwargs.setdefault('index', False)
+        self.to_dataframe().to_csv(path, **kwargs)
+
+
+def _synthetic_row(i: int) -> dict:
+    t = 1.7e9 + 0.02 * i
+    row = {
+        't_epoch': t,
+        't_delta': 0.02,
+        't_elapsed': 0.02 * i,
+        'imu_ax': 0.1,
+        'imu_ay': -0.2,
+        'imu_az': 9.81,
+        'imu_wz': 0.01,
+        'odom_x': 0.001 * i,
+        'odom_y': -0.001 * i,
+        'odom_yaw': 0.5,
+    }
+    if i % 3 == 0:
+        row.update(hex_x=1.0, hex_y=0.2, hex_yaw=0.1)
+    return row
+
+
+def _time_appends(states, n_ticks: int) -> np.ndarray:
+    latencies = np.empty(n_ticks, dtype=np.int64)
+    for i in range(n_ticks):
+        row = _synthetic_row(i)
+        t0 = perf_counter_ns()
+        states.append_row(rowdict=row)
+        latencies[i] = perf_counter_ns() - t0
+    return latencies
+
+
+def benchmark(n_ticks: int = 100_000) -> None:
+    """Compare per-append latency of `ColumnState` against `State`."""
+    backends = {'ColumnState': ColumnState}
+    try:
+        from smartbot_irl.data import State
+
+        backends['State'] = State
+    except ImportError:
+        print('smartbot_irl not importable, only benchmarking ColumnState')
+
+    print(f'{n_ticks} ticks, per-append latency (us)')
+    print(f'{"backend":<12} {"p50":>8} {"p90":>8} {"p99":>8} {"p99.9":>8} {"max":>10} {"total s":>8}')
+    for name, cls in backends.items():
+        lat = _time_appends(cls(), n_ticks) / 1e3
+        p50, p90, p99, p999 = np.percentile(lat, [50, 90, 99, 99.9])
+        print(
+            f'{name:<12} {p50:8.2f} {p90:8.2f} {p99:8.2f} {p999:8.2f} {lat.max():10.1f} {lat.sum() / 1e6:8.2f}'
+        )
+
+
+if __name__ == '__main__':
+    benchmark()
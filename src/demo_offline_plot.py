@@ -1,16 +1,23 @@
 import pandas as pd
 import matplotlib.pyplot as plt
 
-# Which CSV to load.
+from chunk_log import load_chunklog
+
+# Which CSV (or `.chunks` binary log) to load.
+# Convert an old CSV with `chunk_log.csv_to_chunklog(csv_path)`.
 csv_path = "smartlog_2025-11-13_13-53-01.csv"
 ######################################################
 
-df = pd.read_csv(csv_path)
-print(df.columns)
-
 # Grab a specific range of data
 t_start, t_end = 1.2, 3.5
-sub_df = df[(df["t_elapsed"] >= t_start) & (df["t_elapsed"] <= t_end)]
+
+if csv_path.endswith(".chunks"):
+    # Only reads these columns, and only the chunks overlapping [t_start, t_end].
+    sub_df = load_chunklog(csv_path, columns=["t_elapsed", "odom_x", "odom_y"], t_start=t_start, t_end=t_end)
+else:
+    df = pd.read_csv(csv_path)
+    print(df.columns)
+    sub_df = df[(df["t_elapsed"] >= t_start) & (df["t_elapsed"] <= t_end)]
 
 
 # -----------------------------
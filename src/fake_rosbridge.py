@@ -0,0 +1,185 @@
+"""A local stand-in for the robot's rosbridge link, with adjustable latency.
+
+Used to measure how network delay affects the control loop without a robot.
+:class:`FakeRosbridgeServer` speaks rosbridge-style JSON messages (one per
+line, like rosbridge's TCP transport) and simulates a unicycle robot driven
+by ``/cmd_vel``. :class:`RosbridgeTcpBot` is a minimal blocking client with
+the `SmartBot` methods the loops use:
+
+- `spin()` fetches fresh sensor data with a ``call_service`` round trip.
+- `read()` returns the last fetched data.
+- `write(cmd)` publishes ``/cmd_vel``.
+
+Every message waits `latency` seconds before the server handles it, and
+again before its reply goes out, so a `spin()` costs about ``2 * latency``.
+"""
+
+import asyncio
+import json
+import math
+import socket
+import threading
+import time
+from types import SimpleNamespace
+
+
+class FakeRosbridgeServer:
+    """Serve a simulated robot on ``127.0.0.1:port`` from a background thread.
+
+    Parameters
+    ----------
+    latency : float, optional
+        One-way delay added to every message (sec), by default 0.0.
+    port : int, optional
+        TCP port, by default 0 (pick a free one, see `port` after `start()`).
+    """
+
+    def __init__(self, latency: float = 0.0, port: int = 0):
+        self.latency = latency
+        self.port = port
+        self.pose = [0.0, 0.0, 0.0]
+        self.cmd = (0.0, 0.0)
+        self._t_last = time.monotonic()
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._server = None
+        self._ready = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name='FakeRosbridgeServer', daemon=True)
+        self._thread.start()
+        self._ready.wait()
+
+    def stop(self) -> None:
+        if self._loop is not None:
+            asyncio.run_coroutine_threadsafe(self._shutdown(), self._loop)
+        if self._thread is not None:
+            self._thread.join(1.0)
+
+    async def _shutdown(self) -> None:
+        self._server.close()
+        tasks = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        asyncio.get_running_loop().stop()
+
+    def _run(self) -> None:
+        self._loop = loop = asyncio.new_event_loop()
+        self._server = loop.run_until_complete(asyncio.start_server(self._handle, '127.0.0.1', self.port))
+        self.port = self._server.sockets[0].getsockname()[1]
+        self._ready.set()
+        try:
+            loop.run_forever()
+        finally:
+            loop.close()
+
+    def _integrate(self) -> None:
+        now = time.monotonic()
+        dt, self._t_last = now - self._t_last, now
+        v, w = self.cmd
+        x, y, yaw = self.pose
+        self.pose = [x + v * math.cos(yaw) * dt, y + v * math.sin(yaw) * dt, yaw + w * dt]
+
+    def _sensors(self) -> dict:
+        self._integrate()
+        x, y, yaw = self.pose
+        return {
+            'stamp': time.time(),
+            'odom': {'x': x, 'y': y, 'yaw': yaw},
+            'imu': {'ax': 0.0, 'ay': 0.0, 'az': 9.81, 'wz': self.cmd[1]},
+        }
+
+    async def _handle(self, reader, writer) -> None:
+        send_lock = asyncio.Lock()
+
+        async def reply(msg: dict) -> None:
+            await asyncio.sleep(self.latency)
+            async with send_lock:
+                writer.write(json.dumps(msg).encode() + b'\n')
+                await writer.drain()
+
+        async def handle(msg: dict) -> None:
+            await asyncio.sleep(self.latency)
+            if msg.get('op') == 'publish' and msg.get('topic') == '/cmd_vel':
+                self._integrate()
+                self.cmd = (msg['msg']['linear']['x'], msg['msg']['angular']['z'])
+            elif msg.get('op') == 'call_service':
+                await reply(
+                    {
+                        'op': 'service_response',
+                        'id': msg.get('id'),
+                        'service': msg.get('service'),
+                        'values': self._sensors(),
+                        'result': True,
+                    }
+                )
+
+        pending = set()  # Keep references so tasks aren't garbage collected mid-flight.
+        try:
+            while line := await reader.readline():
+                task = asyncio.ensure_future(handle(json.loads(line)))
+                pending.add(task)
+                task.add_done_callback(pending.discard)
+        except (ConnectionError, asyncio.CancelledError):
+            pass  # Client went away or the server is stopping.
+        finally:
+            writer.close()
+
+
+class RosbridgeTcpBot:
+    """Blocking `SmartBot`-like client for :class:`FakeRosbridgeServer`."""
+
+    thread_safe = True  # Sends are locked and only `spin()` reads the socket.
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 9090):
+        self.host = host
+        self.port = port
+        self.sensors = None
+        self.stamp = 0.0  # When the server sampled `sensors` (sec since epoch).
+        self._sock: socket.socket | None = None
+        self._file = None
+        self._send_lock = threading.Lock()
+        self._id = 0
+
+    def init(self, *args, **kwargs) -> None:
+        self._sock = socket.create_connection((self.host, self.port))
+        self._sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._file = self._sock.makefile('rb')
+
+    def _send(self, msg: dict) -> None:
+        data = json.dumps(msg).encode() + b'\n'
+        with self._send_lock:
+            self._sock.sendall(data)
+
+    def spin(self) -> None:
+        """Fetch fresh sensor data (one round trip)."""
+        self._id += 1
+        self._send({'op': 'call_service', 'service': '/get_sensors', 'id': f'spin:{self._id}'})
+        msg = json.loads(self._file.readline())
+        values = msg['values']
+        self.stamp = values['stamp']
+        self.sensors = SimpleNamespace(
+            odom=SimpleNamespace(**values['odom']),
+            imu=SimpleNamespace(**values['imu']),
+            scan=None,
+            seen_hexes=None,
+            stamp=values['stamp'],
+        )
+
+    def read(self):
+        return self.sensors
+
+    def write(self, cmd) -> None:
+        self._send(
+            {
+                'op': 'publish',
+                'topic': '/cmd_vel',
+                'msg': {'linear': {'x': cmd.linear_vel}, 'angular': {'z': cmd.angular_vel}},
+            }
+        )
+
+    def shutdown(self) -> None:
+        if self._sock is not None:
+            self._file.close()
+            self._sock.close()
@@ -0,0 +1,356 @@
+"""Decimated, blitted live plots for long runs.
+
+`FastPlotManager` takes the same `add_figure()` / `add_line()` calls as
+`PlotManager`, so `setup_plotting()` works unchanged::
+
+    pm = setup_plotting(FastPlotManager(fps=30))
+    pm.show_plots()
+    pm.update_rows(rows, columns)  # Any number of new rows at once.
+    pm.draw()  # Redraws at most `fps` times per second.
+
+Three things keep redraw cost flat as the history grows:
+
+* Each line is reduced to at most `max_points` points before drawing by
+  keeping the min and max sample of every bucket (so spikes survive).
+* Axes limits only change when data leaves them (then they grow with some
+  margin); between those full redraws only the lines are repainted on top
+  of a cached background (matplotlib blitting).
+* Drawing is capped at `fps`, independent of the data rate.
+
+`decimate`, `max_points` and `blit` can be set per `add_line()` call.
+Run this file to benchmark frame rate and lag on 10 minutes of 50 Hz data.
+"""
+
+import math
+from time import perf_counter, sleep
+
+import numpy as np
+
+
+def minmax_indices(values: list[np.ndarray], max_points: int) -> np.ndarray:
+    """Indices that keep every bucket's min and max of each array in `values`.
+
+    Splits ``range(n)`` into buckets and keeps, per bucket, the positions of
+    the smallest and largest value of every array (so both coordinates of an
+    X-Y path keep their extremes). Always keeps the last point.
+    """
+    n = len(values[0])
+    per_bucket = 2 * len(values)
+    n_buckets = max(1, max_points // per_bucket)
+    if n <= max_points:
+        return np.arange(n)
+
+    size = math.ceil(n / n_buckets)
+    padded = n_buckets * size
+    offsets = np.arange(n_buckets) * size
+    keep = [np.array([n - 1])]
+    for v in values:
+        lo = np.full(padded, np.inf)
+        hi = np.full(padded, -np.inf)
+        finite = np.isfinite(v)
+        lo[:n] = np.where(finite, v, np.inf)
+        hi[:n] = np.where(finite, v, -np.inf)
+        keep.append(offsets + lo.reshape(n_buckets, size).argmin(axis=1))
+        keep.append(offsets + hi.reshape(n_buckets, size).argmax(axis=1))
+    idx = np.unique(np.concatenate(keep))
+    return idx[idx < n]
+
+
+class _Series:
+    """Growable float64 column."""
+
+    def __init__(self):
+        self.data = np.empty(1024)
+        self.n = 0
+
+    def extend(self, values: np.ndarray) -> None:
+        need = self.n + len(values)
+        if need > len(self.data):
+            grown = np.empty(max(need, 2 * len(self.data)))
+            grown[: self.n] = self.data[: self.n]
+            self.data = grown
+        self.data[self.n : need] = values
+        self.n = need
+
+    def view(self, window: int | None = None) -> np.ndarray:
+        start = 0 if window is None else max(0, self.n - window)
+        return self.data[start : self.n]
+
+
+class FastLine:
+    """One subplot: `x_col` against one or more `y_col` columns."""
+
+    def __init__(
+        self,
+        x_col: str,
+        y_col,
+        title: str = '',
+        labels=None,
+        marker: str = '',
+        ls: str = '-',
+        aspect: str | None = None,
+        xlabel: str = '',
+        ylabel: str = '',
+        window: int | None = None,
+        decimate: bool = True,
+        max_points: int = 2000,
+        blit: bool = True,
+        **kwargs,
+    ):
+        self.x_col = x_col
+        self.y_cols = [y_col] if isinstance(y_col, str) else list(y_col)
+        if labels is None:
+            labels = self.y_cols
+        self.labels = [labels] if isinstance(labels, str) else list(labels)
+        self.title, self.xlabel, self.ylabel = title, xlabel, ylabel
+        self.marker = marker
+        # A marker with no explicit line style is a scatter plot.
+        self.ls = ls if ls != '-' or not marker else 'none'
+        self.aspect = aspect
+        self.window = window
+        self.decimate = decimate
+        self.max_points = max_points
+        self.blit = blit
+        self.x = _Series()
+        self.ys = [_Series() for _ in self.y_cols]
+        self.ax = None
+        self.artists = []
+        self._limits = None
+        self._background = None
+        self._dirty = False
+
+    @property
+    def columns(self) -> list[str]:
+        return [self.x_col, *self.y_cols]
+
+    def extend(self, rows: np.ndarray, index: dict[str, int]) -> None:
+        nan = np.full(len(rows), np.nan)
+        self.x.extend(rows[:, index[self.x_col]] if self.x_col in index else nan)
+        for y, col in zip(self.ys, self.y_cols):
+            y.extend(rows[:, index[col]] if col in index else nan)
+        self._dirty = True
+
+    def attach(self, ax) -> None:
+        self.ax = ax
+        ax.set_title(self.title)
+        ax.set_xlabel(self.xlabel)
+        ax.set_ylabel(self.ylabel)
+        if self.aspect:
+            ax.set_aspect(self.aspect, adjustable='box')
+        self.artists = [
+            ax.plot([], [], marker=self.marker, ls=self.ls, label=label, animated=self.blit)[0]
+            for label in self.labels
+        ]
+        if len(self.artists) > 1:
+            ax.legend(loc='upper left')
+
+    def _visible(self):
+        x = self.x.view(self.window)
+        ys = [y.view(self.window) for y in self.ys]
+        if self.decimate and len(x) > self.max_points:
+            idx = minmax_indices([x, *ys] if self.ls == 'none' else ys, self.max_points)
+            x = x[idx]
+            ys = [y[idx] for y in ys]
+        return x, ys
+
+    def _needs_rescale(self, x, ys) -> bool:
+        finite = [a[np.isfinite(a)] for a in (x, *ys)]
+        if not len(finite[0]) or not any(len(a) for a in finite[1:]):
+            return False
+        xmin, xmax = finite[0].min(), finite[0].max()
+        ymin = min(a.min() for a in finite[1:] if len(a))
+        ymax = max(a.max() for a in finite[1:] if len(a))
+        lim = self._limits
+        if lim is not None and lim[0] <= xmin and xmax <= lim[1] and lim[2] <= ymin and ymax <= lim[3]:
+            return False
+        # Grow by 25% of the data extent (at least 0.5) so this stays rare.
+        mx = max(0.25 * (xmax - xmin), 0.5)
+        my = max(0.25 * (ymax - ymin), 0.5)
+        self._limits = (xmin - mx, xmax + mx, ymin - my, ymax + my)
+        self.ax.set_xlim(self._limits[0], self._limits[1])
+        self.ax.set_ylim(self._limits[2], self._limits[3])
+        return True
+
+    def refresh(self) -> bool:
+        """Update artist data. Returns True if the axes need a full redraw."""
+        if not self._dirty:
+            return False
+        self._dirty = False
+        x, ys = self._visible()
+        for artist, y in zip(self.artists, ys):
+            artist.set_data(x, y)
+        # A sliding window moves out of its limits all the time, so it always
+        # rescales (and is a full redraw).
+        return self._needs_rescale(x, ys) or not self.blit or self.window is not None
+
+
+class FastFigure:
+    def __init__(self, title: str = ''):
+        self.title = title
+        self.lines: list[FastLine] = []
+        self.fig = None
+
+    def add_line(self, x_col, y_col, **kwargs) -> FastLine:
+        line = FastLine(x_col, y_col, **kwargs)
+        self.lines.append(line)
+        return line
+
+
+class FastPlotManager:
+    """`PlotManager`-compatible renderer with decimation, blitting and an fps cap.
+
+    Parameters
+    ----------
+    fps : float, optional
+        Most redraws per second, by default 30.
+    backend_show : bool, optional
+        Open windows on :meth:`show_plots`, by default True (False renders
+        off-screen, e.g. for benchmarks).
+    """
+
+    def __init__(self, fps: float = 30.0, backend_show: bool = True):
+        self.fps = fps
+        self.backend_show = backend_show
+        self.figures: list[FastFigure] = []
+        self.frames = 0
+        self._last_draw = 0.0
+
+    def add_figure(self, title: str = '', **kwargs) -> FastFigure:
+        fig = FastFigure(title)
+        self.figures.append(fig)
+        return fig
+
+    @property
+    def lines(self) -> list[FastLine]:
+        return [line for fig in self.figures for line in fig.lines]
+
+    def show_plots(self) -> None:
+        import matplotlib.pyplot as plt
+
+        for f in self.figures:
+            n = max(1, len(f.lines))
+            ncols = min(n, 2)
+            f.fig, axes = plt.subplots(math.ceil(n / ncols), ncols, squeeze=False)
+            f.fig.suptitle(f.title)
+            for line, ax in zip(f.lines, axes.flat):
+                line.attach(ax)
+            f.fig.canvas.mpl_connect('resize_event', lambda _e, f=f: self._full_draw(f))
+            f.fig.canvas.draw()
+            self._full_draw(f)
+        if self.backend_show:
+            plt.show(block=False)
+
+    def update_rows(self, rows: np.ndarray, columns: list[str]) -> None:
+        """Append a block of rows (``(n, len(columns))`` array) to every line."""
+        if not len(rows):
+            return
+        index = {c: j for j, c in enumerate(columns)}
+        for line in self.lines:
+            line.extend(rows, index)
+
+    def update_all(self, row) -> None:
+        """Append one row given as a pandas Series (PlotManager-style)."""
+        self.update_rows(np.asarray(row, dtype=float)[None, :], list(row.index))
+
+    def _full_draw(self, f: FastFigure) -> None:
+        canvas = f.fig.canvas
+        canvas.draw()
+        for line in f.lines:
+            line._background = canvas.copy_from_bbox(line.ax.bbox)
+            for artist in line.artists:
+                line.ax.draw_artist(artist)
+        canvas.blit(f.fig.bbox)
+
+    def draw(self, force: bool = False) -> bool:
+        """Redraw changed lines if a frame is due. Returns True if it drew."""
+        now = perf_counter()
+        if not force and now - self._last_draw < 1.0 / self.fps:
+            return False
+        self._last_draw = now
+        for f in self.figures:
+            changed = [line for line in f.lines if line._dirty]
+            if not changed:
+                continue
+            full = [line.refresh() for line in changed]
+            if any(full):
+                self._full_draw(f)
+                continue
+            canvas = f.fig.canvas
+            for line in changed:
+                canvas.restore_region(line._background)
+                for artist in line.artists:
+                    line.ax.draw_artist(artist)
+                canvas.blit(line.ax.bbox)
+            canvas.flush_events()
+        self.frames += 1
+        return True
+
+    def wait_frame(self) -> None:
+        """Process GUI events and sleep until the next frame is due."""
+        for f in self.figures:
+            f.fig.canvas.flush_events()
+        remaining = self._last_draw + 1.0 / self.fps - perf_counter()
+        if remaining > 0:
+            sleep(remaining)
+
+
+def benchmark(minutes: float = 10.0, rate_hz: float = 50.0, seconds: float = 5.0) -> None:
+    """Frame rate and lag after `minutes` of `rate_hz` data, fast vs. naive redraw."""
+    import matplotlib
+
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    from shm_plotting import plotted_columns
+    from student_plotting import setup_plotting
+
+    columns = plotted_columns(setup_plotting)
+    rng = np.random.default_rng(0)
+
+    def make_rows(n, t0):
+        rows = np.cumsum(rng.normal(0, 0.01, (n, len(columns))), axis=0)
+        rows[:, columns.index('t_elapsed')] = t0 + np.arange(n) / rate_hz
+        return rows
+
+    history = make_rows(int(minutes * 60 * rate_hz), 0.0)
+
+    for name, kwargs in [
+        ('naive (no decimation, full redraw)', dict(decimate=False, blit=False)),
+        ('fast (min/max decimation + blit)', dict(decimate=True, blit=True)),
+    ]:
+        pm = setup_plotting(FastPlotManager(fps=1000, backend_show=False))
+        for line in pm.lines:
+            line.decimate, line.blit = kwargs['decimate'], kwargs['blit']
+        pm.show_plots()
+        pm.update_rows(history, columns)
+        pm.draw(force=True)
+
+        # Stream live data at `rate_hz`, drawing whenever new rows arrived.
+        # Lag is from the arrival of the oldest undrawn row until it is drawn.
+        t_data = history[-1, columns.index('t_elapsed')]
+        lags = []
+        frames = 0
+        start = next_row = perf_counter()
+        while perf_counter() - start < seconds:
+            now = perf_counter()
+            if now < next_row:
+                sleep(next_row - now)
+                continue
+            n_new = int((now - next_row) * rate_hz) + 1
+            oldest = next_row
+            pm.update_rows(make_rows(n_new, t_data), columns)
+            t_data += n_new / rate_hz
+            next_row += n_new / rate_hz
+            pm.draw(force=True)
+            lags.append(perf_counter() - oldest)
+            frames += 1
+        fps = frames / (perf_counter() - start)
+        print(
+            f'{name:<36} {fps:7.1f} fps, lag mean {np.mean(lags) * 1e3:7.1f} ms, '
+            f'max {np.max(lags) * 1e3:7.1f} ms'
+        )
+        plt.close('all')
+
+
+if __name__ == '__main__':
+    benchmark()
@@ -0,0 +1,330 @@
+"""Drive several robots from one process.
+
+Instead of one copy of `main()` per robot with its own hard-coded
+`smartbot_num` and `host`, list the robots once::
+
+    from goto_aruco import Params, step
+
+    specs = [RobotSpec(step, Params(), mode='sim', smartbot_num=n) for n in range(1, 6)]
+    fleet = FleetRunner(specs, log_file='fleet')
+    fleet.run()  # Until Ctrl+C (or `max_ticks` ticks per robot).
+    logger.info(fleet.report())
+
+Each robot gets an :class:`async_runner.AsyncRunner` and they all share one
+asyncio event loop:
+
+- Sensor and command I/O for every robot runs in a thread pool sized for
+  two blocking calls per robot, so a slow link only delays its own robot.
+- `step()` runs in a shared compute pool (`workers` threads), so one robot's
+  controller doesn't hold up the other robots' schedules. Controllers that
+  spend their time in NumPy run in parallel; pure-Python ones take turns.
+  Robots sharing that pool don't evict each other's scan views:
+  `scan_processing.scan_view()` caches one view per scan object.
+- Every robot logs to its own CSV, ``{log_file}_{name}_{timestamp}.csv``,
+  and keeps its own loop statistics (see `report()`).
+
+Robots don't share anything else, so each spec needs its own `Params`.
+Sim robots poll `spin()` at their control rate, real ones as fast as the
+link answers.
+
+Run this file to check that 1-20 robots all hold 20Hz, on the simulator or
+on a local fake rosbridge link.
+"""
+
+import asyncio
+import logging
+import os
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from dataclasses import dataclass
+from time import sleep
+from typing import Any
+
+from smartbot_irl import Command
+from smartbot_irl.data import timestamp
+
+from async_runner import AsyncRunner
+from column_state import ColumnState
+from log_writer import CsvStreamWriter
+from queued_logger import QueuedLogger
+
+logger = QueuedLogger(level=logging.INFO)
+
+
+@dataclass
+class RobotSpec:
+    """One robot in the fleet.
+
+    Parameters
+    ----------
+    step : callable
+        ``step(bot, params, states)``, as in the run scripts.
+    params : Any
+        This robot's `Params` instance (not shared with other robots).
+    mode : str, optional
+        'sim' or 'real', by default 'sim'.
+    smartbot_num : int, optional
+        Robot number, by default 3.
+    host : str, optional
+        Robot address for mode='real', by default ``192.168.33.<smartbot_num>``.
+    port : int, optional
+        rosbridge port, by default 9090.
+    rate_hz : float, optional
+        Control rate, by default 20.
+    name : str, optional
+        Used in log file names and reports, by default ``bot<smartbot_num>``.
+    drawing : bool, optional
+        Draw this robot in the sim window, by default False.
+    connect : callable, optional
+        ``connect(spec) -> bot`` replacing the `SmartBot` setup, e.g. a
+        :class:`fake_rosbridge.RosbridgeTcpBot` or a `ReplayBot`.
+    columns : sequence of str, optional
+        Columns of the rows `step()` logs (e.g. ``StateNow.columns``), so the
+        CSV header is written once. By default taken from the rows as they
+        come.
+    """
+
+    step: Callable
+    params: Any
+    mode: str = 'sim'
+    smartbot_num: int = 3
+    host: str | None = None
+    port: int = 9090
+    rate_hz: float = 20.0
+    name: str = ''
+    drawing: bool = False
+    connect: Callable | None = None
+    columns: tuple[str, ...] | None = None
+
+    def __post_init__(self):
+        self.name = self.name or f'bot{self.smartbot_num}'
+        self.host = self.host or f'192.168.33.{self.smartbot_num}'
+
+    def make_bot(self):
+        """Create and connect this robot (blocking)."""
+        if self.connect is not None:
+            return self.connect(self)
+        from smartbot_irl import SmartBot
+
+        bot = SmartBot(mode=self.mode, drawing=self.drawing, smartbot_num=self.smartbot_num)
+        if self.mode == 'real':
+            bot.init(host=self.host, port=self.port)
+        else:
+            bot.init(drawing=self.drawing, smartbot_num=self.smartbot_num)
+        return bot
+
+
+class FleetRunner:
+    """Run every robot in `specs` concurrently on one event loop.
+
+    Parameters
+    ----------
+    specs : list[RobotSpec]
+        Robots to drive. Names must be unique.
+    log_file : str, optional
+        Prefix of the per-robot CSV logs, by default 'fleet'. None keeps rows
+        in memory only.
+    workers : int, optional
+        Threads running `step()`, by default one per core (at most one per robot).
+    max_rows : int, optional
+        Rows each robot keeps in memory, by default 10,000.
+    """
+
+    def __init__(
+        self,
+        specs: list[RobotSpec],
+        log_file: str | None = 'fleet',
+        workers: int | None = None,
+        max_rows: int = 10_000,
+    ):
+        names = [spec.name for spec in specs]
+        if len(set(names)) != len(names):
+            raise ValueError(f'Robot names must be unique, got {names}')
+        self.specs = specs
+        self.log_file = log_file
+        self.workers = workers or min(len(specs), os.cpu_count() or 1)
+        self.max_rows = max_rows
+        self.bots: dict[str, Any] = {}
+        self.states: dict[str, ColumnState] = {}
+        self.writers: dict[str, CsvStreamWriter] = {}
+        self.runners: dict[str, AsyncRunner] = {}
+        self.errors: dict[str, BaseException] = {}
+
+    def _setup(self, executor: ThreadPoolExecutor) -> None:
+        stamp = timestamp()
+        for spec in self.specs:
+            writer = None
+            if self.log_file is not None:
+                writer = self.writers[spec.name] = CsvStreamWriter(
+                    f'{self.log_file}_{spec.name}_{stamp}.csv', columns=spec.columns
+                )
+            states = self.states[spec.name] = ColumnState(max_rows=self.max_rows, writer=writer)
+            clock = getattr(spec.params, 'clock', None)
+            if clock is not None:
+                spec.params.t0 = clock.time()
+            self.runners[spec.name] = AsyncRunner(
+                self.bots[spec.name],
+                spec.step,
+                spec.params,
+                states,
+                rate_hz=spec.rate_hz,
+                executor=executor,
+                receive_hz=spec.rate_hz if spec.mode == 'sim' else None,
+            )
+
+    async def _run_one(self, name: str, max_ticks: int | None) -> None:
+        try:
+            await self.runners[name].run_async(max_ticks)
+        except Exception as e:  # One robot failing shouldn't stop the rest.
+            self.errors[name] = e
+            logger.error(f'[{name}] step() failed, robot stopped: {e!r}')
+        # Failed or done with its ticks: don't leave it driving while the others run.
+        try:
+            await asyncio.to_thread(self._stop_bot, name)
+        except Exception as e:
+            logger.error(f'[{name}] stop command failed: {e!r}')
+
+    async def _connect(self, spec: RobotSpec) -> None:
+        bot = await asyncio.to_thread(spec.make_bot)
+        self.bots[spec.name] = bot  # Right away, so `close()` stops it even if another robot fails.
+
+    async def run_async(self, max_ticks: int | None = None) -> None:
+        loop = asyncio.get_running_loop()
+        # Receive + transmit each block a thread per robot; the default pool is too small.
+        loop.set_default_executor(ThreadPoolExecutor(max_workers=2 * len(self.specs) + 4))
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='step') as executor:
+            # Let every connection finish before raising, so none is left running unrecorded.
+            results = await asyncio.gather(*(self._connect(spec) for spec in self.specs), return_exceptions=True)
+            for result in results:
+                if isinstance(result, BaseException):
+                    raise result
+            self._setup(executor)
+            await asyncio.gather(*(self._run_one(name, max_ticks) for name in self.runners))
+
+    def run(self, max_ticks: int | None = None) -> None:
+        """Run until every robot did `max_ticks` ticks or Ctrl+C, then stop all robots."""
+        try:
+            asyncio.run(self.run_async(max_ticks))
+        except KeyboardInterrupt:
+            logger.info(msg='Shutting down fleet...')
+        finally:
+            self.close()
+
+    def _stop_bot(self, name: str) -> None:
+        runner = self.runners.get(name)
+        with nullcontext() if runner is None else runner.bot_lock:  # A `spin()` may still be running.
+            self.bots[name].write(Command(wheel_vel_left=0.0, wheel_vel_right=0.0, linear_vel=0.0, angular_vel=0.0))
+
+    def close(self) -> None:
+        """Stop every robot, finish the logs and disconnect.
+
+        Each step is done for every robot even if it fails for some, and
+        stop commands go out first.
+        """
+        for name in self.bots:
+            try:
+                self._stop_bot(name)
+            except Exception as e:
+                logger.error(f'[{name}] stop command failed: {e!r}')
+        for name, writer in self.writers.items():
+            try:
+                writer.close()
+            except Exception as e:
+                logger.error(f'[{name}] log writer failed: {(e.__cause__ or e)!r}')
+        sleep(0.3)
+        for name, bot in self.bots.items():
+            try:
+                bot.shutdown()
+            except Exception as e:
+                logger.error(f'[{name}] shutdown failed: {e!r}')
+        self.bots.clear()
+        self.writers.clear()
+
+    def report(self) -> str:
+        """Loop statistics of every robot."""
+        lines = []
+        for name, runner in self.runners.items():
+            status = f' (stopped: {self.errors[name]!r})' if name in self.errors else ''
+            body = runner.report().replace('\n', '\n    ')
+            lines.append(f'[{name}]{status} {body}')
+        return '\n'.join(lines)
+
+
+def _bench_step(bot, params, states) -> None:
+    """Read, ~1ms of NumPy work on a 1k-beam fake scan, log a row, write a command."""
+    import numpy as np
+
+    sensors = bot.read()
+    ranges = params.rng.uniform(0.1, 8.0, (20, 1000))
+    nearest = float(np.sort(ranges, axis=1)[:, :5].mean())
+    states.append_row(
+        rowdict={
+            't_epoch': params.clock.time(),
+            'odom_x': sensors.odom.x,
+            'odom_y': sensors.odom.y,
+            'nearest': nearest,
+        }
+    )
+    bot.write(Command(linear_vel=0.2, angular_vel=0.1))
+
+
+def benchmark(
+    sizes=(1, 5, 10, 20), rate_hz: float = 20.0, n_ticks: int = 100, fake_latency: float | None = None
+) -> None:
+    """Per-robot loop period for fleets of 1-20 robots.
+
+    Uses the simulator (mode='sim') unless `fake_latency` is given, in which
+    case every robot connects to a local fake rosbridge server with that
+    one-way latency (sec).
+    """
+    from types import SimpleNamespace
+
+    import numpy as np
+
+    from clock import WallClock
+
+    server = connect = None
+    if fake_latency is not None:
+        from fake_rosbridge import FakeRosbridgeServer, RosbridgeTcpBot
+
+        server = FakeRosbridgeServer(latency=fake_latency)
+        server.start()
+
+        def connect(spec):
+            bot = RosbridgeTcpBot(port=server.port)
+            bot.init()
+            return bot
+
+    link = 'sim' if server is None else f'fake rosbridge, {fake_latency * 1e3:.0f} ms latency'
+    print(f'{link}, target period {1e3 / rate_hz:.0f} ms, ~1 ms NumPy step, {n_ticks} ticks per robot')
+    print(f'{"robots":>6} {"period mean (ms)":>17} {"worst p99 (ms)":>15} {"skipped":>8} {"step p50 (ms)":>14}')
+    try:
+        for n in sizes:
+            specs = [
+                RobotSpec(
+                    _bench_step,
+                    SimpleNamespace(rng=np.random.default_rng(i), clock=WallClock()),
+                    smartbot_num=i + 1,
+                    rate_hz=rate_hz,
+                    connect=connect,
+                )
+                for i in range(n)
+            ]
+            fleet = FleetRunner(specs, log_file=None)
+            fleet.run(max_ticks=n_ticks)
+            runners = list(fleet.runners.values())
+            periods = [r.intervals.summary() for r in runners]
+            steps = [r.step_time.summary()['p50'] for r in runners]
+            print(
+                f'{n:>6} {np.mean([p["mean"] for p in periods]) * 1e3:>17.1f} '
+                f'{max(p["p99"] for p in periods) * 1e3:>15.1f} '
+                f'{sum(r.skipped for r in runners):>8} {np.median(steps) * 1e3:>14.2f}'
+            )
+    finally:
+        if server is not None:
+            server.stop()
+
+
+if __name__ == '__main__':
+    benchmark()
@@ -0,0 +1,195 @@
+"""Tune `Params` gains by running many headless sim episodes in parallel.
+
+By default each episode drives a :class:`headless_sim.HeadlessBot` on a
+:class:`clock.SimClock`: `step()` sees simulated time, every tick advances
+the clock by `dt` without sleeping and the robot model moves by the same
+`dt`, so an episode runs far faster than real time. Episodes run until the
+controller reports it is done or `max_time` simulated seconds pass. They are
+independent, so they are spread over a `ProcessPoolExecutor`::
+
+    configs = grid_configs({'k_rho': [0.5, 1.0, 2.0], 'k_alpha': [4.0, 8.0]})
+    results = tune(configs)  # DataFrame, best configuration first.
+    print(results.head())
+
+By default this tunes `tyler_approach.step()`: an episode has converged once
+`params.long_finish` is set, and the final error is the distance from the
+robot to the marker position `step()` stored in `params.mark_x/mark_y` (NaN
+if the robot never saw a marker, see `params.go`).
+
+``backend='sim'`` runs each episode on `SmartBot(mode='sim', drawing=False)`
+instead. That simulator keeps wall time, so those episodes take as long as
+they would live.
+
+Everything runs offline. Run this file for an example search plus a 1-core
+vs. all-cores throughput comparison.
+"""
+
+import importlib
+import itertools
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+from time import perf_counter
+
+import numpy as np
+import pandas as pd
+from smartbot_irl import Command, SmartBot
+
+from clock import SimClock, WallClock
+from column_state import ColumnState
+from headless_sim import HeadlessBot
+from loop_scheduler import RateScheduler
+
+
+def grid_configs(space: dict[str, list]) -> list[dict]:
+    """Every combination of the listed values, e.g. ``{'k_rho': [0.5, 1.0]}``."""
+    names = list(space)
+    return [dict(zip(names, values)) for values in itertools.product(*space.values())]
+
+
+def random_configs(space: dict[str, tuple[float, float]], n: int, seed: int = 0) -> list[dict]:
+    """`n` configurations drawn uniformly from ``{'name': (low, high)}`` ranges."""
+    rng = np.random.default_rng(seed)
+    return [{k: float(rng.uniform(lo, hi)) for k, (lo, hi) in space.items()} for _ in range(n)]
+
+
+def run_episode(
+    config: dict,
+    module: str = 'tyler_approach',
+    done_attr: str = 'long_finish',
+    seen_attr: str = 'go',
+    max_time: float = 60.0,
+    dt: float = 0.05,
+    backend: str = 'model',
+    bot_kwargs: dict | None = None,
+    smartbot_num: int = 3,
+    seed: int = 0,
+) -> dict:
+    """Run one sim episode of `module.step()` with `module.Params(**config)`.
+
+    Parameters
+    ----------
+    config : dict
+        `Params` fields to override.
+    module : str, optional
+        Module holding `step()` and `Params`, by default 'tyler_approach'.
+    done_attr : str, optional
+        `Params` field that `step()` sets once it has converged, by default
+        'long_finish'.
+    seen_attr : str, optional
+        `Params` field that `step()` sets once it has seen the marker, by
+        default 'go'. Until then `mark_x/mark_y` mean nothing.
+    max_time : float, optional
+        Give up after this much episode time (sec), by default 60.
+    dt : float, optional
+        Control period (sec), by default 0.05 (20Hz).
+    backend : str, optional
+        'model' for a `HeadlessBot` on simulated time (default), 'sim' for
+        `SmartBot(mode='sim')` on wall time.
+    bot_kwargs : dict, optional
+        Passed to `HeadlessBot`, e.g. ``{'markers': [(3.0, -1.0)]}``.
+    smartbot_num : int, optional
+        Sim robot number for backend='sim', by default 3.
+    seed : int, optional
+        Seeds NumPy's global RNG (used by some controllers), by default 0.
+
+    Returns
+    -------
+    dict
+        `config` plus `converged`, `t_converge` (episode sec, NaN if not
+        converged), `final_err` (m, NaN if no marker was seen), `ticks`,
+        `episode_time` and `wall_time` (sec).
+    """
+    mod = importlib.import_module(module)
+    np.random.seed(seed)
+    if backend == 'model':
+        clock = SimClock(dt=dt)
+        bot = HeadlessBot(clock, **(bot_kwargs or {}))
+    elif backend == 'sim':
+        clock = WallClock()
+        bot = SmartBot(mode='sim', drawing=False, smartbot_num=smartbot_num)
+        bot.init(drawing=False, smartbot_num=smartbot_num)
+    else:
+        raise ValueError(f"backend must be 'model' or 'sim', got {backend!r}")
+    params = mod.Params(**config)
+    params.clock = clock
+    params.t0 = params.clock.time()
+    states = ColumnState(max_rows=1000)
+
+    # With a SimClock, waiting for the next tick advances the clock (and the model) by `dt`.
+    sched = RateScheduler.from_clock(1.0 / dt, clock, overrun='skip')
+    wall0 = perf_counter()
+    start = clock.monotonic()
+    t_converge = math.nan
+    final_err = math.nan
+    try:
+        while clock.monotonic() - start < max_time:
+            sched.wait()
+            mod.step(bot, params, states)
+            bot.spin()
+            if getattr(params, done_attr):
+                t_converge = clock.monotonic() - start
+                break
+        if getattr(params, seen_attr):
+            odom = bot.read().odom
+            final_err = math.hypot(params.mark_x - odom.x, params.mark_y - odom.y)
+        bot.write(Command(linear_vel=0.0, angular_vel=0.0))
+    finally:
+        bot.shutdown()
+
+    return {
+        **config,
+        'converged': not math.isnan(t_converge),
+        't_converge': t_converge,
+        'final_err': final_err,
+        'ticks': sched.ticks,
+        'episode_time': clock.monotonic() - start,
+        'wall_time': perf_counter() - wall0,
+    }
+
+
+def _run(args: tuple[dict, dict]) -> dict:
+    config, kwargs = args
+    return run_episode(config, **kwargs)
+
+
+def tune(configs: list[dict], workers: int | None = None, **episode_kwargs) -> pd.DataFrame:
+    """Run one episode per configuration on `workers` processes (default: all cores).
+
+    Extra keyword arguments go to :func:`run_episode`. Returns one row per
+    configuration, sorted converged first, then by `t_converge` and
+    `final_err`.
+    """
+    workers = workers or os.cpu_count() or 1
+    jobs = [(config, episode_kwargs) for config in configs]
+    chunksize = max(1, len(jobs) // (4 * workers))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        rows = list(pool.map(_run, jobs, chunksize=chunksize))
+    results = pd.DataFrame(rows)
+    return results.sort_values(
+        ['converged', 't_converge', 'final_err'], ascending=[False, True, True]
+    ).reset_index(drop=True)
+
+
+def benchmark(n_configs: int = 32) -> None:
+    """Random search over the polar gains on the headless model, on 1 core and on all cores."""
+    space = {'k_rho': (0.2, 2.0), 'k_alpha': (1.0, 10.0), 'k_beta': (-4.0, 0.0)}
+    configs = random_configs(space, n_configs)
+
+    timings = {}
+    for workers in sorted({1, os.cpu_count() or 1}):
+        t0 = perf_counter()
+        results = tune(configs, workers=workers)
+        timings[workers] = perf_counter() - t0
+
+    episode_time = results['episode_time'].sum()
+    print(results.head(10).to_string())
+    for workers, wall in timings.items():
+        print(
+            f'{workers:3d} workers: {n_configs / wall:6.2f} episodes/s, '
+            f'{episode_time / wall:7.1f}x real time'
+        )
+
+
+if __name__ == '__main__':
+    benchmark()
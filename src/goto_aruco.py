@@ -1,18 +1,33 @@
 # demo_2dsim.py
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 import logging
-from time import time, sleep
+from time import sleep
 import math
 from math import atan2
 from smartbot_irl.robot import SmartBotType
-from smartbot_irl.utils import SmartLogger, check_realtime
 from smartbot_irl import Command, SensorData, SmartBot
-from smartbot_irl.data import State, list_sensor_columns, timestamp
+from smartbot_irl.data import list_sensor_columns, timestamp
 import numpy as np
+from clock import Clock, WallClock
+from column_state import ColumnState
+from log_writer import CsvStreamWriter
+from loop_profiler import LoopProfiler
+from loop_scheduler import RateScheduler
+from queued_logger import QueuedLogger
+from shm_plotting import ShmPlotter
+from scan_processing import scan_view
+from state_row import HEX_COLUMNS, ODOM_COLUMNS, TIME_COLUMNS, StateRow
 from student_plotting import setup_plotting
-from student_teleop import get_key_command
+from teleop_service import TeleopService
 
-logger = SmartLogger(level=logging.INFO)  # Print statements, but better!
+logger = QueuedLogger(level=logging.INFO)  # Print statements, but better! Writes on a background thread.
+
+
+class StateNow(StateRow):
+    """Columns of one `states` row. Add a name here to log a new column."""
+
+    __slots__ = ()
+    columns = TIME_COLUMNS + HEX_COLUMNS + ODOM_COLUMNS
 
 
 @dataclass
@@ -22,17 +37,16 @@ class Params:
     side_length: float = 2.0
     speed: float = 1.0
     turn_speed: float = 0.8
+    clock: Clock = field(default_factory=WallClock)  # `SimClock` for replayed logs and `HeadlessBot`.
     t0: float = 0.0
+    state_now: StateNow = field(default_factory=StateNow)  # Reused every tick.
 
 
 # def get_range_forward(scan: LaserScan) -> float:
-#     """For coordinate conventions see REP 103 and REP 105:
-#     https://www.ros.org/reps/rep-0105.html
-#     https://www.ros.org/reps/rep-0103.html
-#     Find range directly forward. Scan starts at -2piRAD -> ranges[0].
-#     forward_range = (0RAD - 2piRAD) / angle_per_increment)
+#     """Find range directly forward. `scan_view()` caches the beam index math
+#     (and sector lookups like `sector_min()`) for the scan's geometry.
 #     """
-#     forward_range = scan.ranges[int((0 * pi - scan.angle_min) / scan.angle_increment)]
+#     forward_range = scan_view(scan).forward_range()
 #     logger.debug(f'{forward_range=}', rate=1)
 #     return forward_range
 
@@ -75,35 +89,14 @@ def ant_controller(
         dist_to_goal = math.hypot(marker.x, marker.y)
 
     # Use only a forward chunk of the lidar ranges.
-    ranges = np.array(scan.ranges, dtype=float)  # Make a numpy array for convenience.
-    n = len(ranges)
+    view = scan_view(scan)  # NumPy ranges + cached angle tables.
 
     front_width = np.deg2rad(120)  # +/-60
     half = front_width / 2
 
-    angle_min = scan.angle_min
-    angle_inc = scan.angle_increment
-
-    # If a given range's angle is outside the span make it a NaN.
-    for i in range(n):
-        ang = angle_min + i * angle_inc
-        if ang < -half or ang > half:
-            ranges[i] = np.nan
-
-    scan.ranges = ranges.tolist()  # Back to a list type.
-
-    repulse = 0.0
-    pressure = 0.0
-
-    for i, r in enumerate(scan.ranges):
-        if not r or math.isnan(r) or math.isinf(r):
-            continue
-        if r < avoid_thresh:
-            # angle relative to robot heading
-            ang = scan.angle_min + i * scan.angle_increment
-            w = 1.0 / max(r, 0.05)  # Closer obstacles cause more repulsion.
-            repulse -= math.sin(ang) * w  # Steer away from that ranges heading.
-            pressure += w  # How much confined the robot is.
+    # Closer obstacles in the front span push harder (steer away from their
+    # heading), `pressure` is how confined the robot is.
+    repulse, pressure = view.repulsion(half_width=half, avoid_thresh=avoid_thresh)
 
     # Normalize repulsion
     if pressure > 0:
@@ -148,20 +141,20 @@ def ant_controller(
     return cmd
 
 
-def step(bot: SmartBotType, params: Params, states: State) -> None:
+def step(bot: SmartBotType, params: Params, states: ColumnState) -> None:
     """This is the main control loop for the robot. Code here should run in <50ms."""
 
     # Get info about previous timestep state.
     state_prev = states.last
     t_prev = state_prev.t_epoch  # Last timestamp (sec).
 
-    # Create current state vector.
-    t = time()
-    state_now = {
-        't_epoch': t,  # Seconds since Jan 1 1970.
-        't_delta': t - t_prev,  # Seconds since last time step.
-        't_elapsed': t - params.t0,  # Seconds since program start.
-    }
+    # Fill in the current state vector (columns not set this tick stay NaN).
+    t = params.clock.time()
+    state_now = params.state_now
+    state_now.clear()
+    state_now.t_epoch = t  # Seconds since Jan 1 1970.
+    state_now.t_delta = t - t_prev  # Seconds since last time step.
+    state_now.t_elapsed = t - params.t0  # Seconds since program start.
 
     sensors = bot.read()
 
@@ -172,15 +165,15 @@ def step(bot: SmartBotType, params: Params, states: State) -> None:
         hex_y = sensors.seen_hexes.poses[0].y
         hex_yaw = sensors.seen_hexes.poses[0].yaw
 
-        # Add new columns to our state vector (So we can plot!).
-        state_now['hex_x'] = hex_x
-        state_now['hex_y'] = hex_y
-        state_now['hex_yaw'] = hex_yaw
+        # Fill in the hex columns (So we can plot!).
+        state_now.hex_x = hex_x
+        state_now.hex_y = hex_y
+        state_now.hex_yaw = hex_yaw
 
     # Do stuff odom data.
-    state_now['odom_x'] = sensors.odom.x
-    state_now['odom_y'] = sensors.odom.y
-    state_now['odom_yaw'] = sensors.odom.yaw
+    state_now.odom_x = sensors.odom.x
+    state_now.odom_y = sensors.odom.y
+    state_now.odom_yaw = sensors.odom.yaw
 
     # Get a populated Command object from our controller function.
     cmd = ant_controller(sensors)
@@ -196,8 +189,8 @@ def step(bot: SmartBotType, params: Params, states: State) -> None:
     bot.write(cmd)
 
     # Update our `states` matrix by inserting our `state_now` vector.
-    states.append_row(rowdict=state_now)
-    logger.info(f'\nState (t={state_now["t_elapsed"]}): {state_now}')
+    states.append_row(state_now)  # One copy, no dict.
+    logger.info('\nState (t=%s): %s', state_now.t_elapsed, state_now)  # Only formatted if INFO is on.
 
 
 def main(log_file='smartlog') -> None:
@@ -218,45 +211,98 @@ def main(log_file='smartlog') -> None:
     bot = SmartBot(mode='sim', drawing=True, draw_region=((-10, 10), (-10, 10)), smartbot_num=7)
     bot.init(host='192.168.33.7', port=9090)
 
+    # Record raw sensor data for offline replay (needs `from sensor_log import RecordingBot`):
+    # bot = RecordingBot(bot, f'{log_file}_{timestamp()}.sblog')
+    # Or replay a recording instead of connecting (needs `from sensor_log import ReplayBot`):
+    # bot = ReplayBot('smartlog_<timestamp>.sblog', speed=None)
+
+    # Or a headless model on simulated time, far faster than real time (needs `from headless_sim import HeadlessBot`):
+    # bot = HeadlessBot()
+
     # Create empty parameter and state objects.
-    states = State()  # This gets saved to a CSV.
+    log_filename = f'{log_file}_{timestamp()}.csv'
+    # Streams each new row to the CSV in the background.
+    writer = CsvStreamWriter(log_filename, columns=StateNow.columns)
+    # Or a binary log that reloads faster (needs `from chunk_log import ChunkLogWriter`):
+    # writer = ChunkLogWriter(f'{log_file}_{timestamp()}.chunks')
+    states = ColumnState(max_rows=10_000, writer=writer)  # Keeps recent rows in memory.
     params = Params()  # We can access this later in step().
-    params.t0 = time()  # Record start time for this run (sec).
+    # params.clock = bot.clock  # With `HeadlessBot`: run `step()` and the schedule on its simulated time.
+    params.t0 = params.clock.time()  # Record start time for this run (sec).
 
     # Print out what columns exist (There may be more added later!)
     logger.info(msg=f'State Columns: {list_sensor_columns()}')
 
     # Set up plotting.
-    plot_manager = setup_plotting()
-    plot_manager.start_plot_proc()
+    plotter = ShmPlotter(setup_plotting)  # Plots run in their own process.
+    plotter.start()
+
+    # Time each part of the loop. A report is logged at shutdown (or on `kill -USR1 <pid>`).
+    prof = LoopProfiler(deadline=0.05)  # Warns if a loop takes longer than 50ms.
+    prof.instrument(bot, 'read', 'write')
+    prof.instrument(states, 'append_row', prefix='states')
+
+    # Start each loop on a fixed 20Hz schedule of `params.clock` so `t_delta` stays steady.
+    sched = RateScheduler.from_clock(20, params.clock, overrun='skip')
+
+    # Watch for quit keypresses, polled once per loop on this (the window's) thread.
+    teleop = TeleopService()
+
+    # Over a slow link to the real robot, run sensor/command I/O as separate tasks instead
+    # of this loop (needs `from async_runner import AsyncRunner`):
+    # AsyncRunner(bot, step, params, states, rate_hz=20, plotter=plotter).run()
 
     try:
         while True:
+            sched.wait()  # Sleep until the next loop is due.
+            prof.start_tick()
             step(bot, params, states)  # Run our code.
-            check_realtime(start_t=time())  # Check if our step() is taking too long.
+            prof.mark('step')
             bot.spin()  # Get new sensor data.
+            prof.mark('spin1')
 
-            get_key_command()  # Need this to process quit keypresses.
+            teleop.poll()
+            teleop.check_quit()  # Raises KeyboardInterrupt after `q`.
+            prof.mark('keys')
 
             bot.spin()  # Get new sensor data.
+            prof.mark('spin2')
 
             # Send last row of data to plots.
-            plot_manager.update_queue(states.iloc[-1])
+            plotter.push(states)
+            prof.mark('plot')
+            prof.end_tick()  # Check if our loop is taking too long.
 
     except KeyboardInterrupt:
         logger.info(msg='Shutting down...')
     finally:
-        # Save data to a CSV file and cleanup ros+matplotlib objects.
-        log_filename = f'{log_file}_{timestamp()}.csv'
-        states.to_csv(log_filename)
-        logger.info(f'Done saving to {log_filename}')
-        plot_manager.stop_plot_proc()
-
-        # Stop robot driving away.
-        cmd = Command(wheel_vel_left=0.0, wheel_vel_right=0.0, linear_vel=0.0, angular_vel=0.0)
-        bot.write(cmd)
-        sleep(0.3)
-        bot.shutdown()
+        # Stop robot driving away first: everything below may block or fail.
+        try:
+            bot.write(Command(wheel_vel_left=0.0, wheel_vel_right=0.0, linear_vel=0.0, angular_vel=0.0))
+        except Exception as e:
+            logger.error(f'Stop command failed: {e!r}')
+
+        # Finish writing the CSV file and cleanup ros+matplotlib objects.
+        # Each step is guarded so one failure doesn't skip the rest.
+        try:
+            writer.close()
+            logger.info(f'Done saving to {", ".join(writer.paths)}')
+        except Exception as e:
+            logger.error(f'Log writer failed: {(e.__cause__ or e)!r}')
+        prof.log_report()
+        logger.info(sched.report())
+        logger.info(f'Plot rows: {plotter.stats}')
+        try:
+            plotter.stop()
+        except Exception as e:
+            logger.error(f'Plotter stop failed: {e!r}')
+
+        sleep(0.3)  # Let the stop command go out.
+        try:
+            bot.shutdown()
+        except Exception as e:
+            logger.error(f'Shutdown failed: {e!r}')
+        logger.close()  # Write out any queued log messages.
 
 
 if __name__ == '__main__':
@@ -0,0 +1,190 @@
+"""A headless robot model that runs on a :class:`clock.SimClock`.
+
+`SmartBot(mode='sim')` runs its physics on the wall clock, so a 60 second
+episode takes 60 seconds. :class:`HeadlessBot` has the same `read()`,
+`write()`, `spin()` interface but no window and no physics thread of its
+own: every `spin()` moves a unicycle (the model `polar_control` rolls out)
+by however much its clock advanced since the last `spin()`. With a
+`SimClock`, a `RateScheduler.from_clock()` wait advances that clock, so the
+usual loop runs as fast as the CPU allows::
+
+    bot = HeadlessBot(markers=[(2.0, 0.5)])   # Owns a SimClock(dt=0.05).
+    params.clock = bot.clock                  # `step()` sees simulated time.
+    sched = RateScheduler.from_clock(20, params.clock)
+    while True:
+        sched.wait()                          # Advances the clock, no sleeping.
+        step(bot, params, states)
+        bot.spin()                            # Moves the robot by that time.
+
+`read()` gives odom (exact, no noise), imu (``ax`` forward acceleration,
+``ay`` centripetal, ``az`` gravity, ``wz`` yaw rate), a 360-beam scan of a
+square room around the origin and the markers inside the camera's range and
+field of view, as body-frame `seen_hexes` poses. Commands use `linear_vel`
+and `angular_vel`, clipped to the speed limits.
+
+Run this file to time `tyler_approach.step()` against the model and compare
+simulated time with wall time.
+"""
+
+import math
+from time import perf_counter
+from types import SimpleNamespace
+
+import numpy as np
+
+from clock import Clock, SimClock
+from sensor_log import ReplaySensors
+
+
+class HeadlessBot:
+    """Stand-in for `SmartBot` whose physics is stepped by `clock`.
+
+    Parameters
+    ----------
+    clock : Clock, optional
+        Time source, by default a new ``SimClock(dt=0.05)``. A `WallClock`
+        runs the model in real time.
+    pose : tuple[float, float, float], optional
+        Start pose ``(x, y, yaw)``, by default the origin.
+    markers : list of tuple, optional
+        ``(x, y)`` or ``(x, y, yaw)`` marker poses in the world frame; the
+        marker id is the list index. By default one marker at (2.0, 0.5).
+    view_range : float, optional
+        Markers further away than this are not seen (m), by default 4.0.
+    fov : float, optional
+        Camera field of view (RAD), by default 1.2.
+    room : float or None, optional
+        Half-width of the square room the lidar sees (m), by default 6.0.
+        None for no scan.
+    n_beams : int, optional
+        Lidar beams per scan, by default 360.
+    max_lin_vel, max_ang_vel : float, optional
+        Commands are clipped to these (m/s, RAD/s), by default 0.5 and 2.0.
+    """
+
+    def __init__(
+        self,
+        clock: Clock | None = None,
+        pose=(0.0, 0.0, 0.0),
+        markers=((2.0, 0.5),),
+        view_range: float = 4.0,
+        fov: float = 1.2,
+        room: float | None = 6.0,
+        n_beams: int = 360,
+        max_lin_vel: float = 0.5,
+        max_ang_vel: float = 2.0,
+    ):
+        self.clock = clock or SimClock(dt=0.05)
+        self.x, self.y, self.yaw = pose
+        self.markers = [(m[0], m[1], m[2] if len(m) > 2 else 0.0) for m in markers]
+        self.view_range = view_range
+        self.fov = fov
+        self.room = room
+        self.max_lin_vel = max_lin_vel
+        self.max_ang_vel = max_ang_vel
+        self.v = 0.0
+        self.w = 0.0
+        self.commands = 0
+        self.spins = 0
+        self._ax = 0.0
+        self._v_prev = 0.0
+        self._angles = -math.pi + np.arange(n_beams) * (2 * math.pi / n_beams)
+        self._last = self.clock.monotonic()
+        self._sensors = self._sense()
+
+    def init(self, *args, **kwargs) -> None:
+        self._last = self.clock.monotonic()
+
+    def read(self) -> ReplaySensors:
+        return self._sensors
+
+    def write(self, cmd) -> None:
+        self.v = min(max(cmd.linear_vel, -self.max_lin_vel), self.max_lin_vel)
+        self.w = min(max(cmd.angular_vel, -self.max_ang_vel), self.max_ang_vel)
+        self.commands += 1
+
+    def spin(self) -> None:
+        """Move by the clock time since the last `spin()` and sense again."""
+        now = self.clock.monotonic()
+        elapsed, self._last = now - self._last, now
+        if elapsed > 0:
+            v, w = self.v, self.w
+            # Exact unicycle motion for constant (v, w) over `elapsed`.
+            if abs(w) < 1e-9:
+                self.x += v * math.cos(self.yaw) * elapsed
+                self.y += v * math.sin(self.yaw) * elapsed
+            else:
+                yaw1 = self.yaw + w * elapsed
+                self.x += v / w * (math.sin(yaw1) - math.sin(self.yaw))
+                self.y -= v / w * (math.cos(yaw1) - math.cos(self.yaw))
+                self.yaw = yaw1
+            self.yaw = (self.yaw + math.pi) % (2 * math.pi) - math.pi
+            self._ax = (v - self._v_prev) / elapsed
+            self._v_prev = v
+        self._sensors = self._sense()
+        self.spins += 1
+
+    def _sense(self) -> ReplaySensors:
+        x, y, yaw = self.x, self.y, self.yaw
+        odom = SimpleNamespace(x=x, y=y, yaw=yaw)
+        imu = SimpleNamespace(ax=self._ax, ay=self.v * self.w, az=9.81, wz=self.w)
+
+        scan = None
+        if self.room is not None:
+            c, s = np.cos(self._angles + yaw), np.sin(self._angles + yaw)
+            half = self.room
+            with np.errstate(divide='ignore', invalid='ignore'):
+                tx = np.where(c > 0, (half - x) / c, (-half - x) / c)
+                ty = np.where(s > 0, (half - y) / s, (-half - y) / s)
+            r = np.minimum(np.abs(tx), np.abs(ty))
+            scan = SimpleNamespace(
+                ranges=r.tolist(), angle_min=float(self._angles[0]), angle_increment=2 * math.pi / len(r)
+            )
+
+        c, s = math.cos(yaw), math.sin(yaw)
+        poses = []
+        for marker_id, (mx, my, myaw) in enumerate(self.markers):
+            dx, dy = mx - x, my - y
+            bx, by = c * dx + s * dy, -s * dx + c * dy  # Body frame.
+            if math.hypot(bx, by) <= self.view_range and abs(math.atan2(by, bx)) <= self.fov / 2:
+                poses.append(SimpleNamespace(x=bx, y=by, yaw=myaw - yaw, marker_id=marker_id))
+        return ReplaySensors(odom=odom, imu=imu, scan=scan, seen_hexes=SimpleNamespace(poses=poses))
+
+    def place_hex(self, *args, **kwargs) -> None:
+        pass
+
+    def shutdown(self) -> None:
+        pass
+
+
+def benchmark(max_time: float = 60.0, rate_hz: float = 20.0) -> None:
+    """Run `tyler_approach.step()` against the model until it reaches the marker."""
+    import tyler_approach
+    from column_state import ColumnState
+    from loop_scheduler import RateScheduler
+
+    bot = HeadlessBot()
+    params = tyler_approach.Params(clock=bot.clock)
+    params.t0 = params.clock.time()
+    states = ColumnState(max_rows=10_000)
+    sched = RateScheduler.from_clock(rate_hz, params.clock)
+
+    wall0 = perf_counter()
+    while params.clock.monotonic() < max_time and not params.long_finish:
+        sched.wait()
+        tyler_approach.step(bot, params, states)
+        bot.spin()
+    wall = perf_counter() - wall0
+    sim = params.clock.monotonic()
+
+    mark = bot.markers[0]
+    print(f'{sched.ticks} ticks, {sim:.2f} s simulated in {wall * 1e3:.1f} ms ({sim / wall:,.0f}x real time)')
+    print(
+        f'converged: {params.long_finish}, final distance to marker '
+        f'{math.hypot(mark[0] - bot.x, mark[1] - bot.y):.3f} m'
+    )
+    tyler_approach.logger.close()
+
+
+if __name__ == '__main__':
+    benchmark()
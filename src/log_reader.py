@@ -0,0 +1,255 @@
+"""Time-indexed, memory-mapped reader for chunk logs.
+
+`t_elapsed` (and `t_epoch`) only ever increase, so a time window is a
+contiguous run of rows that two binary searches can find. Windows are
+half-open, ``t_start <= t < t_end``, so back-to-back windows never share a
+row. `LogReader`
+memory-maps one flat ``.npy`` file per column and hands out windows as
+zero-copy array views, which keeps sweeping hundreds of windows over a long
+log cheap and works on logs larger than RAM::
+
+    log = LogReader('smartlog_<ts>.chunks')
+    win = log.window(1.2, 3.5, columns=['odom_x', 'odom_y'])
+    for t0, win in log.windows(duration=5.0, columns=['odom_x']):
+        ...
+
+The flat column files are built from the chunks the first time a log is
+opened (see :func:`consolidate`). Convert an old CSV first with
+:func:`chunk_log.csv_to_chunklog`.
+
+Run this file to benchmark window sweeps against boolean masks on a DataFrame.
+"""
+
+import json
+import os
+import shutil
+import tempfile
+from time import perf_counter
+
+import numpy as np
+
+from chunk_log import csv_to_chunklog, read_index
+
+FLAT_DIR = 'flat'
+FLAT_META = 'meta.json'  # Chunks and rows the flat files were built from.
+
+
+def _flat_meta(flat: str) -> dict | None:
+    try:
+        with open(os.path.join(flat, FLAT_META)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def consolidate(path, force: bool = False) -> str:
+    """Join a chunk log's chunks into one ``.npy`` file per column.
+
+    Files are filled through memory maps one chunk at a time, so this never
+    holds more than one chunk in RAM. Columns missing from a chunk are NaN.
+    Existing flat files are reused unless `force` is set or the log has
+    gained chunks or rows since they were built (e.g. a log still being
+    written).
+
+    Returns
+    -------
+    str
+        Directory holding the flat column files (``<path>/flat``).
+    """
+    flat = os.path.join(path, FLAT_DIR)
+    index = read_index(path)
+    chunks = index['chunks']
+    n_rows = sum(chunk['rows'] for chunk in chunks)
+    meta = {'chunks': len(chunks), 'rows': n_rows}
+    if not force and _flat_meta(flat) == meta:
+        return flat
+    columns = list(dict.fromkeys(c for chunk in chunks for c in chunk['columns']))
+
+    tmp = flat + '.tmp'
+    shutil.rmtree(tmp, ignore_errors=True)  # Left over from a crashed run.
+    os.makedirs(tmp)
+    for col in columns:
+        out = np.lib.format.open_memmap(
+            os.path.join(tmp, f'{col}.npy'), mode='w+', dtype=np.float64, shape=(n_rows,)
+        )
+        start = 0
+        for chunk in chunks:
+            stop = start + chunk['rows']
+            if col in chunk['columns']:
+                out[start:stop] = np.load(
+                    os.path.join(path, chunk['name'], f'{col}.npy'), mmap_mode='r'
+                )
+            else:
+                out[start:stop] = np.nan
+            start = stop
+        out.flush()
+        del out
+    with open(os.path.join(tmp, FLAT_META), 'w') as f:
+        json.dump(meta, f)
+    shutil.rmtree(flat, ignore_errors=True)
+    os.replace(tmp, flat)
+    return flat
+
+
+class LogReader:
+    """Binary-search time windows out of a memory-mapped chunk log.
+
+    Parameters
+    ----------
+    path : str
+        Chunk log directory (``.chunks``) or a ``.csv`` log, which is
+        converted to a chunk log next to it first.
+    time_col : str, optional
+        Monotonic time column used for lookups, by default `t_elapsed`.
+        `t_epoch` works as well.
+    """
+
+    def __init__(self, path, time_col: str = 't_elapsed'):
+        path = os.fspath(path)
+        if path.endswith('.csv'):
+            chunk_path = os.path.splitext(path)[0] + '.chunks'
+            path = chunk_path if os.path.isdir(chunk_path) else csv_to_chunklog(path)
+        self.path = path
+        self._flat = consolidate(path)
+        self._arrays: dict[str, np.ndarray] = {}
+        self.columns = sorted(
+            os.path.splitext(name)[0] for name in os.listdir(self._flat) if name.endswith('.npy')
+        )
+        self.time_col = time_col
+        self.t = self.column(time_col)
+        self._check_monotonic()
+
+    def _check_monotonic(self, block: int = 1 << 20) -> None:
+        t = self.t
+        for start in range(0, max(len(t) - 1, 0), block):
+            seg = t[start : start + block + 1]
+            if not np.all(seg[1:] >= seg[:-1]):
+                raise ValueError(f'{self.time_col!r} is not monotonic (or has NaNs) in {self.path}')
+
+    def __len__(self) -> int:
+        return len(self.t)
+
+    def column(self, name: str) -> np.ndarray:
+        """Read-only memory map of a whole column."""
+        arr = self._arrays.get(name)
+        if arr is None:
+            if name not in self.columns:
+                raise KeyError(f'no column {name!r} in {self.path}')
+            arr = np.load(os.path.join(self._flat, f'{name}.npy'), mmap_mode='r')
+            self._arrays[name] = arr
+        return arr
+
+    def index_range(self, t_start: float, t_end: float) -> tuple[int, int]:
+        """Row range ``[i0, i1)`` with ``t_start <= t < t_end``, in O(log n)."""
+        i0 = int(np.searchsorted(self.t, t_start, side='left'))
+        i1 = int(np.searchsorted(self.t, t_end, side='left'))
+        return i0, max(i0, i1)
+
+    def window(self, t_start: float, t_end: float, columns: list[str] | None = None) -> dict:
+        """Columns over ``[t_start, t_end)`` as zero-copy views, keyed by name.
+
+        Half-open like :meth:`windows`: a row exactly at `t_end` is left out.
+        """
+        i0, i1 = self.index_range(t_start, t_end)
+        return {name: self.column(name)[i0:i1] for name in (columns or self.columns)}
+
+    def windows(
+        self,
+        duration: float,
+        step: float | None = None,
+        columns: list[str] | None = None,
+        t_start: float | None = None,
+        t_end: float | None = None,
+    ):
+        """Iterate over fixed-duration windows ``[t0, t0 + duration)``.
+
+        Half-open like :meth:`window`, so back-to-back windows split the
+        rows between them without overlap.
+
+        Parameters
+        ----------
+        duration : float
+            Window length (sec).
+        step : float, optional
+            Distance between window starts (sec), by default `duration`
+            (back-to-back windows).
+        columns : list of str, optional
+            Columns to include, by default all.
+        t_start, t_end : float, optional
+            Part of the log to sweep, by default all of it.
+
+        Yields
+        ------
+        tuple[float, dict]
+            Window start time and its columns (views, as in :meth:`window`).
+        """
+        if not len(self):
+            return
+        step = duration if step is None else step
+        t_start = float(self.t[0]) if t_start is None else t_start
+        t_end = float(self.t[-1]) if t_end is None else t_end
+
+        starts = np.arange(t_start, t_end, step)
+        lo = np.searchsorted(self.t, starts, side='left')
+        hi = np.searchsorted(self.t, starts + duration, side='left')
+        arrays = [(name, self.column(name)) for name in (columns or self.columns)]
+        for t0, i0, i1 in zip(starts.tolist(), lo.tolist(), hi.tolist()):
+            yield t0, {name: arr[i0:i1] for name, arr in arrays}
+
+    def to_frame(self, t_start: float, t_end: float, columns: list[str] | None = None):
+        """Window as a pandas DataFrame (this one copies)."""
+        import pandas as pd
+
+        return pd.DataFrame(self.window(t_start, t_end, columns))
+
+
+def benchmark(n_rows: int = 500_000, n_windows: int = 500) -> None:
+    """Sweep `n_windows` windows with `LogReader` vs. DataFrame boolean masks."""
+    import pandas as pd
+
+    from chunk_log import _write_chunk, _write_index
+
+    rng = np.random.default_rng(0)
+    t = np.arange(n_rows) * 0.02
+    data = {
+        't_elapsed': t,
+        'odom_x': np.cumsum(rng.normal(0, 0.01, n_rows)),
+        'odom_y': np.cumsum(rng.normal(0, 0.01, n_rows)),
+    }
+    starts = np.linspace(0, t[-1] - 2.0, n_windows)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'smartlog_bench.chunks')
+        step = 65536
+        chunks = [
+            _write_chunk(path, k, {c: v[i : i + step] for c, v in data.items()})
+            for k, i in enumerate(range(0, n_rows, step))
+        ]
+        _write_index(path, chunks)
+
+        t0 = perf_counter()
+        log = LogReader(path)
+        open_s = perf_counter() - t0
+
+        t0 = perf_counter()
+        reader_means = [log.window(s, s + 2.0, ['odom_x'])['odom_x'].mean() for s in starts]
+        reader_s = perf_counter() - t0
+
+        df = pd.DataFrame(data)
+        t0 = perf_counter()
+        mask_means = [
+            df.loc[(df['t_elapsed'] >= s) & (df['t_elapsed'] < s + 2.0), 'odom_x'].mean()
+            for s in starts
+        ]
+        mask_s = perf_counter() - t0
+        assert np.allclose(reader_means, mask_means)
+        del log
+
+    print(f'{n_rows} rows, {n_windows} windows of 2 s')
+    print(f'LogReader open + consolidate: {open_s:.3f} s')
+    print(f'boolean mask sweep: {mask_s:.3f} s ({mask_s / n_windows * 1e3:.3f} ms/window)')
+    print(f'LogReader sweep:    {reader_s:.3f} s ({reader_s / n_windows * 1e3:.3f} ms/window)')
+
+
+if __name__ == '__main__':
+    benchmark()
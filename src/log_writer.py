@@ -0,0 +1,189 @@
+"""Background writers that stream `states` rows to disk while the robot runs.
+
+Instead of keeping the whole run in memory and calling `states.to_csv()` at
+shutdown, attach a writer to :class:`column_state.ColumnState`::
+
+    writer = CsvStreamWriter(f'{log_file}_{timestamp()}.csv', columns=StateNow.columns)
+    states = ColumnState(max_rows=10_000, writer=writer)
+    ...
+    writer.close()  # In `finally:`. Only the last partial batch is left to write.
+
+Rows are handed to a bounded queue (no disk I/O in `step()`), and a daemon
+thread writes them out in batches, flushing and fsync-ing after every batch.
+If the program dies, at most the batch being collected is lost.
+"""
+
+import csv
+import logging
+import os
+import queue
+import shutil
+import threading
+from abc import ABC, abstractmethod
+from time import monotonic
+
+from queued_logger import QueuedLogger
+
+logger = QueuedLogger(level=logging.WARN)
+
+_CLOSE = object()
+
+
+class BackgroundWriter(ABC):
+    """Drain rows from a bounded queue to disk on a daemon thread.
+
+    Subclasses implement :meth:`_write_batch` and :meth:`_finish`; both only
+    ever run on the writer thread.
+
+    Parameters
+    ----------
+    batch_rows : int, optional
+        Write as soon as this many rows are waiting, by default 500.
+    flush_interval : float, optional
+        Write at least this often (sec), by default 1.0.
+    max_backlog : int, optional
+        Rows allowed to wait in memory. Rows arriving while the queue is full
+        are dropped (and counted in `dropped`) so `put()` never blocks the
+        control loop. By default 50,000.
+    """
+
+    def __init__(self, batch_rows: int = 500, flush_interval: float = 1.0, max_backlog: int = 50_000):
+        self.batch_rows = batch_rows
+        self.flush_interval = flush_interval
+        self.rows_written = 0
+        self.dropped = 0
+        self._queue: queue.Queue = queue.Queue(maxsize=max_backlog)
+        self._error: BaseException | None = None
+        self._thread = threading.Thread(target=self._run, name=type(self).__name__, daemon=True)
+        self._thread.start()
+
+    def put(self, rowdict: dict, copy: bool = True) -> None:
+        """Queue one row for writing. Never blocks.
+
+        The row is written later on another thread, so it is copied first.
+        Pass ``copy=False`` only for a dict the caller never touches again.
+        """
+        try:
+            self._queue.put_nowait(dict(rowdict) if copy else rowdict)
+        except queue.Full:
+            self.dropped += 1
+            logger.warn('%s backlog full, dropped %d rows', type(self).__name__, self.dropped, rate=1)
+
+    def close(self, timeout: float | None = 10.0) -> None:
+        """Write whatever is queued, finish the file and stop the thread."""
+        if self._thread.is_alive():
+            self._queue.put(_CLOSE)
+            self._thread.join(timeout)
+        if self._error is not None:
+            raise RuntimeError(f'{type(self).__name__} failed') from self._error
+
+    def _run(self) -> None:
+        try:
+            closing = False
+            while not closing:
+                batch = []
+                deadline = monotonic() + self.flush_interval
+                while len(batch) < self.batch_rows:
+                    try:
+                        row = self._queue.get(timeout=max(0.0, deadline - monotonic()))
+                    except queue.Empty:
+                        break
+                    if row is _CLOSE:
+                        closing = True
+                        break
+                    batch.append(row)
+                if batch:
+                    self._write_batch(batch)
+                    self.rows_written += len(batch)
+            self._finish()
+        except BaseException as err:  # Surface it from close() in the main thread.
+            self._error = err
+            logger.error(f'{type(self).__name__} stopped: {err!r}')
+
+    @abstractmethod
+    def _write_batch(self, rows: list[dict]) -> None:
+        """Write one batch of rows (writer thread only)."""
+
+    @abstractmethod
+    def _finish(self) -> None:
+        """Finish the output after the last batch (writer thread only)."""
+
+
+class CsvStreamWriter(BackgroundWriter):
+    """Stream rows to one CSV file that `pd.read_csv` can load.
+
+    While running, data goes to ``<path>.partial``; a clean :meth:`close`
+    renames it to `path`, so a leftover ``.partial`` file marks a run that
+    crashed.
+
+    Pass `columns` whenever they are known up front (``StateNow.columns``
+    for `append_row(state_now)`, the projection's `columns` for
+    `append_values()`): the header is written once, with the first batch,
+    and a crashed ``.partial`` file is complete up to its last batch.
+
+    Without `columns` (plain dict rows), the columns are the keys seen so
+    far: rows that bring new ones (e.g. `hex_x` the first time a hex is
+    seen) are written with the extra fields, and :meth:`close` copies the
+    file once to rewrite the header with every column. Until then the
+    ``.partial`` header only names the first columns.
+
+    Parameters
+    ----------
+    path : str
+        Output CSV file.
+    columns : sequence of str, optional
+        Fixed columns, in order. Keys outside them are not written.
+    **kwargs
+        Passed to :class:`BackgroundWriter`.
+    """
+
+    def __init__(self, path, columns=None, **kwargs):
+        self.path = os.fspath(path)
+        self.paths: list[str] = []  # `[path]` once closed, if any row was written.
+        self._fixed = columns is not None
+        self._columns: list[str] = list(columns or [])
+        self._known: set[str] = set(self._columns)
+        self._header: list[str] = []  # Columns in the header actually on disk.
+        self._file = None
+        self._csv = None
+        super().__init__(**kwargs)
+
+    def _sync(self) -> None:
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def _write_batch(self, rows: list[dict]) -> None:
+        if not self._fixed:
+            for row in rows:
+                if row.keys() - self._known:
+                    self._columns += [k for k in row if k not in self._known]
+                    self._known.update(row)
+        if self._file is None:
+            self._file = open(self.path + '.partial', 'w', newline='')
+            self._csv = csv.writer(self._file)
+            self._header = list(self._columns)
+            self._csv.writerow(self._header)
+        columns = self._columns
+        self._csv.writerows([row.get(c, '') for c in columns] for row in rows)
+        self._sync()
+
+    def _finish(self) -> None:
+        if self._file is None:
+            return
+        self._file.close()
+        partial = self.path + '.partial'
+        if self._header != self._columns:
+            # Columns were added after the header was written: copy the rows
+            # under the full header. Earlier, shorter rows read back as NaN.
+            with open(partial, newline='') as src, open(self.path + '.tmp', 'w', newline='') as dst:
+                src.readline()
+                csv.writer(dst).writerow(self._columns)
+                shutil.copyfileobj(src, dst)
+                dst.flush()
+                os.fsync(dst.fileno())
+            os.replace(self.path + '.tmp', self.path)
+            os.remove(partial)
+        else:
+            os.replace(partial, self.path)
+        self._file = None
+        self.paths = [self.path]
@@ -0,0 +1,241 @@
+"""Low-overhead per-phase timing for the control loop.
+
+`check_realtime()` can only say that a tick was too slow. `LoopProfiler`
+records how long each phase of every tick took (`bot.read`, `bot.write`,
+`states.append_row`, `bot.spin`, plotting, ...) into fixed log-scale
+histograms and reports p50/p95/p99/max and deadline misses::
+
+    prof = LoopProfiler(deadline=0.05)
+    prof.instrument(bot, 'read', 'write', 'spin')
+    prof.instrument(states, 'append_row')
+    while True:
+        prof.start_tick()
+        step(bot, params, states)
+        prof.mark('step')
+        bot.spin()
+        plot_manager.update_queue(states.iloc[-1])
+        prof.mark('plot')
+        prof.end_tick()
+
+Recording a sample is two `perf_counter_ns()` calls and a few integer
+operations, so it can stay on in normal runs. Call :meth:`report` at
+shutdown, or send the process SIGUSR1 to log a report mid-run.
+
+Run this file to measure the per-phase overhead.
+"""
+
+import logging
+import signal
+from time import perf_counter_ns
+
+from queued_logger import QueuedLogger
+
+logger = QueuedLogger(level=logging.INFO)  # `end_tick()` logs from the loop, so write on a background thread.
+
+# Histogram buckets: SUB buckets per power of two of nanoseconds (~19% wide).
+_SUB_BITS = 2
+_SUB = 1 << _SUB_BITS
+_N_BUCKETS = 64 * _SUB
+
+
+def _bucket(ns: int) -> int:
+    if ns < _SUB:
+        return max(ns, 0)
+    shift = ns.bit_length() - 1 - _SUB_BITS
+    return ((shift + 1) << _SUB_BITS) + ((ns >> shift) & (_SUB - 1))
+
+
+def _bucket_upper_ns(b: int) -> int:
+    """Upper edge of bucket `b` (inclusive), inverse of :func:`_bucket`."""
+    if b < _SUB:
+        return b
+    shift = (b >> _SUB_BITS) - 1
+    return (((_SUB | (b & (_SUB - 1))) + 1) << shift) - 1
+
+
+class PhaseStats:
+    """Log-scale histogram of one phase's durations."""
+
+    __slots__ = ('name', 'counts', 'n', 'total_ns', 'max_ns')
+
+    def __init__(self, name: str):
+        self.name = name
+        self.counts = [0] * _N_BUCKETS
+        self.n = 0
+        self.total_ns = 0
+        self.max_ns = 0
+
+    def add(self, ns: int) -> None:
+        # Inlined `_bucket()`, this is the hot path.
+        if ns < _SUB:
+            self.counts[max(ns, 0)] += 1
+        else:
+            shift = ns.bit_length() - 1 - _SUB_BITS
+            self.counts[((shift + 1) << _SUB_BITS) + ((ns >> shift) & (_SUB - 1))] += 1
+        self.n += 1
+        self.total_ns += ns
+        if ns > self.max_ns:
+            self.max_ns = ns
+
+    def percentile(self, q: float) -> float:
+        """Approximate `q`-th percentile (sec), accurate to one bucket (~19%)."""
+        if not self.n:
+            return 0.0
+        rank = q / 100 * self.n
+        seen = 0
+        for b, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank and count:
+                return min(_bucket_upper_ns(b), self.max_ns) / 1e9
+        return self.max_ns / 1e9
+
+    def summary(self) -> dict:
+        return {
+            'n': self.n,
+            'mean': self.total_ns / self.n / 1e9 if self.n else 0.0,
+            'p50': self.percentile(50),
+            'p95': self.percentile(95),
+            'p99': self.percentile(99),
+            'max': self.max_ns / 1e9,
+        }
+
+
+class LoopProfiler:
+    """Time the phases of each control-loop tick.
+
+    Parameters
+    ----------
+    deadline : float, optional
+        Tick budget (sec), by default 0.05. Ticks longer than this count as
+        deadline misses.
+    report_signal : signal or None, optional
+        Signal that logs a report mid-run, by default SIGUSR1 where it exists.
+        Pass None to not install a handler.
+    """
+
+    def __init__(self, deadline: float = 0.05, report_signal=getattr(signal, 'SIGUSR1', None)):
+        self.deadline_ns = int(deadline * 1e9)
+        self.phases: dict[str, PhaseStats] = {}
+        self.tick = PhaseStats('tick')
+        self.misses = 0
+        self._tick_start = 0
+        self._last = 0
+        if report_signal is not None:
+            try:
+                signal.signal(report_signal, lambda *_: self.log_report())
+            except ValueError:  # Not the main thread.
+                pass
+
+    def _stats(self, name: str) -> PhaseStats:
+        stats = self.phases.get(name)
+        if stats is None:
+            stats = self.phases[name] = PhaseStats(name)
+        return stats
+
+    def start_tick(self) -> None:
+        self._tick_start = self._last = perf_counter_ns()
+
+    def mark(self, name: str) -> None:
+        """Record the time since the previous mark (or tick start) as phase `name`."""
+        now = perf_counter_ns()
+        stats = self.phases.get(name) or self._stats(name)
+        stats.add(now - self._last)
+        self._last = now
+
+    def end_tick(self) -> float:
+        """Finish the tick. Returns its duration (sec) and logs deadline misses."""
+        ns = perf_counter_ns() - self._tick_start
+        self.tick.add(ns)
+        if ns > self.deadline_ns:
+            self.misses += 1
+            # Format arguments, not an f-string: the text is only built if it's not throttled.
+            logger.warn(
+                'Loop took %.1fms (budget %.0fms), %d misses so far',
+                ns / 1e6,
+                self.deadline_ns / 1e6,
+                self.misses,
+                rate=1,
+            )
+        return ns / 1e9
+
+    def instrument(self, obj, *methods: str, prefix: str | None = None) -> None:
+        """Time calls to ``obj.<method>`` as phases named ``<prefix>.<method>``.
+
+        The methods are replaced on this instance only. `prefix` defaults to
+        `bot` for robots and the lower-case class name otherwise.
+        """
+        if prefix is None:
+            prefix = 'bot' if hasattr(obj, 'spin') else type(obj).__name__.lower()
+        for method in methods:
+            stats = self._stats(f'{prefix}.{method}')
+            setattr(obj, method, self._timed(getattr(obj, method), stats))
+
+    @staticmethod
+    def _timed(fn, stats: PhaseStats):
+        add = stats.add
+
+        def timed(*args, **kwargs):
+            t0 = perf_counter_ns()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                add(perf_counter_ns() - t0)
+
+        return timed
+
+    def report(self) -> str:
+        """Table of per-phase stats in milliseconds."""
+        lines = [
+            f'{"phase":<22} {"n":>8} {"mean":>8} {"p50":>8} {"p95":>8} {"p99":>8} {"max":>8}'
+        ]
+        for stats in [*self.phases.values(), self.tick]:
+            s = stats.summary()
+            lines.append(
+                f'{stats.name:<22} {s["n"]:>8} '
+                + ' '.join(f'{s[k] * 1e3:8.3f}' for k in ('mean', 'p50', 'p95', 'p99', 'max'))
+            )
+        lines.append(
+            f'deadline misses: {self.misses}/{self.tick.n} (budget {self.deadline_ns / 1e6:.0f}ms)'
+        )
+        return '\n'.join(lines)
+
+    def log_report(self) -> None:
+        logger.info(f'\nLoop timing (ms):\n{self.report()}')
+
+
+def benchmark(n: int = 1_000_000) -> None:
+    """Measure the cost of `mark()` and of an instrumented call."""
+
+    class _Dummy:
+        def spin(self):
+            pass
+
+    prof = LoopProfiler(report_signal=None)
+    t0 = perf_counter_ns()
+    for _ in range(n):
+        pass
+    empty = perf_counter_ns() - t0
+
+    t0 = perf_counter_ns()
+    for _ in range(n):
+        prof.mark('x')
+    mark_ns = (perf_counter_ns() - t0 - empty) / n
+
+    bot = _Dummy()
+    plain = bot.spin
+    t0 = perf_counter_ns()
+    for _ in range(n):
+        plain()
+    plain_ns = perf_counter_ns() - t0
+    prof.instrument(bot, 'spin')
+    t0 = perf_counter_ns()
+    for _ in range(n):
+        bot.spin()
+    wrapped_ns = (perf_counter_ns() - t0 - plain_ns) / n
+
+    print(f'mark(): {mark_ns:.0f} ns per phase')
+    print(f'instrument(): {wrapped_ns:.0f} ns added per call')
+
+
+if __name__ == '__main__':
+    benchmark()
@@ -0,0 +1,207 @@
+"""Fixed-rate scheduling for the control loop.
+
+Running `step()` back to back makes the loop rate (and `t_delta`) depend on
+CPU load. `RateScheduler` instead starts every tick on an absolute deadline
+``t0 + k * period`` from a monotonic clock, so timing errors don't pile up::
+
+    sched = RateScheduler(rate_hz=20)
+    while True:
+        sched.wait()  # Sleep until the next tick is due.
+        step(bot, params, states)
+        bot.spin()
+
+or, equivalently, ``sched.run(lambda: ...)``.
+
+When a tick runs past its deadline the `overrun` policy decides what to do:
+
+``'skip'``
+    Drop the missed ticks and continue on the original grid (default).
+``'catchup'``
+    Run the missed ticks immediately, back to back, up to `max_catchup`.
+``'degrade'``
+    Slow down by `degrade_factor` (down to `min_rate_hz`), and speed back
+    up after `recover_after` on-time ticks.
+
+Run this file to see the jitter statistics of each policy under load.
+"""
+
+import random
+import time
+
+from loop_profiler import PhaseStats
+
+OVERRUN_POLICIES = ('skip', 'catchup', 'degrade')
+
+
+class RateScheduler:
+    """Run the loop at a fixed rate against absolute deadlines.
+
+    Parameters
+    ----------
+    rate_hz : float
+        Target loop rate (Hz), e.g. 20, 50 or 100.
+    overrun : str, optional
+        One of ``'skip'``, ``'catchup'`` or ``'degrade'``, by default ``'skip'``.
+    max_catchup : int, optional
+        ``'catchup'`` only: most missed ticks to run back to back before
+        falling back to skipping, by default 5.
+    degrade_factor : float, optional
+        ``'degrade'`` only: period multiplier per overrun, by default 2.0.
+    min_rate_hz : float, optional
+        ``'degrade'`` only: slowest allowed rate, by default `rate_hz` / 8.
+    recover_after : int, optional
+        ``'degrade'`` only: on-time ticks before speeding up again, by default 50.
+    busy_wait : float, optional
+        Spin (instead of sleep) for the last `busy_wait` seconds before a
+        deadline, because `time.sleep` can oversleep by a millisecond or more.
+        By default 0.0005.
+    clock, sleep : callable, optional
+        Monotonic clock (sec) and sleep function, by default `time.perf_counter`
+        and `time.sleep`. Swap these to drive the loop from a simulated clock.
+    """
+
+    def __init__(
+        self,
+        rate_hz: float,
+        overrun: str = 'skip',
+        max_catchup: int = 5,
+        degrade_factor: float = 2.0,
+        min_rate_hz: float | None = None,
+        recover_after: int = 50,
+        busy_wait: float = 0.0005,
+        clock=time.perf_counter,
+        sleep=time.sleep,
+    ):
+        if overrun not in OVERRUN_POLICIES:
+            raise ValueError(f'overrun must be one of {OVERRUN_POLICIES}, got {overrun!r}')
+        self.base_period = 1.0 / rate_hz
+        self.period = self.base_period
+        self.max_period = 1.0 / (min_rate_hz or rate_hz / 8)
+        self.overrun = overrun
+        self.max_catchup = max_catchup
+        self.degrade_factor = degrade_factor
+        self.recover_after = recover_after
+        self.busy_wait = busy_wait
+        self.clock = clock
+        self.sleep = sleep
+
+        self.ticks = 0
+        self.overruns = 0  # Ticks that started after the next deadline had passed.
+        self.skipped = 0  # Deadlines dropped by 'skip' (or exceeding `max_catchup`).
+        self.jitter = PhaseStats('jitter')  # Tick start - deadline.
+        self.intervals = PhaseStats('interval')  # Tick start - previous tick start.
+
+        self._deadline: float | None = None
+        self._last_start: float | None = None
+        self._on_time = 0
+
+    @classmethod
+    def from_clock(cls, rate_hz: float, clock, **kwargs) -> 'RateScheduler':
+        """Schedule against a :class:`clock.Clock` (e.g. `params.clock`).
+
+        With a :class:`clock.SimClock`, waiting for the next tick just moves
+        the virtual clock forward, so the loop runs as fast as the CPU allows.
+        Only do that when the robot runs on the same clock
+        (:class:`headless_sim.HeadlessBot`, a replayed log): the loop would
+        race ahead of `SmartBot(mode='sim')`, which runs on the wall clock.
+        """
+        from clock import SimClock
+
+        if isinstance(clock, SimClock):
+            kwargs['busy_wait'] = 0.0  # Virtual time never moves on its own.
+        return cls(rate_hz, clock=clock.monotonic, sleep=clock.sleep, **kwargs)
+
+    @property
+    def rate_hz(self) -> float:
+        """Current target rate (lower than requested while degraded)."""
+        return 1.0 / self.period
+
+    def wait(self) -> float:
+        """Block until the next tick is due and return its start time."""
+        clock = self.clock
+        now = clock()
+        if self._deadline is None:
+            self._deadline = now
+        else:
+            self._schedule_next(now)
+
+        remaining = self._deadline - now
+        if remaining > self.busy_wait:
+            self.sleep(remaining - self.busy_wait)
+        while clock() < self._deadline:
+            pass
+
+        start = clock()
+        self.jitter.add(int((start - self._deadline) * 1e9))
+        if self._last_start is not None:
+            self.intervals.add(int((start - self._last_start) * 1e9))
+        self._last_start = start
+        self.ticks += 1
+        return start
+
+    def _schedule_next(self, now: float) -> None:
+        deadline = self._deadline + self.period
+        if now <= deadline:
+            self._deadline = deadline
+            self._on_time += 1
+            if (
+                self.overrun == 'degrade'
+                and self.period > self.base_period
+                and self._on_time >= self.recover_after
+            ):
+                self.period = max(self.base_period, self.period / self.degrade_factor)
+                self._on_time = 0
+            return
+
+        # The previous tick ran past this deadline.
+        self.overruns += 1
+        self._on_time = 0
+        missed = int((now - deadline) // self.period)  # Deadlines passed beyond `deadline`.
+        if self.overrun == 'catchup' and missed < self.max_catchup:
+            self._deadline = deadline  # Already late, so this tick starts right away.
+        elif self.overrun == 'degrade':
+            self.period = min(self.max_period, self.period * self.degrade_factor)
+            self._deadline = now  # Restart the grid from here at the slower rate.
+        else:
+            self.skipped += missed + 1
+            self._deadline = deadline + (missed + 1) * self.period
+
+    def run(self, body, max_ticks: int | None = None) -> None:
+        """Call `body()` once per tick, forever or for `max_ticks` ticks."""
+        while max_ticks is None or self.ticks < max_ticks:
+            self.wait()
+            body()
+
+    def report(self) -> str:
+        j = self.jitter.summary()
+        i = self.intervals.summary()
+        return (
+            f'{self.ticks} ticks at {self.rate_hz:.1f}Hz (asked {1 / self.base_period:.1f}Hz), '
+            f'{self.overruns} overruns, {self.skipped} skipped\n'
+            f'start jitter (ms): p50 {j["p50"] * 1e3:.3f}, p99 {j["p99"] * 1e3:.3f}, '
+            f'max {j["max"] * 1e3:.3f}\n'
+            f'period (ms): mean {i["mean"] * 1e3:.3f}, p99 {i["p99"] * 1e3:.3f}, '
+            f'max {i["max"] * 1e3:.3f}'
+        )
+
+
+def benchmark(rate_hz: float = 50, seconds: float = 4.0) -> None:
+    """Run a fake step that sometimes overruns under each policy."""
+    rng = random.Random(0)
+    period = 1.0 / rate_hz
+
+    def body():
+        # Usually 30% of the budget, 5% of ticks take 2.5 periods.
+        busy = period * (2.5 if rng.random() < 0.05 else 0.3)
+        end = time.perf_counter() + busy
+        while time.perf_counter() < end:
+            pass
+
+    for policy in OVERRUN_POLICIES:
+        sched = RateScheduler(rate_hz, overrun=policy)
+        sched.run(body, max_ticks=int(seconds * rate_hz))
+        print(f'[{policy}] {sched.report()}\n')
+
+
+if __name__ == '__main__':
+    benchmark()
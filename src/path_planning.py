@@ -0,0 +1,489 @@
+"""Incremental grid path planning with D* Lite.
+
+`DStarLite` plans on a boolean grid (True = blocked) from a start cell to a
+goal cell, 8-connected. After the first plan it keeps its search state, so
+when the robot moves or some cells change it only repairs the affected part
+of the plan instead of searching again from scratch::
+
+    planner = DStarLite(blocked, start=(10, 10), goal=(400, 300))
+    path = planner.plan()  # [(ix, iy), ...] from start to goal.
+    planner.set_start(next_cell)
+    planner.update_cells(changed_cells, new_values)
+    path = planner.plan()  # Repairs the plan.
+
+`PlannerWorker` runs this against an :class:`occupancy_grid.OccupancyGrid`
+on a background thread and publishes the latest path, so `step()` only
+hands over the robot position and reads back waypoints::
+
+    planner = PlannerWorker(grid, goal=params.goal_point)
+    planner.start()
+    ...
+    planner.set_start(sensors.odom.x, sensors.odom.y)  # In step().
+    planner.path  # World-frame waypoints [(x, y), ...], [] if none yet.
+
+Run this file to benchmark first plans and repairs on 500 x 500 and
+2000 x 2000 grids.
+"""
+
+import heapq
+import logging
+import math
+import threading
+from time import perf_counter, sleep
+
+import numpy as np
+
+from loop_profiler import PhaseStats
+from queued_logger import QueuedLogger
+
+logger = QueuedLogger(level=logging.WARN)
+
+INF = math.inf
+SQRT2 = math.sqrt(2.0)
+
+
+class DStarLite:
+    """D* Lite (Koenig & Likhachev, 2002) on an 8-connected grid.
+
+    Moves cost 1 (straight) or sqrt(2) (diagonal); moves into or out of a
+    blocked cell are impossible. The search runs from the goal back to the
+    start, which is what lets a moving start reuse it.
+
+    Parameters
+    ----------
+    blocked : np.ndarray
+        ``(W, H)`` bool array indexed ``[ix, iy]``.
+    start, goal : tuple[int, int]
+        Start and goal cells.
+    """
+
+    def __init__(self, blocked: np.ndarray, start: tuple[int, int], goal: tuple[int, int]):
+        w, h = blocked.shape
+        self.shape = (w, h)
+        # Pad with a blocked border so neighbor lookups never leave the grid.
+        self._stride = hs = h + 2
+        padded = np.ones((w + 2, h + 2), dtype=bool)
+        padded[1:-1, 1:-1] = blocked
+        self._blocked = padded.ravel().tolist()
+        self._nbrs = (
+            (-hs - 1, SQRT2), (-hs, 1.0), (-hs + 1, SQRT2), (-1, 1.0),
+            (1, 1.0), (hs - 1, SQRT2), (hs, 1.0), (hs + 1, SQRT2),
+        )  # fmt: skip
+        self.expansions = 0
+        self._start = self._index(start)
+        self._reset(self._index(goal))
+
+    def _index(self, cell: tuple[int, int]) -> int:
+        ix, iy = cell
+        if not (0 <= ix < self.shape[0] and 0 <= iy < self.shape[1]):
+            raise ValueError(f'cell {cell} is outside the {self.shape} grid')
+        return (ix + 1) * self._stride + iy + 1
+
+    def _cell(self, i: int) -> tuple[int, int]:
+        ix, iy = divmod(i, self._stride)
+        return ix - 1, iy - 1
+
+    def _reset(self, goal: int) -> None:
+        n = len(self._blocked)
+        self._goal = goal
+        self._g = [INF] * n
+        self._rhs = [INF] * n
+        self._km = 0.0
+        self._last = self._start
+        self._heap: list = []
+        self._queued: dict[int, tuple[float, float]] = {}  # Current key per queued cell.
+        self._rhs[goal] = 0.0
+        self._push(goal)
+
+    def _h(self, a: int, b: int) -> float:
+        """Octile distance between two cells."""
+        ax, ay = divmod(a, self._stride)
+        bx, by = divmod(b, self._stride)
+        dx, dy = abs(ax - bx), abs(ay - by)
+        return (dx + dy) + (SQRT2 - 2.0) * min(dx, dy)
+
+    def _key(self, i: int) -> tuple[float, float]:
+        m = min(self._g[i], self._rhs[i])
+        return (m + self._h(self._start, i) + self._km, m)
+
+    def _push(self, i: int) -> None:
+        key = self._key(i)
+        self._queued[i] = key
+        heapq.heappush(self._heap, (key[0], key[1], i))
+
+    def _update_vertex(self, u: int) -> None:
+        g, rhs, blocked = self._g, self._rhs, self._blocked
+        if u != self._goal:
+            best = INF
+            if not blocked[u]:
+                for off, cost in self._nbrs:
+                    v = u + off
+                    if not blocked[v]:
+                        c = cost + g[v]
+                        if c < best:
+                            best = c
+            rhs[u] = best
+        if g[u] != rhs[u]:
+            self._push(u)
+        else:
+            self._queued.pop(u, None)  # Its heap entry goes stale.
+
+    def _compute(self) -> None:
+        g, rhs, heap, queued = self._g, self._rhs, self._heap, self._queued
+        blocked, nbrs, start = self._blocked, self._nbrs, self._start
+        while heap:
+            k1, k2, u = heap[0]
+            if queued.get(u) != (k1, k2):
+                heapq.heappop(heap)  # Stale entry.
+                continue
+            # Keys are sums of sqrt(2)s, so compare with a little slack: stopping
+            # on a rounding error can leave a slightly longer path.
+            if k1 > self._key(start)[0] + 1e-9 and rhs[start] <= g[start]:
+                break
+            heapq.heappop(heap)
+            k_new = self._key(u)
+            if (k1, k2) < k_new:
+                queued[u] = k_new
+                heapq.heappush(heap, (k_new[0], k_new[1], u))
+                continue
+            del queued[u]
+            self.expansions += 1
+            if g[u] > rhs[u]:
+                g[u] = rhs[u]
+                for off, _ in nbrs:
+                    v = u + off
+                    if not blocked[v]:
+                        self._update_vertex(v)
+            else:
+                g[u] = INF
+                self._update_vertex(u)
+                for off, _ in nbrs:
+                    self._update_vertex(u + off)
+
+    def set_start(self, cell: tuple[int, int]) -> None:
+        """Move the start (the robot). Cheap; the search is fixed up lazily."""
+        start = self._index(cell)
+        # Queued keys were computed for the old start; `km` keeps them lower bounds.
+        self._km += self._h(self._last, start)
+        self._last = self._start = start
+
+    def set_goal(self, cell: tuple[int, int]) -> None:
+        """Change the goal. This throws away the search state."""
+        goal = self._index(cell)
+        if goal != self._goal:
+            self._reset(goal)
+
+    def update_cells(self, cells, values) -> int:
+        """Set `cells` ``[(ix, iy), ...]`` to blocked/free `values` and repair.
+
+        Returns the number of cells that actually changed.
+        """
+        blocked = self._blocked
+        changed = []
+        for cell, value in zip(cells, values):
+            i = self._index(cell)
+            if blocked[i] != bool(value):
+                blocked[i] = bool(value)
+                changed.append(i)
+        if changed:
+            self._km += self._h(self._last, self._start)
+            self._last = self._start
+            touched = set(changed)
+            for i in changed:
+                touched.update(i + off for off, _ in self._nbrs)
+            for i in touched:
+                self._update_vertex(i)
+        return len(changed)
+
+    def plan(self) -> list[tuple[int, int]]:
+        """Finish the search and return the path as cells, start first ([] if none)."""
+        self._compute()
+        g, blocked = self._g, self._blocked
+        s = self._start
+        if self._rhs[s] == INF:  # `g` of the start itself may be left unset.
+            return []
+        path = [self._cell(s)]
+        for _ in range(len(g)):
+            if s == self._goal:
+                return path
+            best, best_c = -1, INF
+            for off, cost in self._nbrs:
+                v = s + off
+                if not blocked[v]:
+                    c = cost + g[v]
+                    if c < best_c:
+                        best, best_c = v, c
+            if best < 0:
+                return []
+            s = best
+            path.append(self._cell(s))
+        return []
+
+
+def inflate(blocked: np.ndarray, radius: int) -> np.ndarray:
+    """Grow blocked cells by `radius` cells (square footprint)."""
+    if radius <= 0:
+        return blocked
+    out = blocked.copy()
+    for axis in (0, 1):
+        src = out.copy()
+        for shift in range(1, radius + 1):
+            if axis == 0:
+                out[shift:] |= src[:-shift]
+                out[:-shift] |= src[shift:]
+            else:
+                out[:, shift:] |= src[:, :-shift]
+                out[:, :-shift] |= src[:, shift:]
+    return out
+
+
+class PlannerWorker:
+    """Keep a D* Lite plan on an occupancy grid up to date on a background thread.
+
+    Parameters
+    ----------
+    grid : OccupancyGrid
+        Map to plan on; read from the worker thread.
+    goal : tuple[float, float]
+        Goal (x, y) in the odom frame (m).
+    region : tuple, optional
+        ``((x_min, x_max), (y_min, y_max))`` area to plan in (m), like
+        `draw_region`, by default ``((-10, 10), (-10, 10))``.
+    robot_radius : float, optional
+        Obstacles are grown by this much (m), by default 0.15.
+    occupied : float, optional
+        Cells with log-odds above this are obstacles, by default 0.5. Unknown
+        cells count as free.
+    period : float, optional
+        How often to check for changes (sec), by default 0.1.
+    map_period : float, optional
+        Least time between two reads of the grid (sec), by default 0.5. The
+        grid changes with every scan, so this bounds how often obstacles
+        are rebuilt. A plan is repaired only if the inflated obstacles
+        actually changed.
+    """
+
+    def __init__(
+        self,
+        grid,
+        goal: tuple[float, float],
+        region=((-10.0, 10.0), (-10.0, 10.0)),
+        robot_radius: float = 0.15,
+        occupied: float = 0.5,
+        period: float = 0.1,
+        map_period: float = 0.5,
+    ):
+        self.grid = grid
+        self.occupied = occupied
+        self.period = period
+        self.map_period = map_period
+        self.inflate_cells = math.ceil(robot_radius / grid.resolution)
+        (x0, x1), (y0, y1) = region
+        ix0, iy0 = grid.cell(x0, y0)
+        ix1, iy1 = grid.cell(x1, y1)
+        self.bounds = (ix0, iy0, ix1 + 1, iy1 + 1)
+        self.path: list[tuple[float, float]] = []  # Latest plan, replaced (never mutated).
+        self.replans = 0
+        self.plan_time = PhaseStats('plan')
+        self._goal = goal
+        self._start: tuple[float, float] | None = None
+        self._planner: DStarLite | None = None
+        self._blocked: np.ndarray | None = None  # Obstacles the planner has, with start and goal cleared.
+        self._obstacles: np.ndarray | None = None  # Inflated obstacles from the last grid read.
+        self._version = None  # Grid version of the last read.
+        self._read_at = -INF  # `perf_counter()` of the last read.
+        self._goal_cell: tuple[int, int] | None = None
+        self._path_cells: dict[tuple[int, int], int] = {}  # Cell -> index in the full plan.
+        self._full_path: list[tuple[float, float]] = []
+        self._running = False
+        self._thread: threading.Thread | None = None
+
+    def start(self) -> None:
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name='PlannerWorker', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._running = False
+        if self._thread is not None:
+            self._thread.join(1.0)
+
+    def set_start(self, x: float, y: float) -> None:
+        """Robot position (m), call every tick."""
+        self._start = (x, y)
+
+    def set_goal(self, x: float, y: float) -> None:
+        self._goal = (x, y)
+
+    def _to_local(self, x: float, y: float) -> tuple[int, int]:
+        ix, iy = self.grid.cell(x, y)
+        w, h = self.bounds[2] - self.bounds[0], self.bounds[3] - self.bounds[1]
+        return min(max(ix - self.bounds[0], 0), w - 1), min(max(iy - self.bounds[1], 0), h - 1)
+
+    def _to_world(self, cell: tuple[int, int]) -> tuple[float, float]:
+        res = self.grid.resolution
+        return ((cell[0] + self.bounds[0] + 0.5) * res, (cell[1] + self.bounds[1] + 0.5) * res)
+
+    def _run(self) -> None:
+        while self._running:
+            if self._start is not None:
+                try:
+                    self.update()
+                except Exception as err:  # Keep the last good path and try again.
+                    logger.error('PlannerWorker update failed: %r', err, rate=1)
+            sleep(self.period)
+
+    def _read_map(self) -> bool:
+        """Rebuild the inflated obstacles if due; True if they changed."""
+        version = self.grid.version
+        now = perf_counter()
+        if version == self._version or now - self._read_at < self.map_period:
+            return False
+        self._version, self._read_at = version, now
+        log_odds, _ = self.grid.to_dense(self.bounds)
+        obstacles = inflate(log_odds > self.occupied, self.inflate_cells)
+        if self._obstacles is not None and np.array_equal(obstacles, self._obstacles):
+            return False
+        self._obstacles = obstacles
+        return True
+
+    def update(self) -> None:
+        """Replan if the obstacles or goal changed or the robot left the path.
+
+        Runs on the worker thread. While the robot follows the current plan
+        and the obstacles stay the same, this only drops the waypoints
+        already passed, so the pure-Python search doesn't compete with
+        `step()` for the GIL every tick.
+        """
+        start, goal = self._to_local(*self._start), self._to_local(*self._goal)
+        map_changed = self._read_map()
+        if not map_changed and goal == self._goal_cell:
+            if not self._path_cells:
+                return  # No way to the goal; wait for the map to change.
+            i = self._path_cells.get(start)
+            if i is not None:
+                if i:
+                    self.path = self._full_path[i:]
+                return
+        t0 = perf_counter()
+
+        blocked = self._obstacles.copy()
+        blocked[start] = False  # Don't get stuck when the robot is inside an inflated cell.
+        blocked[goal] = False
+
+        if self._planner is None:
+            self._planner = DStarLite(blocked, start, goal)
+        else:
+            self._planner.set_goal(goal)
+            self._planner.set_start(start)
+            changed = np.argwhere(blocked != self._blocked)
+            if len(changed):
+                self._planner.update_cells(map(tuple, changed), blocked[tuple(changed.T)])
+        self._blocked = blocked
+
+        cells = self._planner.plan()
+        self._goal_cell = goal
+        self._path_cells = {cell: i for i, cell in enumerate(cells)}
+        self._full_path = self.path = [self._to_world(cell) for cell in cells]
+        self.replans += 1
+        self.plan_time.add(int((perf_counter() - t0) * 1e9))
+
+    def report(self) -> str:
+        s = self.plan_time.summary()
+        return (
+            f'planner: {self.replans} plans, time (ms) p50 {s["p50"] * 1e3:.1f}, '
+            f'max {s["max"] * 1e3:.1f}, {len(self.path)} waypoints'
+        )
+
+
+def _random_blocked(n: int, density: float, seed: int = 0) -> np.ndarray:
+    """Grid of random rectangular obstacles covering about `density` of it."""
+    rng = np.random.default_rng(seed)
+    blocked = np.zeros((n, n), dtype=bool)
+    side = max(2, n // 50)
+    for _ in range(int(density * n * n / side**2)):
+        x, y = rng.integers(0, n - side, 2)
+        blocked[x : x + side, y : y + side] = True
+    return blocked
+
+
+def _path_cost(path: list[tuple[int, int]]) -> float:
+    return sum(math.dist(a, b) for a, b in zip(path, path[1:]))
+
+
+def _check_moved_start(n: int = 60, density: float = 0.25, trials: int = 40, seed: int = 0) -> int:
+    """Move the start to random free cells (the robot left the path) and
+    compare each replan with a fresh plan. Returns how many matched."""
+    rng = np.random.default_rng(seed)
+    blocked = rng.random((n, n)) < density
+    goal = (n - 1, n - 1)
+    blocked[0, 0] = blocked[goal] = False
+    planner = DStarLite(blocked, (0, 0), goal)
+    planner.plan()
+    free = np.argwhere(~blocked)
+    ok = 0
+    for _ in range(trials):
+        start = tuple(int(v) for v in free[rng.integers(len(free))])
+        planner.set_start(start)
+        moved = planner.plan()
+        fresh = DStarLite(blocked, start, goal).plan()
+        ok += bool(moved) == bool(fresh) and abs(_path_cost(moved) - _path_cost(fresh)) < 1e-6
+    return ok
+
+
+def benchmark(sizes=(500, 2000), density: float = 0.2) -> None:
+    """First plan, then a repair after a short wall appears across the path just
+    ahead of the robot, vs. planning again from scratch. Also checks that
+    replans after the start jumps off the path match fresh plans."""
+    trials = 40
+    matched = _check_moved_start(trials=trials)
+    print(f'start moved off the path: {matched}/{trials} replans match a fresh plan')
+    assert matched == trials, 'replan after moving the start is not optimal'
+
+    print(f'{"grid":>10} {"first plan":>12} {"repair":>10} {"replan":>10} {"expansions":>22}')
+    for n in sizes:
+        blocked = _random_blocked(n, density)
+        start, goal = (n // 20, n // 20), (n - n // 20, n - n // 20)
+        blocked[start] = blocked[goal] = False
+
+        planner = DStarLite(blocked, start, goal)
+        t0 = perf_counter()
+        path = planner.plan()
+        first = perf_counter() - t0
+        first_exp = planner.expansions
+
+        # Drive a tenth of the way, then block the path just ahead with a wall.
+        here = path[len(path) // 10]
+        planner.set_start(here)
+        ahead = path[len(path) // 10 + max(5, n // 100)]
+        half = max(2, n // 200)
+        wall = [
+            cell
+            for d in range(-half, half + 1)
+            for cell in ((ahead[0] + d, ahead[1] - d), (ahead[0] + d + 1, ahead[1] - d))  # No diagonal gaps.
+            if 0 <= cell[0] < n and 0 <= cell[1] < n and cell != here
+        ]
+        planner.expansions = 0
+        t0 = perf_counter()
+        planner.update_cells(wall, [True] * len(wall))
+        repaired = planner.plan()
+        repair = perf_counter() - t0
+        repair_exp = planner.expansions
+
+        blocked2 = blocked.copy()
+        for cell in wall:
+            blocked2[cell] = True
+        fresh = DStarLite(blocked2, here, goal)
+        t0 = perf_counter()
+        expected = fresh.plan()
+        replan = perf_counter() - t0
+
+        assert repaired and abs(_path_cost(repaired) - _path_cost(expected)) < 1e-6, 'repair is not optimal'
+        print(
+            f'{n:>4}x{n:<5} {first * 1e3:10.0f}ms {repair * 1e3:8.1f}ms {replan * 1e3:8.0f}ms '
+            f'{first_exp:>10} / {repair_exp:<9}'
+        )
+
+
+if __name__ == '__main__':
+    benchmark()
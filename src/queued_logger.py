@@ -0,0 +1,252 @@
+"""A `SmartLogger` stand-in that keeps formatting and terminal I/O off the loop.
+
+With `SmartLogger`, ``logger.info(f'State: {state_now}')`` formats the whole
+row every tick, even when INFO is turned off (Python builds the f-string
+before the call), and an enabled message is written to the terminal right
+there in `step()`. :class:`QueuedLogger` has the same methods and keywords
+(``msg=``, ``rate=``) and changes three things:
+
+- Deferred formatting: pass ``'%s'``-style arguments or a callable instead
+  of an f-string, and nothing is formatted unless the level is enabled::
+
+      logger.info('State (t=%.2f): %s', state_now.t_elapsed, state_now)
+      logger.debug(lambda: f'{sensors.imu}')
+
+- ``rate=`` (messages per second) works on every level. Each call site is
+  throttled on its own, keyed by the message or format string.
+- Enabled messages go onto a queue and a background thread writes them to
+  the terminal (and optionally a file). If the queue fills up, messages are
+  dropped and counted rather than blocking the loop.
+
+Arguments are formatted when the call is made, not later on the writer
+thread, so mutable objects like `state_now` are logged as they were at
+that moment.
+
+Usage::
+
+    logger = QueuedLogger(level=logging.INFO)  # Instead of SmartLogger(...).
+    ...
+    logger.close()  # In `finally:`, writes what is still queued.
+
+Run this file to measure per-tick logging overhead at each level.
+"""
+
+import logging
+import os
+import queue
+import sys
+import weakref
+from logging.handlers import QueueHandler, QueueListener
+from time import monotonic, perf_counter
+
+
+_STDOUT = object()  # Default `stream`: `sys.stdout` when the logger is created.
+
+
+class _DroppingQueueHandler(QueueHandler):
+    """Never block the caller: count and drop records when the queue is full."""
+
+    def __init__(self, q: queue.Queue):
+        super().__init__(q)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record  # The message is already a plain string.
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class _Listener(QueueListener):
+    def enqueue_sentinel(self) -> None:
+        self.queue.put(self._sentinel)  # Wait for room; `stop()` would fail on a full queue.
+
+
+class QueuedLogger:
+    """Level-checked, rate-limited logger that writes on a background thread.
+
+    Parameters
+    ----------
+    level : int, optional
+        Lowest level that is logged, by default ``logging.INFO``.
+    name : str, optional
+        Name of the underlying `logging.Logger`, by default 'smartbot'.
+    stream : file-like, optional
+        Terminal output, by default ``sys.stdout`` like `SmartLogger`. None
+        for none.
+    path : str, optional
+        Also append messages to this file.
+    max_queue : int, optional
+        Messages allowed to wait for the writer thread, by default 10,000.
+    """
+
+    def __init__(
+        self,
+        level: int = logging.INFO,
+        name: str = 'smartbot',
+        stream=_STDOUT,
+        path: str | None = None,
+        max_queue: int = 10_000,
+    ):
+        self.level = level
+        self.suppressed = 0  # Messages skipped by `rate=`.
+        self._last: dict = {}  # Call-site key -> time it last logged.
+
+        handlers = []
+        formatter = logging.Formatter('[%(levelname)s] [%(asctime)s] %(message)s')
+        if stream is _STDOUT:
+            stream = sys.stdout
+        if stream is not None:
+            handlers.append(logging.StreamHandler(stream))
+        if path is not None:
+            handlers.append(logging.FileHandler(path))
+        for handler in handlers:
+            handler.setFormatter(formatter)
+
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue)
+        # Not registered with `logging.getLogger()`, so loggers with the same name don't share handlers.
+        self._logger = logging.Logger(name, level=logging.DEBUG)  # Levels are checked before formatting.
+        self._handler = _DroppingQueueHandler(self._queue)
+        self._logger.addHandler(self._handler)
+        self._listener = _Listener(self._queue, *handlers)
+        self._listener.start()
+        # Runs on `close()`, at exit, or when the logger is garbage collected, whichever is first.
+        # Holds no reference to `self`, so unused loggers can still be freed.
+        self._finalizer = weakref.finalize(self, _shutdown, self._listener, self._logger, self._handler)
+
+    @property
+    def dropped(self) -> int:
+        """Messages lost to a full queue."""
+        return self._handler.dropped
+
+    def enabled(self, level: int) -> bool:
+        return level >= self.level
+
+    def log(self, level: int, msg=None, *args, rate: float | None = None) -> None:
+        """Log `msg` at `level` if enabled and not throttled.
+
+        `msg` may be a format string for `args`, a callable returning the
+        message, or any object (passed through `str()`).
+        """
+        if level < self.level:
+            return
+        if rate is not None:
+            key = (level, getattr(msg, '__code__', msg) if callable(msg) else msg)
+            try:
+                hash(key)
+            except TypeError:
+                key = (level, type(msg))
+            now = monotonic()
+            if now - self._last.get(key, -float('inf')) < 1.0 / rate:
+                self.suppressed += 1
+                return
+            self._last[key] = now
+
+        if callable(msg):
+            text = str(msg())
+        elif args:
+            text = str(msg) % args
+        else:
+            text = str(msg)
+        self._logger.log(level, text)
+
+    def debug(self, msg=None, *args, rate: float | None = None) -> None:
+        self.log(logging.DEBUG, msg, *args, rate=rate)
+
+    def info(self, msg=None, *args, rate: float | None = None) -> None:
+        self.log(logging.INFO, msg, *args, rate=rate)
+
+    def warn(self, msg=None, *args, rate: float | None = None) -> None:
+        self.log(logging.WARNING, msg, *args, rate=rate)
+
+    warning = warn
+
+    def error(self, msg=None, *args, rate: float | None = None) -> None:
+        self.log(logging.ERROR, msg, *args, rate=rate)
+
+    def close(self) -> None:
+        """Write out everything queued and stop the writer thread."""
+        self._finalizer()
+
+
+def _shutdown(listener: QueueListener, logger: logging.Logger, handler: logging.Handler) -> None:
+    listener.stop()
+    logger.removeHandler(handler)
+    for h in listener.handlers:
+        h.close()
+
+
+def benchmark(n_ticks: int = 5000) -> None:
+    """Per-tick cost of the `step()` log lines at each logger level, output to a file."""
+    import tempfile
+
+    from state_row import RobotState
+
+    state_now = RobotState(t_epoch=1.7e9, t_delta=0.05, t_elapsed=12.3, imu_az=9.81, odom_x=1.0, odom_yaw=0.5)
+    levels = {'DEBUG': logging.DEBUG, 'INFO': logging.INFO, 'WARN': logging.WARNING}
+
+    def eager(logger):  # Today's pattern: f-strings formatted before the call.
+        logger.debug(f'{state_now.values}')
+        logger.info(f'\nState (t={state_now.t_elapsed}): {state_now}')
+
+    def lazy(logger):
+        logger.debug('%s', state_now.values)
+        logger.info('\nState (t=%s): %s', state_now.t_elapsed, state_now)
+
+    def lazy_rate(logger):
+        logger.debug('%s', state_now.values, rate=1)
+        logger.info('\nState (t=%s): %s', state_now.t_elapsed, state_now, rate=1)
+
+    print(f'{n_ticks} ticks, one DEBUG and one INFO line per tick, per-tick cost (us)')
+    print(f'{"logger":<28} {"call style":<14}' + ''.join(f'{name:>8}' for name in levels))
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'bench.log')
+        loggers = {}
+        try:
+            from smartbot_irl.utils import SmartLogger
+
+            loggers['SmartLogger (terminal)'] = lambda level: SmartLogger(level=level)
+        except ImportError:
+            print('smartbot_irl not importable, skipping SmartLogger')
+
+        def sync(level):
+            log = logging.Logger('bench.sync', level=level)
+            log.addHandler(logging.FileHandler(path))
+            return log
+
+        loggers['logging, synchronous file'] = sync
+        loggers['QueuedLogger, file'] = lambda level: QueuedLogger(
+            level, name='bench.queued', stream=None, path=path, max_queue=n_ticks * 2 + 10
+        )
+
+        for name, make in loggers.items():
+            styles = {'f-string': eager}
+            if name.startswith('QueuedLogger'):
+                styles.update({'lazy': lazy, 'lazy, rate=1': lazy_rate})
+            for style, fn in styles.items():
+                cells = []
+                for level in levels.values():
+                    if name.startswith('SmartLogger'):
+                        # Don't flood the terminal: the real loop already prints here.
+                        saved, sys.stdout = sys.stdout, open(os.devnull, 'w')
+                    logger = make(level)
+                    t0 = perf_counter()
+                    for _ in range(n_ticks):
+                        fn(logger)
+                    cells.append((perf_counter() - t0) / n_ticks * 1e6)
+                    if hasattr(logger, 'close'):
+                        logger.close()
+                    elif isinstance(logger, logging.Logger):
+                        for handler in logger.handlers:
+                            handler.close()
+                    if name.startswith('SmartLogger'):
+                        sys.stdout.close()
+                        sys.stdout = saved
+                print(f'{name:<28} {style:<14}' + ''.join(f'{c:>8.2f}' for c in cells))
+
+
+if __name__ == '__main__':
+    benchmark()
@@ -1,15 +1,32 @@
 # demo_2dsim.py
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from time import sleep
 from math import atan2
-from time import time
 
 from smartbot_irl import Command, SmartBot, SmartBotType
-from smartbot_irl.data import State, list_sensor_columns, timestamp
-from smartbot_irl.utils import SmartLogger, check_realtime, logging
-
+from smartbot_irl.data import list_sensor_columns, timestamp
+from smartbot_irl.utils import logging
+
+from clock import Clock, WallClock
+from column_state import ColumnState
+from log_writer import CsvStreamWriter
+from loop_profiler import LoopProfiler
+from loop_scheduler import RateScheduler
+from queued_logger import QueuedLogger
+from occupancy_grid import OccupancyGrid
+from path_planning import PlannerWorker
+from shm_plotting import ShmPlotter
+from state_row import RobotState
 from student_plotting import setup_plotting
 
-logger = SmartLogger(level=logging.WARN)  # Print statements, but better!
+logger = QueuedLogger(level=logging.WARN)  # Print statements, but better! Writes on a background thread.
+
+
+class StateNow(RobotState):
+    """Columns of one `states` row. Add a name here to log a new column."""
+
+    __slots__ = ()
+    columns = RobotState.columns + ()  # Time, imu and odom, then yours.
 
 
 @dataclass
@@ -25,23 +42,28 @@ class Params:
     side_length: float = 2.0
     speed: float = 1.0
     turn_speed: float = 0.8
+    clock: Clock = field(default_factory=WallClock)  # `SimClock` for replayed logs and `HeadlessBot`.
     t0: float = 0.0
+    state_now: StateNow = field(default_factory=StateNow)  # Reused every tick.
+
+    grid: OccupancyGrid = field(default_factory=OccupancyGrid)  # Obstacles seen so far.
+    planner: PlannerWorker | None = None  # Keeps a path to `goal_point` on `grid`.
 
 
-def step(bot: SmartBotType, params: Params, states: State) -> None:
+def step(bot: SmartBotType, params: Params, states: ColumnState) -> None:
     """This is the main control loop for the robot. Code here should run in <50ms."""
 
     # Get info about previous timestep state.
     state_prev = states.last
     t_prev = state_prev.t_epoch  # Last timestamp (sec).
 
-    # Create current state vector.
-    t = time()
-    state_now = {
-        't_epoch': t,  # Seconds since Jan 1 1970.
-        't_delta': t - t_prev,  # Seconds since last time step.
-        't_elapsed': t - params.t0,  # Seconds since program start.
-    }
+    # Fill in the current state vector (columns not set this tick stay NaN).
+    t = params.clock.time()
+    state_now = params.state_now
+    state_now.clear()
+    state_now.t_epoch = t  # Seconds since Jan 1 1970.
+    state_now.t_delta = t - t_prev  # Seconds since last time step.
+    state_now.t_elapsed = t - params.t0  # Seconds since program start.
 
     # Get sensor data.
     sensors = bot.read()
@@ -54,22 +76,28 @@ def step(bot: SmartBotType, params: Params, states: State) -> None:
     az = sensors.imu.az
     wz = sensors.imu.wz
 
-    # Add new columns to our state vector.
-    state_now['imu_ax'] = ax
-    state_now['imu_ay'] = ay
-    state_now['imu_az'] = az
-    state_now['imu_wz'] = wz
+    # Fill in the IMU columns.
+    state_now.imu_ax = ax
+    state_now.imu_ay = ay
+    state_now.imu_az = az
+    state_now.imu_wz = wz
 
     # Do stuff odom data.
-    state_now['odom_x'] = sensors.odom.x
-    state_now['odom_y'] = sensors.odom.y
-    state_now['odom_yaw'] = sensors.odom.yaw
+    state_now.odom_x = sensors.odom.x
+    state_now.odom_y = sensors.odom.y
+    state_now.odom_yaw = sensors.odom.yaw
+
+    # Add this scan to the map and tell the planner where we are.
+    if sensors.scan is not None:
+        params.grid.integrate_scan(sensors.scan, sensors.odom)
+    params.planner.set_start(sensors.odom.x, sensors.odom.y)
 
     ################################
     #    vvv Your Code Here vvv    #
     ################################
 
     goal = params.goal_point
+    path = params.planner.path  # Waypoints [(x, y), ...] to `goal` around known obstacles.
 
     ang_vel = 0.0
     lin_vel = 0.0
@@ -83,9 +111,8 @@ def step(bot: SmartBotType, params: Params, states: State) -> None:
     bot.write(cmd)
 
     # Update our `states` matrix by inserting our `state_now` vector.
-    # state_now.update(sensors.flatten())
-    states.append_row(rowdict=state_now)
-    logger.info(f'\nState (t={state_now["t_elapsed"]}): {state_now}')
+    states.append_row(state_now)  # One copy, no dict.
+    logger.info('\nState (t=%s): %s', state_now.t_elapsed, state_now)  # Only formatted if INFO is on.
 
 
 def main(log_file='smartlog') -> None:
@@ -113,39 +140,90 @@ def main(log_file='smartlog') -> None:
     bot = SmartBot(mode='sim', drawing=True, draw_region=((-10, 10), (-10, 10)), smartbot_num=3)
     bot.init(drawing=True, smartbot_num=3)
 
+    # Or a headless model on simulated time, far faster than real time (needs `from headless_sim import HeadlessBot`):
+    # bot = HeadlessBot()
+
     # Create empty parameter and state objects.
-    states = State()  # This gets saved to a CSV.
+    log_filename = f'{log_file}_{timestamp()}.csv'
+    # Streams each new row to the CSV in the background.
+    writer = CsvStreamWriter(log_filename, columns=StateNow.columns)
+    # Or a binary log that reloads faster (needs `from chunk_log import ChunkLogWriter`):
+    # writer = ChunkLogWriter(f'{log_file}_{timestamp()}.chunks')
+    states = ColumnState(max_rows=10_000, writer=writer)  # Keeps recent rows in memory.
     params = Params()  # We can access this later in step().
-    params.t0 = time()  # Record start time for this run (sec).
+    # params.clock = bot.clock  # With `HeadlessBot`: run `step()` and the schedule on its simulated time.
+    params.t0 = params.clock.time()  # Record start time for this run (sec).
+
+    # Plan (and repair) a path to the goal on a background thread.
+    params.planner = PlannerWorker(params.grid, goal=params.goal_point, region=((-10, 10), (-10, 10)))
+    params.planner.start()
 
     # Set up plotting.
-    plot_manager = setup_plotting()
-    plot_manager.start_plot_proc()
+    plotter = ShmPlotter(setup_plotting)  # Plots run in their own process.
+    plotter.start()
 
     # Print out what columns exist (There may be more added later!)
     logger.info(msg=f'State Columns: {list_sensor_columns()}')
 
+    # Time each part of the loop. A report is logged at shutdown (or on `kill -USR1 <pid>`).
+    prof = LoopProfiler(deadline=0.05)  # Warns if a loop takes longer than 50ms.
+    prof.instrument(bot, 'read', 'write')
+    prof.instrument(states, 'append_row', prefix='states')
+
+    # Start each loop on a fixed 20Hz schedule of `params.clock` so `t_delta` stays steady.
+    sched = RateScheduler.from_clock(20, params.clock, overrun='skip')
+
     # Run the robot!
     #######################################
     try:
         while True:
+            sched.wait()  # Sleep until the next loop is due.
+            prof.start_tick()
             step(bot, params, states)  # Run our code.
-            check_realtime(start_t=time())  # Check if our step() is taking too long.
+            prof.mark('step')
             bot.spin()  # Get new sensor data.
+            prof.mark('spin')
 
             # Send last row of data to plots.
-            plot_manager.update_queue(states.iloc[-1])
+            plotter.push(states)
+            prof.mark('plot')
+            prof.end_tick()  # Check if our loop is taking too long.
 
     except KeyboardInterrupt:
         logger.info('User requesting shut down...')
     finally:
-        # Save data to a CSV file and cleanup ros+matplotlib objects.
-        log_filename = f'{log_file}_{timestamp()}.csv'
-        states.to_csv(log_filename)
-        logger.info(f'Done saving to {log_filename}')
-        plot_manager.stop_plot_proc()
-
-        bot.shutdown()
+        # Stop robot driving away first: everything below may block or fail.
+        try:
+            bot.write(Command(wheel_vel_left=0.0, wheel_vel_right=0.0, linear_vel=0.0, angular_vel=0.0))
+        except Exception as e:
+            logger.error(f'Stop command failed: {e!r}')
+
+        # Finish writing the CSV file and cleanup ros+matplotlib objects.
+        # Each step is guarded so one failure doesn't skip the rest.
+        try:
+            writer.close()
+            logger.info(f'Done saving to {", ".join(writer.paths)}')
+        except Exception as e:
+            logger.error(f'Log writer failed: {(e.__cause__ or e)!r}')
+        prof.log_report()
+        logger.info(sched.report())
+        logger.info(f'Plot rows: {plotter.stats}')
+        try:
+            plotter.stop()
+        except Exception as e:
+            logger.error(f'Plotter stop failed: {e!r}')
+        logger.info(params.planner.report())
+        try:
+            params.planner.stop()
+        except Exception as e:
+            logger.error(f'Planner stop failed: {e!r}')
+
+        sleep(0.3)  # Let the stop command go out.
+        try:
+            bot.shutdown()
+        except Exception as e:
+            logger.error(f'Shutdown failed: {e!r}')
+        logger.close()  # Write out any queued log messages.
 
 
 if __name__ == '__main__':
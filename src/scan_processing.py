@@ -0,0 +1,259 @@
+"""Vectorized lidar scan processing for controllers.
+
+Everything here works on whole scans at once with NumPy instead of looping
+over beams in Python. Per-beam angles, sin/cos tables and sector index
+ranges depend only on the scan geometry (`angle_min`, `angle_increment`,
+number of beams), so they are computed once per geometry and cached.
+
+`scan_view()` is the entry point for controllers::
+
+    view = scan_view(sensors.scan)
+    view.forward_range()
+    view.sector_min(-0.3, 0.3)
+    repulse, pressure = view.repulsion(half_width=np.deg2rad(60), avoid_thresh=0.5)
+
+Run this file to check the vectorized code against the original per-beam
+loop and to benchmark it over scan sizes 360-4096.
+"""
+
+import math
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from time import perf_counter
+
+import numpy as np
+
+
+class ScanGeometry:
+    """Cached per-beam tables for one scan geometry. Arrays are read-only."""
+
+    def __init__(self, angle_min: float, angle_increment: float, n: int):
+        self.angle_min = angle_min
+        self.angle_increment = angle_increment
+        self.n = n
+        self.angles = angle_min + np.arange(n) * angle_increment
+        self.sin = np.sin(self.angles)
+        self.cos = np.cos(self.angles)
+        for arr in (self.angles, self.sin, self.cos):
+            arr.flags.writeable = False
+        self._sectors: dict[tuple[float, float], slice | np.ndarray] = {}
+
+    def sector(self, lo: float, hi: float) -> slice | np.ndarray:
+        """Index beams with ``lo <= angle <= hi`` (RAD).
+
+        Scan angles normally increase, making the sector a contiguous `slice`
+        (so indexing with it gives views); otherwise an index array.
+        """
+        idx = self._sectors.get((lo, hi))
+        if idx is None:
+            if self.angle_increment > 0:
+                i0 = int(np.searchsorted(self.angles, lo, side='left'))
+                i1 = int(np.searchsorted(self.angles, hi, side='right'))
+                idx = slice(i0, max(i0, i1))
+            else:
+                idx = np.flatnonzero((self.angles >= lo) & (self.angles <= hi))
+            self._sectors[(lo, hi)] = idx
+        return idx
+
+    def sector_mask(self, lo: float, hi: float) -> np.ndarray:
+        """Boolean mask of beams with ``lo <= angle <= hi`` (RAD)."""
+        mask = np.zeros(self.n, dtype=bool)
+        mask[self.sector(lo, hi)] = True
+        return mask
+
+    def index_of(self, angle: float) -> int:
+        """Index of the beam closest to `angle` (RAD), clipped to the scan."""
+        i = round((angle - self.angle_min) / self.angle_increment)
+        return min(max(i, 0), self.n - 1)
+
+
+@lru_cache(maxsize=8)
+def scan_geometry(angle_min: float, angle_increment: float, n: int) -> ScanGeometry:
+    """Get the (cached) :class:`ScanGeometry` for a scan."""
+    return ScanGeometry(angle_min, angle_increment, n)
+
+
+def valid_ranges(ranges: np.ndarray) -> np.ndarray:
+    """Mask of usable returns: finite and non-zero (NaN, inf and 0 mean no return)."""
+    return np.isfinite(ranges) & (ranges != 0)
+
+
+def repulsion(
+    ranges: np.ndarray,
+    geom: ScanGeometry,
+    half_width: float,
+    avoid_thresh: float,
+    min_range: float = 0.05,
+) -> tuple[float, float]:
+    """Sum obstacle repulsion over the forward sector of a scan.
+
+    Every valid return within ``+/- half_width`` of straight ahead and closer
+    than `avoid_thresh` pushes with weight ``1 / max(r, min_range)``.
+
+    Returns
+    -------
+    repulse : float
+        ``-sum(sin(angle) * w)``, i.e. positive means steer left. Not normalized.
+    pressure : float
+        ``sum(w)``, how confined the robot is.
+    """
+    idx = geom.sector(-half_width, half_width)
+    r = ranges[idx]
+    with np.errstate(invalid='ignore'):
+        hit = valid_ranges(r) & (r < avoid_thresh)
+    w = 1.0 / np.maximum(r[hit], min_range)
+    return float(-np.dot(geom.sin[idx][hit], w)), float(w.sum())
+
+
+def as_ndarray(ranges) -> np.ndarray:
+    """Ranges as a float ndarray, without copying when the data allows it.
+
+    ndarrays and buffer-backed arrays (e.g. ``array.array('f')``) are wrapped
+    in place; a Python list has to be converted once.
+    """
+    if isinstance(ranges, np.ndarray):
+        return ranges
+    try:
+        return np.frombuffer(ranges, dtype=memoryview(ranges).format)
+    except (TypeError, ValueError):
+        return np.array(ranges, dtype=float)
+
+
+class ScanView:
+    """NumPy view of one `LaserScan` plus its cached geometry.
+
+    Use :func:`scan_view` rather than creating these directly, so every
+    consumer of the same scan in a tick shares one view.
+    """
+
+    def __init__(self, scan):
+        self.scan = scan
+        self.source = scan.ranges  # What `ranges` was built from, to spot new data.
+        self.ranges = as_ndarray(scan.ranges)
+        self.geom = scan_geometry(scan.angle_min, scan.angle_increment, len(self.ranges))
+
+    def forward_range(self, angle: float = 0.0) -> float:
+        """Range of the beam pointing at `angle` (RAD), straight ahead by default.
+
+        For coordinate conventions see REP 103 and REP 105:
+        https://www.ros.org/reps/rep-0105.html
+        https://www.ros.org/reps/rep-0103.html
+        """
+        return float(self.ranges[self.geom.index_of(angle)])
+
+    def sector_min(self, lo: float, hi: float) -> float:
+        """Closest valid return with ``lo <= angle <= hi`` (RAD), inf if none."""
+        r = self.ranges[self.geom.sector(lo, hi)]
+        r = r[valid_ranges(r)]
+        return float(r.min()) if len(r) else math.inf
+
+    def obstacle_in(self, lo: float, hi: float, thresh: float) -> bool:
+        """Whether anything in the sector is closer than `thresh` (m)."""
+        return self.sector_min(lo, hi) < thresh
+
+    def points(self) -> tuple[np.ndarray, np.ndarray]:
+        """Valid returns as x, y arrays in the robot frame."""
+        ok = valid_ranges(self.ranges)
+        r = self.ranges[ok]
+        return r * self.geom.cos[ok], r * self.geom.sin[ok]
+
+    def repulsion(self, half_width: float, avoid_thresh: float, min_range: float = 0.05):
+        """See :func:`repulsion`."""
+        return repulsion(self.ranges, self.geom, half_width, avoid_thresh, min_range)
+
+
+_MAX_VIEWS = 64  # Enough for one scan per robot in a fleet, plus some.
+_views: OrderedDict[int, ScanView] = OrderedDict()  # id(scan) -> newest view.
+_views_lock = threading.Lock()
+
+
+def scan_view(scan) -> ScanView:
+    """Get the :class:`ScanView` for `scan`, reusing it while the scan is unchanged.
+
+    Views are cached per scan object, so robots or threads reading different
+    scans don't evict each other's. A view is rebuilt when `scan.ranges` is a
+    different object or has a different length. A list that is updated in
+    place keeps its identity and isn't noticed; build a ``ScanView(scan)``
+    directly for those. (ndarray ranges are wrapped without a copy, so
+    in-place updates show through.)
+    """
+    key = id(scan)
+    with _views_lock:
+        view = _views.get(key)
+        if view is not None and view.scan is scan:
+            ranges = scan.ranges
+            if view.source is ranges and len(view.ranges) == len(ranges):
+                _views.move_to_end(key)
+                return view
+    view = ScanView(scan)
+    with _views_lock:
+        _views[key] = view  # Holds `scan`, so its id can't be reused while cached.
+        _views.move_to_end(key)
+        while len(_views) > _MAX_VIEWS:
+            _views.popitem(last=False)
+    return view
+
+
+def _repulsion_loop(ranges, angle_min, angle_inc, half_width, avoid_thresh):
+    """The original per-beam loop from `goto_aruco.ant_controller`, for checking."""
+    ranges = list(ranges)
+    for i in range(len(ranges)):
+        ang = angle_min + i * angle_inc
+        if ang < -half_width or ang > half_width:
+            ranges[i] = np.nan
+
+    repulse = 0.0
+    pressure = 0.0
+    for i, r in enumerate(ranges):
+        if not r or math.isnan(r) or math.isinf(r):
+            continue
+        if r < avoid_thresh:
+            ang = angle_min + i * angle_inc
+            w = 1.0 / max(r, 0.05)
+            repulse -= math.sin(ang) * w
+            pressure += w
+    return repulse, pressure
+
+
+def _random_scan(rng, n: int) -> tuple[list[float], float, float]:
+    ranges = rng.uniform(0.0, 2.0, n)
+    ranges[rng.random(n) < 0.05] = np.nan
+    ranges[rng.random(n) < 0.05] = np.inf
+    ranges[rng.random(n) < 0.02] = 0.0
+    angle_min = -math.pi
+    return ranges.tolist(), angle_min, 2 * math.pi / n
+
+
+def benchmark(sizes=(360, 720, 1024, 2048, 4096), reps: int = 200) -> None:
+    """Check equivalence with the original loop and time both."""
+    rng = np.random.default_rng(0)
+    half = np.deg2rad(120) / 2
+    thresh = 0.5
+
+    print(f'{"beams":>6} {"loop us":>10} {"vector us":>10} {"speedup":>8}')
+    for n in sizes:
+        scans = [_random_scan(rng, n) for _ in range(reps)]
+
+        # Equivalence check on every scan.
+        for ranges, amin, ainc in scans:
+            geom = scan_geometry(amin, ainc, n)
+            expected = _repulsion_loop(ranges, amin, ainc, half, thresh)
+            got = repulsion(np.asarray(ranges, dtype=float), geom, half, thresh)
+            assert np.allclose(got, expected, rtol=1e-9, atol=1e-9), (n, got, expected)
+
+        t0 = perf_counter()
+        for ranges, amin, ainc in scans:
+            _repulsion_loop(ranges, amin, ainc, half, thresh)
+        loop_us = (perf_counter() - t0) / reps * 1e6
+
+        t0 = perf_counter()
+        for ranges, amin, ainc in scans:
+            repulsion(np.asarray(ranges, dtype=float), scan_geometry(amin, ainc, n), half, thresh)
+        vec_us = (perf_counter() - t0) / reps * 1e6
+
+        print(f'{n:>6} {loop_us:10.1f} {vec_us:10.1f} {loop_us / vec_us:7.1f}x')
+
+
+if __name__ == '__main__':
+    benchmark()
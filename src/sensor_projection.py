@@ -0,0 +1,231 @@
+"""Log only the sensor values you need, without building a dict every tick.
+
+`sensors.flatten()` turns everything, including every lidar beam, into dict
+keys. Logging that each tick makes rows hundreds of columns wide and slows
+down `append_row()`, the CSV writer and every later `to_csv()`. Declare the
+columns once with a :class:`SensorProjection` instead::
+
+    proj = SensorProjection(
+        extra=('t_epoch', 't_delta', 't_elapsed'),  # Filled in by `step()`.
+        fields=('odom.x', 'odom.y', 'odom.yaw', 'imu.wz'),
+        hexes=1,                                    # hex_x, hex_y, hex_yaw.
+        beams={'range_fwd': 0.0},                   # Beam closest to 0 RAD.
+        sectors={'front': (-0.3, 0.3)},             # front_min, front_mean.
+    )
+    row = proj.flatten(sensors)  # Same preallocated array every tick.
+    row[:3] = t, t_delta, t_elapsed
+    states.append_values(row, proj.columns)
+
+Columns follow `flatten()`'s names (``odom.x`` -> ``odom_x``). Values that
+are missing this tick (no hex seen, no scan, no return in a sector) are NaN,
+so every row has the same columns. Beam indices and sector slices are worked
+out once per scan geometry (see :mod:`scan_processing`).
+
+Run this file to compare tick cost and CSV size of full `flatten()` rows
+against projected rows.
+"""
+
+import os
+import tempfile
+from operator import attrgetter
+from time import perf_counter
+
+import numpy as np
+
+from scan_processing import scan_view, valid_ranges
+
+_STATS = {'min': np.min, 'mean': np.mean, 'max': np.max}
+
+
+class SensorProjection:
+    """A fixed set of sensor columns, flattened into one reused array.
+
+    Parameters
+    ----------
+    fields : sequence of str, optional
+        Dotted attributes of `SensorData`, e.g. ``'odom.x'`` or ``'imu.wz'``,
+        by default odom x, y and yaw.
+    hexes : int, optional
+        Log x, y and yaw of this many seen hexes (``hex_x``, then ``hex1_x``,
+        ...), by default 0.
+    beams : dict[str, float], optional
+        Column name -> angle (RAD). Logs the range of the closest beam.
+    sectors : dict[str, tuple[float, float]], optional
+        Sector name -> ``(lo, hi)`` angles (RAD). Logs `stats` of the valid
+        returns in each sector as ``<name>_<stat>``.
+    stats : sequence of str, optional
+        Any of 'min', 'mean', 'max', by default ('min', 'mean').
+    extra : sequence of str, optional
+        Columns placed first and left for the caller to fill in (e.g. time).
+    """
+
+    def __init__(
+        self,
+        fields=('odom.x', 'odom.y', 'odom.yaw'),
+        hexes: int = 0,
+        beams: dict[str, float] | None = None,
+        sectors: dict[str, tuple[float, float]] | None = None,
+        stats=('min', 'mean'),
+        extra=(),
+    ):
+        beams = beams or {}
+        sectors = sectors or {}
+        unknown = set(stats) - _STATS.keys()
+        if unknown:
+            raise ValueError(f'Unknown stats {sorted(unknown)}, use {sorted(_STATS)}')
+
+        columns = list(extra)
+        # Group fields by sensor so each sensor object is fetched once per tick.
+        groups: dict[str, list[tuple[int, attrgetter]]] = {}
+        for name in fields:
+            sensor, _, attr = name.partition('.')
+            if not attr:
+                raise ValueError(f'Field {name!r} should look like "odom.x"')
+            groups.setdefault(sensor, []).append((len(columns), attrgetter(attr)))
+            columns.append(name.replace('.', '_'))
+        self._groups = list(groups.items())
+
+        self._hex_start = len(columns)
+        for k in range(hexes):
+            prefix = 'hex' if k == 0 else f'hex{k}'
+            columns += [f'{prefix}_x', f'{prefix}_y', f'{prefix}_yaw']
+        self.hexes = hexes
+
+        self._beam_start = len(columns)
+        self.beam_angles = list(beams.values())
+        columns += list(beams)
+
+        self._sector_start = len(columns)
+        self.sector_bounds = list(sectors.values())
+        self.stats = [_STATS[s] for s in stats]
+        columns += [f'{name}_{stat}' for name in sectors for stat in stats]
+
+        self.columns = tuple(columns)
+        self.n_extra = len(extra)
+        self.values = np.full(len(columns), np.nan)
+        self._geom = None
+        self._beam_idx = np.zeros(0, dtype=np.intp)
+        self._sector_idx: list = []
+
+    def __len__(self) -> int:
+        return len(self.columns)
+
+    def _compile_scan(self, geom) -> None:
+        self._geom = geom
+        self._beam_idx = np.array([geom.index_of(a) for a in self.beam_angles], dtype=np.intp)
+        self._sector_idx = [geom.sector(lo, hi) for lo, hi in self.sector_bounds]
+
+    def flatten(self, sensors, out: np.ndarray | None = None) -> np.ndarray:
+        """Write this tick's values into `out` (default: `self.values`) and return it.
+
+        The `extra` columns are left as they are.
+        """
+        out = self.values if out is None else out
+        out[self.n_extra :] = np.nan
+
+        for sensor, getters in self._groups:
+            obj = getattr(sensors, sensor, None)
+            if obj is None:
+                continue
+            for i, get in getters:
+                value = get(obj)
+                if value is not None:
+                    out[i] = value
+
+        if self.hexes:
+            hexes = sensors.seen_hexes
+            poses = None if hexes is None else hexes.poses
+            if poses:
+                i = self._hex_start
+                for p in poses[: self.hexes]:
+                    out[i], out[i + 1], out[i + 2] = p.x, p.y, p.yaw
+                    i += 3
+
+        scan = sensors.scan
+        if (self.beam_angles or self.sector_bounds) and scan is not None and scan.ranges is not None:
+            view = scan_view(scan)
+            if view.geom is not self._geom:
+                self._compile_scan(view.geom)
+            ranges = view.ranges
+            if len(self._beam_idx):
+                r = ranges[self._beam_idx]
+                out[self._beam_start : self._sector_start] = np.where(valid_ranges(r), r, np.nan)
+            i = self._sector_start
+            n_stats = len(self.stats)
+            for idx in self._sector_idx:
+                r = ranges[idx]
+                r = r[valid_ranges(r)]
+                if len(r):
+                    for k, stat in enumerate(self.stats):
+                        out[i + k] = stat(r)
+                i += n_stats
+        return out
+
+
+def _flatten_full(sensors) -> dict[str, float]:
+    """Everything as dict keys, one per lidar beam, like `SensorData.flatten()`."""
+    row = {
+        'odom_x': sensors.odom.x,
+        'odom_y': sensors.odom.y,
+        'odom_yaw': sensors.odom.yaw,
+        'imu_ax': sensors.imu.ax,
+        'imu_ay': sensors.imu.ay,
+        'imu_az': sensors.imu.az,
+        'imu_wz': sensors.imu.wz,
+        'scan_angle_min': sensors.scan.angle_min,
+        'scan_angle_increment': sensors.scan.angle_increment,
+    }
+    for i, r in enumerate(sensors.scan.ranges):
+        row[f'scan_ranges_{i}'] = r
+    if sensors.seen_hexes.poses:
+        p = sensors.seen_hexes.poses[0]
+        row.update(hex_x=p.x, hex_y=p.y, hex_yaw=p.yaw)
+    return row
+
+
+def benchmark(n_ticks: int = 2000, n_beams: int = 360) -> None:
+    """Tick cost (flatten + append) and CSV size, full rows vs. projected rows."""
+    from column_state import ColumnState
+    from sensor_log import _synthetic_sensors
+
+    frames = [_synthetic_sensors(i, n_beams) for i in range(n_ticks)]
+    for s in frames:
+        s.scan.ranges = s.scan.ranges.tolist()  # `SensorData` hands out lists.
+    proj = SensorProjection(
+        extra=('t_epoch', 't_delta', 't_elapsed'),
+        fields=('odom.x', 'odom.y', 'odom.yaw', 'imu.ax', 'imu.ay', 'imu.az', 'imu.wz'),
+        hexes=1,
+        beams={'range_fwd': 0.0},
+        sectors={'front': (-0.5, 0.5), 'left': (0.5, 2.0), 'right': (-2.0, -0.5)},
+    )
+
+    def full(states, i, sensors):
+        row = {'t_epoch': i * 0.05, 't_delta': 0.05, 't_elapsed': i * 0.05}
+        row.update(_flatten_full(sensors))
+        states.append_row(row)
+
+    def projected(states, i, sensors):
+        row = proj.flatten(sensors)
+        row[0], row[1], row[2] = i * 0.05, 0.05, i * 0.05
+        states.append_values(row, proj.columns)
+
+    print(f'{n_ticks} ticks, {n_beams}-beam scans')
+    print(f'{"rows":>10} {"columns":>8} {"tick (us)":>10} {"to_csv (ms)":>12} {"CSV bytes/row":>14}')
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, fn in (('full', full), ('projected', projected)):
+            states = ColumnState()
+            t0 = perf_counter()
+            for i, sensors in enumerate(frames):
+                fn(states, i, sensors)
+            tick_us = (perf_counter() - t0) / n_ticks * 1e6
+
+            path = os.path.join(tmp, f'{name}.csv')
+            t0 = perf_counter()
+            states.to_csv(path)
+            csv_ms = (perf_counter() - t0) * 1e3
+            size = os.path.getsize(path) / n_ticks
+            print(f'{name:>10} {len(states.columns):>8} {tick_us:>10.1f} {csv_ms:>12.1f} {size:>14,.0f}')
+
+
+if __name__ == '__main__':
+    benchmark()
@@ -0,0 +1,137 @@
+"""One immutable snapshot of the robot's sensors per control tick.
+
+Call `bot.read()` once at the top of `step()` and pass the snapshot to every
+helper instead of letting each one read again. Besides avoiding repeated
+reads, all helpers then see the same data within a tick. Derived values are
+computed on first access and cached::
+
+    snap = SensorSnapshot(bot.read(), t=t)
+    snap.yaw        # odom yaw wrapped to [0, 2pi)
+    snap.hex_world  # first seen hex in the world (odom) frame
+
+Run this file to compare `tyler_approach.step()` tick latency with one
+`bot.read()` per tick against the old pattern of three reads per tick
+(`approach_long()` read once more for each `yaw_correction()` call).
+"""
+
+import math
+from functools import cached_property
+from time import perf_counter, time
+
+from smartbot_irl import SensorData
+
+
+class SensorSnapshot:
+    """Read-only view of one `bot.read()` result plus lazily derived values.
+
+    Parameters
+    ----------
+    sensors : SensorData
+        Result of a single `bot.read()`.
+    t : float, optional
+        Time the snapshot was taken (sec).
+    """
+
+    def __init__(self, sensors: SensorData, t: float | None = None):
+        set_ = object.__setattr__
+        set_(self, 'sensors', sensors)
+        set_(self, 't', t)
+        set_(self, 'odom', sensors.odom)
+        set_(self, 'imu', sensors.imu)
+        set_(self, 'scan', sensors.scan)
+        set_(self, 'seen_hexes', sensors.seen_hexes)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f'{type(self).__name__} is read-only')
+
+    @cached_property
+    def yaw(self) -> float:
+        """Odom yaw wrapped to [0, 2pi) (RAD), 0.0 without odom."""
+        if self.odom is None:
+            return 0.0
+        yaw = self.odom.yaw
+        return yaw + 2 * math.pi if yaw < 0 else yaw
+
+    @cached_property
+    def hexes(self) -> list:
+        """Seen hex poses in the body frame (possibly empty)."""
+        if self.seen_hexes is None or self.seen_hexes.poses is None:
+            return []
+        return list(self.seen_hexes.poses)
+
+    @cached_property
+    def hex(self):
+        """First seen hex pose, or None."""
+        return self.hexes[0] if self.hexes else None
+
+    @cached_property
+    def hex_range(self) -> float | None:
+        """Distance to the first seen hex (m)."""
+        return None if self.hex is None else math.hypot(self.hex.x, self.hex.y)
+
+    @cached_property
+    def hex_bearing(self) -> float | None:
+        """Bearing of the first seen hex relative to the robot heading (RAD)."""
+        return None if self.hex is None else math.atan2(self.hex.y, self.hex.x)
+
+    @cached_property
+    def hex_world(self) -> tuple[float, float] | None:
+        """Position of the first seen hex in the world (odom) frame (m)."""
+        if self.hex is None or self.odom is None:
+            return None
+        phi = self.yaw + self.hex_bearing
+        return (
+            self.odom.x + self.hex_range * math.cos(phi),
+            self.odom.y + self.hex_range * math.sin(phi),
+        )
+
+
+class _RepeatReadBot:
+    """Proxy that reads sensors `n` times per `read()`, like the old `step()`."""
+
+    def __init__(self, bot, n: int):
+        self._bot = bot
+        self._n = n
+
+    def read(self):
+        for _ in range(self._n - 1):
+            self._bot.read()
+        return self._bot.read()
+
+    def __getattr__(self, name):
+        return getattr(self._bot, name)
+
+
+def benchmark(n_ticks: int = 2000) -> None:
+    """Time `tyler_approach.step()` on the sim robot with 1 vs. 3 reads per tick."""
+    import numpy as np
+
+    import tyler_approach
+    from column_state import ColumnState
+    from smartbot_irl import SmartBot
+
+    bot = SmartBot(mode='sim', drawing=False, smartbot_num=3)
+    bot.init(drawing=False, smartbot_num=3)
+
+    try:
+        print(f'{n_ticks} ticks of tyler_approach.step(), tick latency (us)')
+        print(f'{"reads/tick":>10} {"p50":>8} {"p95":>8} {"p99":>8}')
+        for reads in (3, 1):
+            target = bot if reads == 1 else _RepeatReadBot(bot, reads)
+            params = tyler_approach.Params()
+            params.t0 = time()
+            states = ColumnState()
+            lat = np.empty(n_ticks)
+            for i in range(n_ticks):
+                t0 = perf_counter()
+                tyler_approach.step(target, params, states)
+                lat[i] = perf_counter() - t0
+                bot.spin()
+            p50, p95, p99 = np.percentile(lat * 1e6, [50, 95, 99])
+            print(f'{reads:>10} {p50:8.1f} {p95:8.1f} {p99:8.1f}')
+    finally:
+        bot.shutdown()
+
+
+if __name__ == '__main__':
+    benchmark()
@@ -0,0 +1,350 @@
+"""Live plotting through a shared-memory ring buffer.
+
+`plot_manager.update_queue(states.iloc[-1])` builds a pandas Series and
+pickles it through a multiprocessing queue on every tick. `ShmPlotter`
+instead keeps a ring buffer of float64 rows in shared memory holding only
+the columns the plots use (found by running `setup_plotting()` against a
+:class:`ColumnRecorder`). The control loop copies the newest row straight
+into the ring, and the plot process reads everything new in bulk::
+
+    plotter = ShmPlotter(setup_plotting, policy='drop_oldest')
+    plotter.start()
+    while True:
+        ...
+        plotter.push(states)
+    plotter.stop()
+
+The ring is bounded and the control loop never waits on the plot process.
+What happens when plotting falls behind is set by `policy`:
+
+``'drop_oldest'``
+    Keep the newest `capacity` rows; older unread rows are dropped (default).
+``'latest'``
+    The plot process only takes the newest row each frame and skips
+    (coalesces) the rest. Good for plots that show the current state.
+``'every_n'``
+    Only every `every_n`-th row is sent at all.
+
+`plotter.stats` counts pushed, delivered, dropped, coalesced and sampled-out
+rows, and the current backlog.
+
+Run this file to compare the per-tick producer cost with the queue path.
+"""
+
+import multiprocessing as mp
+from multiprocessing import shared_memory
+from time import perf_counter_ns, sleep
+
+import numpy as np
+
+# Header slots (int64) in front of the row data.
+_HEAD = 0  # Rows written so far.
+_TAIL = 1  # Rows consumed so far.
+_DROPPED = 2  # Rows overwritten before the consumer got to them.
+_COALESCED = 3  # Rows skipped by a latest-only consumer.
+_HEADER_LEN = 8
+
+POLICIES = ('drop_oldest', 'latest', 'every_n')
+
+
+class ColumnRecorder:
+    """Stand-in `PlotManager` that only records which columns are plotted."""
+
+    def __init__(self):
+        self.columns: list[str] = []
+
+    def add_figure(self, *args, **kwargs) -> 'ColumnRecorder':
+        return self
+
+    def add_line(self, x_col, y_col, *args, **kwargs) -> None:
+        for col in [x_col, *([y_col] if isinstance(y_col, str) else y_col)]:
+            if col not in self.columns:
+                self.columns.append(col)
+
+
+def plotted_columns(setup_fn) -> list[str]:
+    """Columns used by a `setup_plotting(pm)`-style function."""
+    recorder = ColumnRecorder()
+    setup_fn(recorder)
+    return recorder.columns
+
+
+class ShmRing:
+    """Single-producer, single-consumer ring of float64 rows in shared memory.
+
+    The producer writes a row into the next slot, then bumps the head
+    counter; the consumer copies out everything between its tail and the head.
+    If the consumer falls more than `capacity` rows behind, the oldest rows are
+    overwritten and counted as dropped.
+
+    Parameters
+    ----------
+    n_cols : int
+        Values per row.
+    capacity : int, optional
+        Rows held, by default 4096.
+    name : str, optional
+        Attach to an existing ring created by another process.
+    """
+
+    def __init__(self, n_cols: int, capacity: int = 4096, name: str | None = None):
+        size = 8 * (_HEADER_LEN + capacity * n_cols)
+        self.owner = name is None
+        self.shm = shared_memory.SharedMemory(name=name, create=self.owner, size=size)
+        self.n_cols = n_cols
+        self.capacity = capacity
+        self.header = np.ndarray((_HEADER_LEN,), dtype=np.int64, buffer=self.shm.buf)
+        self.rows = np.ndarray(
+            (capacity, n_cols), dtype=np.float64, buffer=self.shm.buf, offset=8 * _HEADER_LEN
+        )
+        if self.owner:
+            self.header[:] = 0
+
+    @property
+    def name(self) -> str:
+        return self.shm.name
+
+    @property
+    def head(self) -> int:
+        return int(self.header[_HEAD])
+
+    @property
+    def tail(self) -> int:
+        return int(self.header[_TAIL])
+
+    @property
+    def dropped(self) -> int:
+        return int(self.header[_DROPPED])
+
+    @property
+    def coalesced(self) -> int:
+        return int(self.header[_COALESCED])
+
+    def slot(self) -> np.ndarray:
+        """Row view to fill in before :meth:`commit`."""
+        return self.rows[self.header[_HEAD] % self.capacity]
+
+    def commit(self) -> None:
+        self.header[_HEAD] += 1
+
+    def write(self, values) -> None:
+        self.slot()[:] = values
+        self.commit()
+
+    def read_new(self, latest_only: bool = False) -> np.ndarray:
+        """Copy of all rows written since the last call, oldest first.
+
+        With `latest_only`, return at most the newest row and count the
+        skipped ones as coalesced.
+        """
+        head = int(self.header[_HEAD])
+        tail = int(self.header[_TAIL])
+        if latest_only and head - tail > 1:
+            self.header[_COALESCED] += head - tail - 1
+            tail = head - 1
+        elif head - tail > self.capacity - 1:
+            # Keep a one-slot gap: the producer may be filling slot `head` now.
+            self.header[_DROPPED] += head - tail - (self.capacity - 1)
+            tail = head - (self.capacity - 1)
+        i0, i1 = tail % self.capacity, head % self.capacity
+        if head == tail:
+            out = self.rows[:0].copy()
+        elif i0 < i1:
+            out = self.rows[i0:i1].copy()
+        else:
+            out = np.concatenate([self.rows[i0:], self.rows[:i1]])
+
+        # Rows the producer lapped while we were copying may be torn, drop them.
+        torn = int(self.header[_HEAD]) - (tail + self.capacity - 1)
+        if torn > 0:
+            torn = min(torn, len(out))
+            self.header[_DROPPED] += torn
+            out = out[torn:]
+        self.header[_TAIL] = head
+        return out
+
+    def close(self) -> None:
+        del self.header, self.rows
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+def _plot_proc(
+    ring_name: str,
+    columns: list[str],
+    capacity: int,
+    setup_fn,
+    stop,
+    fps: float,
+    fast: bool,
+    latest_only: bool,
+):
+    """Plot process: rebuild the plots, then feed them rows from the ring."""
+    import matplotlib.pyplot as plt
+    import pandas as pd
+
+    from fast_plotting import FastPlotManager
+
+    ring = ShmRing(len(columns), capacity, name=ring_name)
+    pm = setup_fn(FastPlotManager(fps=fps)) if fast else setup_fn()
+    pm.show_plots()
+    try:
+        while not stop.is_set():
+            if fast:
+                pm.update_rows(ring.read_new(latest_only), columns)
+                pm.draw()
+                pm.wait_frame()
+            else:
+                for row in ring.read_new(latest_only):
+                    pm.update_all(pd.Series(row, index=columns))
+                plt.pause(1.0 / fps)
+    finally:
+        ring.close()
+
+
+class ShmPlotter:
+    """Send `states` rows to a plot process through a :class:`ShmRing`.
+
+    Parameters
+    ----------
+    setup_fn : callable
+        Module-level function that builds the plots, called as
+        ``setup_fn()`` in the plot process and ``setup_fn(recorder)`` here to
+        find the plotted columns (see `student_plotting.setup_plotting`).
+    capacity : int, optional
+        Rows buffered for the plot process, by default 4096.
+    fps : float, optional
+        Plot process redraw rate cap (Hz), by default 30.
+    fast : bool, optional
+        Render with :class:`fast_plotting.FastPlotManager` (decimated,
+        blitted) instead of `PlotManager`, by default True.
+    policy : str, optional
+        What to do when the plot process falls behind: ``'drop_oldest'``,
+        ``'latest'`` or ``'every_n'`` (see module docs), by default
+        ``'drop_oldest'``.
+    every_n : int, optional
+        Send every n-th row with ``policy='every_n'``, by default 5.
+    """
+
+    def __init__(
+        self,
+        setup_fn,
+        capacity: int = 4096,
+        fps: float = 30.0,
+        fast: bool = True,
+        policy: str = 'drop_oldest',
+        every_n: int = 5,
+    ):
+        if policy not in POLICIES:
+            raise ValueError(f'policy must be one of {POLICIES}, got {policy!r}')
+        self.setup_fn = setup_fn
+        self.fast = fast
+        self.policy = policy
+        self.every_n = every_n if policy == 'every_n' else 1
+        self.pushed = 0
+        self.columns = plotted_columns(setup_fn)
+        self.capacity = capacity
+        self.fps = fps
+        self.ring = ShmRing(len(self.columns), capacity)
+        self._stop = mp.Event()
+        self._proc: mp.Process | None = None
+
+    def start(self) -> None:
+        self._proc = mp.Process(
+            target=_plot_proc,
+            args=(
+                self.ring.name,
+                self.columns,
+                self.capacity,
+                self.setup_fn,
+                self._stop,
+                self.fps,
+                self.fast,
+                self.policy == 'latest',
+            ),
+            daemon=True,
+        )
+        self._proc.start()
+
+    def push(self, states) -> None:
+        """Send the newest row of `states` (a `ColumnState`) to the plots."""
+        self.pushed += 1
+        if self.pushed % self.every_n:
+            return
+        ring = self.ring
+        states.last_into(self.columns, ring.slot())
+        ring.commit()
+
+    def push_values(self, values) -> None:
+        """Send one row given as values in `self.columns` order."""
+        self.pushed += 1
+        if self.pushed % self.every_n:
+            return
+        self.ring.write(values)
+
+    @property
+    def stats(self) -> dict[str, int]:
+        """Row counters; `backlog` is rows waiting for the plot process."""
+        ring = self.ring
+        return {
+            'pushed': self.pushed,
+            'sampled_out': self.pushed - ring.head,
+            'delivered': ring.tail - ring.dropped - ring.coalesced,
+            'dropped': ring.dropped,
+            'coalesced': ring.coalesced,
+            'backlog': ring.head - ring.tail,
+        }
+
+    def stop(self, timeout: float = 2.0) -> None:
+        self._stop.set()
+        if self._proc is not None:
+            self._proc.join(timeout)
+            if self._proc.is_alive():
+                self._proc.terminate()
+        self.ring.close()
+
+
+def _drain(q) -> None:
+    while q.get() is not None:
+        pass
+
+
+def benchmark(n_ticks: int = 20_000) -> None:
+    """Per-tick producer cost: pickled Series through a queue vs. the shm ring."""
+    from column_state import ColumnState, _synthetic_row
+    from student_plotting import setup_plotting
+
+    columns = plotted_columns(setup_plotting)
+    states = ColumnState()
+    for i in range(100):
+        states.append_row(_synthetic_row(i))
+
+    q = mp.Queue()
+    consumer = mp.Process(target=_drain, args=(q,), daemon=True)
+    consumer.start()
+    t0 = perf_counter_ns()
+    for _ in range(n_ticks):
+        q.put(states.iloc[-1])
+    queue_us = (perf_counter_ns() - t0) / n_ticks / 1e3
+    q.put(None)
+    consumer.join()
+
+    ring = ShmRing(len(columns), capacity=4096)
+    try:
+        t0 = perf_counter_ns()
+        for _ in range(n_ticks):
+            states.last_into(columns, ring.slot())
+            ring.commit()
+        shm_us = (perf_counter_ns() - t0) / n_ticks / 1e3
+    finally:
+        ring.close()
+    sleep(0.1)
+
+    print(f'{len(columns)} plotted columns, {n_ticks} ticks, producer cost per tick')
+    print(f'queue (iloc[-1] + put): {queue_us:8.2f} us')
+    print(f'shm ring (last_into):   {shm_us:8.2f} us')
+
+
+if __name__ == '__main__':
+    benchmark()
@@ -0,0 +1,182 @@
+"""Declared, reusable `states` rows instead of a new `state_now` dict per tick.
+
+Building ``state_now = {...}`` every tick allocates a dict plus its values,
+and columns that are only set sometimes (`hex_x` when a hex is visible) make
+rows ragged. Declare the columns once instead::
+
+    class State(StateRow):
+        __slots__ = ()
+        columns = ('t_epoch', 't_delta', 't_elapsed', 'odom_x', 'odom_y', 'hex_x')
+
+    state_now = State()     # Once, e.g. in `Params`.
+
+    state_now.clear()       # Every tick: all columns back to NaN.
+    state_now.t_epoch = t
+    state_now.odom_x = sensors.odom.x
+    states.append_row(state_now)  # One slice copy into `ColumnState`.
+
+Each row is one float64 array; every column is an attribute (or key, so
+``state_now['t_delta']`` keeps working) that reads and writes its slot.
+Columns not set this tick are NaN, so every row has the same columns.
+
+The usual column groups are defined here (`TIME_COLUMNS`, `IMU_COLUMNS`,
+...), and :class:`RobotState` logs time, imu and odom. Subclass it to add
+columns::
+
+    class StateNow(RobotState):
+        __slots__ = ()
+        columns = RobotState.columns + ('hex_x', 'hex_y')
+
+`ColumnState.append_row()` takes any object with `values` and `columns`.
+
+Run this file to compare time and allocations per tick against a dict.
+"""
+
+import tracemalloc
+from time import perf_counter
+
+import numpy as np
+
+TIME_COLUMNS = ('t_epoch', 't_delta', 't_elapsed')
+IMU_COLUMNS = ('imu_ax', 'imu_ay', 'imu_az', 'imu_wz')
+ODOM_COLUMNS = ('odom_x', 'odom_y', 'odom_yaw')
+HEX_COLUMNS = ('hex_x', 'hex_y', 'hex_yaw')
+
+
+def _column(j: int, name: str) -> property:
+    def get(self) -> float:
+        return float(self.values[j])
+
+    def set(self, value) -> None:
+        self.values[j] = np.nan if value is None else value
+
+    return property(get, set, doc=f'Column {name!r}.')
+
+
+class StateRow:
+    """One preallocated row with a fixed set of columns.
+
+    Subclasses set `columns` (and ``__slots__ = ()`` so instances stay
+    dict-free). Each column becomes a property backed by `values`.
+    """
+
+    __slots__ = ('values',)
+    columns: tuple[str, ...] = ()
+    _index: dict[str, int] = {}
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls.columns = tuple(cls.columns)
+        if len(set(cls.columns)) != len(cls.columns):
+            raise ValueError(f'{cls.__name__}.columns has duplicates: {cls.columns}')
+        cls._index = {name: j for j, name in enumerate(cls.columns)}
+        for j, name in enumerate(cls.columns):
+            setattr(cls, name, _column(j, name))
+
+    def __init__(self, **values):
+        self.values = np.full(len(self.columns), np.nan)
+        for name, value in values.items():
+            self[name] = value
+
+    def clear(self) -> None:
+        """Set every column to NaN."""
+        self.values.fill(np.nan)
+
+    def __getitem__(self, name: str) -> float:
+        return float(self.values[self._index[name]])
+
+    def __setitem__(self, name: str, value) -> None:
+        try:
+            j = self._index[name]
+        except KeyError:
+            raise KeyError(f'{type(self).__name__} has no column {name!r}') from None
+        self.values[j] = np.nan if value is None else value
+
+    def to_dict(self) -> dict[str, float]:
+        return dict(zip(self.columns, self.values.tolist()))
+
+    def __repr__(self) -> str:
+        return f'{type(self).__name__}({self.to_dict()})'
+
+
+class RobotState(StateRow):
+    """Time, imu and odom columns, the row most run scripts log."""
+
+    __slots__ = ()
+    columns = TIME_COLUMNS + IMU_COLUMNS + ODOM_COLUMNS
+
+
+class _BenchRow(RobotState):
+    __slots__ = ()
+    columns = RobotState.columns + HEX_COLUMNS
+
+
+def _tick_dict(states, row, i: int) -> None:
+    """The current pattern: a fresh dict, hex columns only sometimes."""
+    t = 0.02 * i
+    state_now = {'t_epoch': t, 't_delta': 0.02, 't_elapsed': t}
+    state_now['imu_ax'] = 0.1
+    state_now['imu_ay'] = -0.2
+    state_now['imu_az'] = 9.81
+    state_now['imu_wz'] = 0.01 * i
+    state_now['odom_x'] = 0.001 * i
+    state_now['odom_y'] = -0.001 * i
+    state_now['odom_yaw'] = 0.5
+    if i % 3 == 0:
+        state_now['hex_x'] = 1.0
+        state_now['hex_y'] = 0.2
+        state_now['hex_yaw'] = 0.1
+    states.append_row(rowdict=state_now)
+
+
+def _tick_row(states, state_now, i: int) -> None:
+    t = 0.02 * i
+    state_now.clear()
+    state_now.t_epoch = t
+    state_now.t_delta = 0.02
+    state_now.t_elapsed = t
+    state_now.imu_ax = 0.1
+    state_now.imu_ay = -0.2
+    state_now.imu_az = 9.81
+    state_now.imu_wz = 0.01 * i
+    state_now.odom_x = 0.001 * i
+    state_now.odom_y = -0.001 * i
+    state_now.odom_yaw = 0.5
+    if i % 3 == 0:
+        state_now.hex_x = 1.0
+        state_now.hex_y = 0.2
+        state_now.hex_yaw = 0.1
+    states.append_row(state_now)
+
+
+def benchmark(n_ticks: int = 50_000) -> None:
+    """Build and append one row per tick: dict `state_now` vs. a reused `StateRow`."""
+    from column_state import ColumnState
+
+    print(f'{n_ticks} ticks into ColumnState(max_rows=10_000), 13 columns')
+    print(f'{"row":>9} {"tick (us)":>10} {"allocated (B/tick)":>19}')
+    for name, tick in (('dict', _tick_dict), ('StateRow', _tick_row)):
+        states = ColumnState(columns=_BenchRow.columns, max_rows=10_000)
+        row = _BenchRow()
+        for i in range(5000):  # Warm up: allocate the chunks first.
+            tick(states, row, i)
+
+        t0 = perf_counter()
+        for i in range(n_ticks):
+            tick(states, row, i)
+        tick_us = (perf_counter() - t0) / n_ticks * 1e6
+
+        # Peak memory allocated within a tick (freed again by its end).
+        tracemalloc.start()
+        peak = 0
+        for i in range(1000):
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            tick(states, row, i)
+            peak += tracemalloc.get_traced_memory()[1] - before
+        tracemalloc.stop()
+        print(f'{name:>9} {tick_us:>10.2f} {peak / 1000:>19.0f}')
+
+
+if __name__ == '__main__':
+    benchmark()
@@ -2,19 +2,27 @@ import pickle
 from smartbot_irl.drawing import PlotManager
 
 
-def setup_plotting() -> PlotManager:
+def setup_plotting(pm=None) -> PlotManager:
     """Create Matplotlib figures and add line/scatter artists.
 
     The strings for `x_col` and `y_col` here must match column names in your
-    `states` object. You can add new columns with the `state_now` dictionary in
-    `step()`.
+    `states` object. You can add new columns to the `StateNow` row class next
+    to `step()` (or to `log_projection()` in `tyler_approach`).
+
+    Parameters
+    ----------
+    pm : PlotManager, optional
+        Add figures to this object instead of a new `PlotManager` (e.g. a
+        :class:`shm_plotting.ColumnRecorder` to find out which columns are
+        plotted).
 
     Returns
     -------
     PlotManager
 
     """
-    pm = PlotManager()
+    if pm is None:
+        pm = PlotManager()
 
     # Create two windows.
     odom_fig = pm.add_figure(title='Odometry Data')
@@ -2,21 +2,22 @@ import pygame
 from smartbot_irl import Command
 
 
-def get_key_command(sensors=None) -> Command:
-    """
-    Create a :class:`smartbot_irl.Command` object based on keyboard/mouse input.
-
-    """
-
-    for event in pygame.event.get():
+def quit_requested(events) -> bool:
+    """True if `events` contain a window close or a `q` keypress."""
+    for event in events:
         if event.type == pygame.QUIT:
-            raise KeyboardInterrupt
+            return True
         if event.type == pygame.KEYDOWN:
             if event.key == pygame.K_q:
-                raise KeyboardInterrupt
+                return True
+    return False
 
-    pygame.event.pump()
-    keys = pygame.key.get_pressed()
+
+def command_from_keys(keys) -> Command:
+    """
+    Create a :class:`smartbot_irl.Command` object from `pygame.key.get_pressed()`.
+
+    """
     cmd = Command()
 
     lin_speed = 2
@@ -54,3 +55,18 @@ def get_key_command(sensors=None) -> Command:
         cmd.manipulator_presets = 'DOWN'
 
     return cmd
+
+
+def get_key_command(sensors=None) -> Command:
+    """
+    Create a :class:`smartbot_irl.Command` object based on keyboard/mouse input.
+
+    This polls pygame on every call. See :class:`teleop_service.TeleopService`
+    to poll once per loop and keep `step()` free of pygame calls.
+
+    """
+    if quit_requested(pygame.event.get()):
+        raise KeyboardInterrupt
+
+    pygame.event.pump()
+    return command_from_keys(pygame.key.get_pressed())
@@ -0,0 +1,142 @@
+"""Keyboard teleop with constant-time command lookups for `step()`.
+
+`get_key_command()` drains the pygame event queue and reads the keyboard
+inside `step()`. `TeleopService` moves that to one :meth:`poll` per tick,
+called from the main loop, and keeps the latest `Command`, so `step()` only
+picks up a reference::
+
+    teleop = TeleopService()
+    while True:
+        sched.wait()
+        teleop.poll()       # Main thread: the one that owns the window.
+        cmd = teleop.get()  # In step(). Raises KeyboardInterrupt after `q` or closing the window.
+        ...
+
+`teleop.latency` measures input-to-command latency: from the key event
+(its SDL timestamp when pygame provides one, otherwise the previous poll,
+the earliest the key can have been pressed) until `get()` first hands the
+new command to `step()`. `teleop.poll_time` is what each poll costs the loop.
+
+SDL wants events handled on the thread that created the window, and the
+main loop also draws and spins pygame, so polling from the main loop is the
+portable choice. :meth:`start` polls on a background thread at `rate_hz`
+instead. That only works on Linux (X11), and every other pygame call in
+the process, e.g. a drawing `bot.spin()`, must then hold
+:data:`PYGAME_LOCK`::
+
+    teleop.start()
+    ...
+    with PYGAME_LOCK:
+        bot.spin()
+"""
+
+import threading
+from time import perf_counter, perf_counter_ns, sleep
+
+import pygame
+from smartbot_irl import Command
+
+from loop_profiler import PhaseStats
+from student_teleop import command_from_keys, quit_requested
+
+PYGAME_LOCK = threading.RLock()  # Held around pygame calls while `start()` polls on its own thread.
+_KEY_EVENTS = (pygame.KEYDOWN, pygame.KEYUP)
+
+
+class TeleopService:
+    """Poll the keyboard once per tick and publish the latest `Command`.
+
+    Parameters
+    ----------
+    rate_hz : float, optional
+        Polling rate of the background thread (see :meth:`start`), by
+        default 50.
+    key_fn : callable, optional
+        Maps `pygame.key.get_pressed()` to a `Command`, by default
+        :func:`student_teleop.command_from_keys`.
+    """
+
+    def __init__(self, rate_hz: float = 50.0, key_fn=command_from_keys):
+        self.period = 1.0 / rate_hz
+        self.key_fn = key_fn
+        self.latency = PhaseStats('teleop latency')  # Key event -> command handed to `step()`.
+        self.poll_time = PhaseStats('teleop poll')
+        self.updates = 0
+        self._latest = (Command(), None)  # (command, input time in perf_counter ns), swapped whole.
+        self._handed = self._latest
+        self._quit = False
+        self._keys = None
+        self._last_poll = perf_counter_ns()
+        self._running = False
+        self._thread: threading.Thread | None = None
+
+    def start(self) -> None:
+        """Poll on a background thread. Linux only; see the module docs."""
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name='TeleopService', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._running = False
+        if self._thread is not None:
+            self._thread.join(1.0)
+
+    def _run(self) -> None:
+        next_t = perf_counter()
+        while self._running:
+            self.poll()
+            next_t += self.period
+            remaining = next_t - perf_counter()
+            if remaining > 0:
+                sleep(remaining)
+            else:
+                next_t = perf_counter()  # Fell behind, don't try to catch up.
+
+    def poll(self) -> None:
+        """Handle pending events and publish a new command if keys changed.
+
+        Call once per tick from the main loop (or let :meth:`start` call it).
+        """
+        t0 = perf_counter_ns()
+        with PYGAME_LOCK:
+            events = pygame.event.get()
+            ticks = pygame.time.get_ticks()  # Same time base (ms) as event timestamps.
+            pressed = pygame.key.get_pressed()  # Indexed by keycode (e.g. `pygame.K_UP`).
+        if quit_requested(events):
+            self._quit = True
+        keys = tuple(pressed)  # Only to spot changes.
+        if keys != self._keys:
+            self._keys = keys
+            stamps = [e.timestamp for e in events if e.type in _KEY_EVENTS and hasattr(e, 'timestamp')]
+            if stamps:
+                input_ns = t0 - (ticks - min(stamps)) * 1_000_000
+            else:
+                input_ns = self._last_poll
+            self._latest = (self.key_fn(pressed), input_ns)  # Single reference swap, atomic for readers.
+            self.updates += 1
+        self._last_poll = t0
+        self.poll_time.add(perf_counter_ns() - t0)
+
+    def get(self) -> Command:
+        """Latest command (treat it as read-only). Constant time, no pygame calls."""
+        if self._quit:
+            raise KeyboardInterrupt
+        latest = self._latest
+        if latest is not self._handed:
+            self._handed = latest
+            self.latency.add(perf_counter_ns() - latest[1])
+        return latest[0]
+
+    def check_quit(self) -> None:
+        """Raise KeyboardInterrupt if the user asked to quit."""
+        if self._quit:
+            raise KeyboardInterrupt
+
+    def report(self) -> str:
+        s = self.latency.summary()
+        p = self.poll_time.summary()
+        return (
+            f'teleop: {self.updates} command updates, input-to-command latency (ms) '
+            f'p50 {s["p50"] * 1e3:.2f}, p99 {s["p99"] * 1e3:.2f}, max {s["max"] * 1e3:.2f}; '
+            f'poll (ms) p50 {p["p50"] * 1e3:.3f}, max {p["max"] * 1e3:.3f}'
+        )
@@ -1,20 +1,38 @@
 # demo_2dsim.py
-from dataclasses import dataclass
-from math import pi
+from dataclasses import dataclass, field
 from re import X
-from time import sleep, time
+from time import sleep
 from tkinter import Y
 
-from smartbot_irl.data import LaserScan, State, list_sensor_columns, timestamp
-from smartbot_irl.utils import SmartLogger, check_realtime, logging
+from smartbot_irl.data import LaserScan, list_sensor_columns, timestamp
+from smartbot_irl.utils import logging
 from smartbot_irl import SmartBot, SmartBotType
 from smartbot_irl import Command, SensorData, SmartBot
+from clock import Clock, WallClock
+from column_state import ColumnState
+from log_writer import CsvStreamWriter
+from loop_profiler import LoopProfiler
+from loop_scheduler import RateScheduler
+from queued_logger import QueuedLogger
+from marker_tracking import MarkerTracker
+from sensor_projection import SensorProjection
+from sensor_snapshot import SensorSnapshot
 from student_plotting import setup_plotting
 
 
 import numpy as np
 
-logger = SmartLogger(level=logging.INFO)  # Print statements, but better!
+logger = QueuedLogger(level=logging.INFO)  # Print statements, but better! Writes on a background thread.
+
+
+def log_projection() -> SensorProjection:
+    """Sensor columns `approach_long()` logs each tick (not every lidar beam)."""
+    return SensorProjection(
+        extra=('t_epoch', 't_delta', 't_elapsed'),
+        fields=('odom.x', 'odom.y', 'odom.yaw', 'imu.ax', 'imu.ay', 'imu.az', 'imu.wz'),
+        hexes=1,
+        sectors={'front': (-0.3, 0.3), 'left': (0.3, 1.8), 'right': (-1.8, -0.3)},
+    )
 
 
 @dataclass
@@ -22,6 +40,7 @@ class Params:
     max_lin_vel: float = 0.2
     max_ang_vel: float = 0.8
 
+    clock: Clock = field(default_factory=WallClock)  # `SimClock` for replayed logs and `HeadlessBot`.
     t0: float = 0.0
     yaw: float = 0.0
 
@@ -53,188 +72,157 @@ class Params:
     ang_I_build: float = 0.0
 
     go: bool = False
-    x_prev: float = 0.0
-    y_prev: float = 0.0
+    tracker: MarkerTracker = field(default_factory=MarkerTracker)
+    target_id: int | None = None  # Marker to approach, None for the nearest one.
 
     mark_x: float = 0.0
     mark_y: float = 0.0
 
+    log_sensors: SensorProjection = field(default_factory=log_projection)
+
 
-def step(bot: SmartBotType, params: Params, states: State) -> None:
+def step(bot: SmartBotType, params: Params, states: ColumnState) -> None:
     # Get info about previous timestep state.
     state_prev = states.last
     t_prev = state_prev.t_epoch  # Last timestamp (sec).
-    sensors = bot.read()
     cmd = Command()
 
-    # Create current state vector.
-    t = time()
-    state_now = {
-        't_epoch': t,  # Seconds since Jan 1 1970.
-        't_delta': t - t_prev,  # Seconds since last time step.
-        't_elapsed': t - params.t0,  # Seconds since program start.
-    }
-
-    def yaw_correction():
-        sensors = bot.read()
-        if sensors.odom is not None:
-            if sensors.odom.yaw < 0:
-                yaw = sensors.odom.yaw + 2 * pi
-            else:
-                yaw = sensors.odom.yaw
+    # Current time (the rest of the state vector comes from `params.log_sensors`).
+    t = params.clock.time()
+    t_delta = t - t_prev  # Seconds since last time step.
 
-            return yaw
-        else:
-            yaw = 0.0
-            return yaw
+    # Read sensors once per tick, every helper below uses this snapshot.
+    snap = SensorSnapshot(bot.read(), t=t)
+    params.tracker.update(snap, t)  # World-frame estimates of every seen marker.
 
     def wrap(a):
         return (a + np.pi) % (2 * np.pi) - np.pi
 
-    def target_comp():
-        yaw = yaw_correction()
-        if sensors.seen_hexes.poses is not None and len(sensors.seen_hexes.poses) > 0:
-            x = sensors.seen_hexes.poses[0].x
-            y = sensors.seen_hexes.poses[0].y
-            c = np.sqrt(x**2 + y**2)
-            if x == Params.x_prev:
-                ## FAKE ##
-                pass
-
-            else:
-                if y < 0.0:
-                    theta = -np.acos(x / c)
-                else:
-                    theta = np.acos(x / c)
-
-                phi = yaw + theta
+    def target_comp(snap: SensorSnapshot):
+        tracker = params.tracker
+        marker = tracker.nearest if params.target_id is None else tracker.get(params.target_id)
+        if marker is not None:
+            params.mark_x, params.mark_y = marker.x, marker.y
 
-                Params.mark_x = sensors.odom.x + c * np.cos(phi)
-                Params.mark_y = sensors.odom.y + c * np.sin(phi)
-
-                Params.x_prev = x
-                Params.y_prev = y
-
-        error_x = Params.mark_x - sensors.odom.x
-        error_y = Params.mark_y - sensors.odom.y
-        error_theta = Params.theta_goal - yaw
+        error_x = params.mark_x - snap.odom.x
+        error_y = params.mark_y - snap.odom.y
+        error_theta = params.theta_goal - snap.yaw
 
         # logger.warn(error_theta)
 
         return np.array([error_x, error_y, error_theta])
 
-    def approach_long():
-        # Get sensor data.
-
-        Params.yaw = yaw_correction()
-        err = target_comp()
+    def approach_long(snap: SensorSnapshot):
+        params.yaw = snap.yaw
+        err = target_comp(snap)
 
         x_err = err[0]
         y_err = err[1]
         theta_err = err[2]
 
-        # Update our `states` matrix by inserting our `state_now` vector.
-        state_now.update(sensors.flatten())
-        states.append_row(state_now)
+        # Update our `states` matrix with the time columns plus the projected sensors.
+        row = params.log_sensors.flatten(snap.sensors)
+        row[0], row[1], row[2] = t, t_delta, t - params.t0  # t_epoch, t_delta, t_elapsed.
+        states.append_values(row, params.log_sensors.columns)
 
-        # logger.info(sensors.seen_hexes)
+        # logger.info(snap.seen_hexes)
 
         rho = np.sqrt(x_err**2 + y_err**2)
         # logger.warn(rho)
-        alpha = wrap(np.atan2(y_err, x_err) - Params.yaw)
-        beta = wrap(theta_err - alpha - Params.yaw)
+        alpha = wrap(np.atan2(y_err, x_err) - params.yaw)
+        beta = wrap(theta_err - alpha - params.yaw)
 
         ###################################################################
         ### Control Law ###################################################
         ###################################################################
 
-        v = Params.k_rho * rho
-        w = Params.k_alpha * alpha + Params.k_beta * beta
+        v = params.k_rho * rho
+        w = params.k_alpha * alpha + params.k_beta * beta
 
         if rho <= 0.2:
             cmd.angular_vel = 0.0
             cmd.linear_vel = 0.0
-            Params.long_finish = True
+            params.long_finish = True
         else:
-            if v > Params.max_lin_vel:
-                cmd.linear_vel = Params.max_lin_vel
+            if v > params.max_lin_vel:
+                cmd.linear_vel = params.max_lin_vel
             else:
-                cmd.linear_vel = Params.max_ang_vel * v
+                cmd.linear_vel = params.max_ang_vel * v
 
             # logger.warn(w)
-            if w > Params.max_ang_vel:
-                cmd.angular_vel = Params.max_ang_vel
+            if w > params.max_ang_vel:
+                cmd.angular_vel = params.max_ang_vel
             else:
-                cmd.angular_vel = Params.max_ang_vel * w
+                cmd.angular_vel = params.max_ang_vel * w
                 # print('Still Turning!!!')
 
-    def rotate_goal():
-        err = target_comp()
+    def rotate_goal(snap: SensorSnapshot):
+        err = target_comp(snap)
         theta_err = err[2] - np.pi
         logger.warn(theta_err)
 
-        yaw = yaw_correction()
+        yaw = snap.yaw
 
         if abs(theta_err - yaw) <= 0.05:
             cmd.linear_vel = 0.0
             cmd.angular_vel = 0.0
-            Params.rot_finish = True
+            params.rot_finish = True
         else:
-            p_gain = (theta_err - yaw) * Params.max_ang_vel
+            p_gain = (theta_err - yaw) * params.max_ang_vel
 
-            if abs(p_gain) >= Params.max_ang_vel:
+            if abs(p_gain) >= params.max_ang_vel:
                 cmd.linear_vel = 0.0
                 if p_gain <= 0.0:
-                    cmd.angular_vel = -Params.max_ang_vel
+                    cmd.angular_vel = -params.max_ang_vel
                 else:
-                    cmd.angular_vel = Params.max_ang_vel
+                    cmd.angular_vel = params.max_ang_vel
             else:
                 cmd.linear_vel = 0.0
                 cmd.angular_vel = p_gain
 
-    def approach_short():
-        Params.yaw = yaw_correction()
-        err = target_comp()
+    def approach_short(snap: SensorSnapshot):
+        params.yaw = snap.yaw
+        err = target_comp(snap)
         x_err = err[0]
         y_err = err[1]
         theta_err = err[2] - np.pi
 
         def ang_PID():
-            ang_err = theta_err - Params.yaw
-            d_ang_err = (ang_err - Params.ang_err_prev) / state_now['t_delta']
-            i_ang_err = Params.ang_I_build + (ang_err * state_now['t_delta'])
+            ang_err = theta_err - params.yaw
+            d_ang_err = (ang_err - params.ang_err_prev) / t_delta
+            i_ang_err = params.ang_I_build + (ang_err * t_delta)
 
-            P = Params.P_a * ang_err
-            I = Params.I_a * i_ang_err
-            D = Params.D_a * d_ang_err
+            P = params.P_a * ang_err
+            I = params.I_a * i_ang_err
+            D = params.D_a * d_ang_err
             PID_a = P + I + D
 
-            a = min(PID_a, Params.max_ang_vel)
+            a = min(PID_a, params.max_ang_vel)
             cmd.angular_vel = a
 
             # will probably have to change this to focus on y instead of theta
             # maybe have to look at both just to ensure alignment
 
         def lin_PID():
-            mark_x = Params.x_goal + np.random.normal(0, 0.02) - sensors.odom.x
-            mark_y = Params.y_goal + np.random.normal(0, 0.02) - sensors.odom.y
+            mark_x = params.x_goal + np.random.normal(0, 0.02) - snap.odom.x
+            mark_y = params.y_goal + np.random.normal(0, 0.02) - snap.odom.y
             lin_err = np.sqrt(mark_x**2 + mark_y**2)
             logger.warn(lin_err)
             if lin_err <= 0.1:
                 cmd.linear_vel = 0.0
             else:
-                v = min(lin_err, Params.max_lin_vel)
+                v = min(lin_err, params.max_lin_vel)
                 cmd.linear_vel = -v
 
         #### PID Loop to drive backwards towards marker ####
         ang_PID()
         lin_PID()
 
-    if sensors.seen_hexes.poses is not None and len(sensors.seen_hexes.poses) > 0:
-        Params.go = True
+    if snap.hex is not None:
+        params.go = True
 
-    if Params.go == True:
-        approach_long()
+    if params.go == True:
+        approach_long(snap)
 
     bot.write(cmd)
 
@@ -259,10 +247,24 @@ def main(log_file='smartlog') -> None:
     # bot = SmartBot(mode='sim', drawing=True, draw_region=((-10, 10), (-10, 10)), smartbot_num=3)
     # bot.init(drawing=True, smartbot_num=3)
 
+    # Record raw sensor data for offline replay (needs `from sensor_log import RecordingBot`):
+    # bot = RecordingBot(bot, f'{log_file}_{timestamp()}.sblog')
+    # Or replay a recording instead of connecting (needs `from sensor_log import ReplayBot`):
+    # bot = ReplayBot('smartlog_<timestamp>.sblog', speed=None)
+
+    # Or a headless model on simulated time, far faster than real time (needs `from headless_sim import HeadlessBot`):
+    # bot = HeadlessBot()
+
     # Create empty parameter and state objects.
-    states = State()  # This gets saved to a CSV.
+    log_filename = f'{log_file}_{timestamp()}.csv'
+    # Streams each new row to the CSV in the background.
+    writer = CsvStreamWriter(log_filename, columns=log_projection().columns)
+    # Or a binary log that reloads faster (needs `from chunk_log import ChunkLogWriter`):
+    # writer = ChunkLogWriter(f'{log_file}_{timestamp()}.chunks')
+    states = ColumnState(max_rows=10_000, writer=writer)  # Keeps recent rows in memory.
     params = Params()  # We can access this later in step().
-    params.t0 = time()  # Record start time for this run (sec).
+    # params.clock = bot.clock  # With `HeadlessBot`: run `step()` and the schedule on its simulated time.
+    params.t0 = params.clock.time()  # Record start time for this run (sec).
 
     # Set up plotting.
     plot_manager = setup_plotting()
@@ -271,26 +273,55 @@ def main(log_file='smartlog') -> None:
     # Print out what columns exist (There may be more added later!)
     logger.info(msg=f'State Columns: {list_sensor_columns()}')
 
+    # Time each part of the loop. A report is logged at shutdown (or on `kill -USR1 <pid>`).
+    prof = LoopProfiler(deadline=0.05)  # Warns if a loop takes longer than 50ms.
+    prof.instrument(bot, 'read', 'write')
+    prof.instrument(states, 'append_values', prefix='states')  # What `step()` logs rows with.
+
+    # Start each loop on a fixed 20Hz schedule of `params.clock` so `t_delta` stays steady.
+    sched = RateScheduler.from_clock(20, params.clock, overrun='skip')
+
     # Run the robot!
     #######################################
     try:
         while True:
+            sched.wait()  # Sleep until the next loop is due.
+            prof.start_tick()
             step(bot, params, states)  # Run our code.
-            check_realtime(start_t=time())  # Check if our step() is taking too long.
+            prof.mark('step')
             bot.spin()  # Get new sensor data.
+            prof.mark('spin')
 
             # Send last row of data to plots.
             plot_manager.update_all(states.iloc[-1])
+            prof.mark('plot')
+            prof.end_tick()  # Check if our loop is taking too long.
 
     except KeyboardInterrupt:
         logger.info('User requesting shut down...')
     finally:
-        # Save data to a CSV file and cleanup ros+matplotlib objects.
-        log_filename = f'{log_file}_{timestamp()}.csv'
-        states.to_csv(log_filename)
-        logger.info(f'Done saving to {log_filename}')
-
-        bot.shutdown()
+        # Stop robot driving away first: everything below may block or fail.
+        try:
+            bot.write(Command(wheel_vel_left=0.0, wheel_vel_right=0.0, linear_vel=0.0, angular_vel=0.0))
+        except Exception as e:
+            logger.error(f'Stop command failed: {e!r}')
+
+        # Finish writing the CSV file and cleanup ros+matplotlib objects.
+        # Each step is guarded so one failure doesn't skip the rest.
+        try:
+            writer.close()
+            logger.info(f'Done saving to {", ".join(writer.paths)}')
+        except Exception as e:
+            logger.error(f'Log writer failed: {(e.__cause__ or e)!r}')
+        prof.log_report()
+        logger.info(sched.report())
+
+        sleep(0.3)  # Let the stop command go out.
+        try:
+            bot.shutdown()
+        except Exception as e:
+            logger.error(f'Shutdown failed: {e!r}')
+        logger.close()  # Write out any queued log messages.
 
 
 if __name__ == '__main__':